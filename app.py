@@ -1,17 +1,19 @@
 import streamlit as st
 from init import init
 from st_on_hover_tabs import on_hover_tabs
-from page import home_page, paper_entry_page, upload, analysis, display
+from page import home_page, paper_entry_page, upload, analysis, display, library
 
 
 def main():
     # 初始化
     init()
     with st.sidebar:
-        tabs = on_hover_tabs(tabName=['主页', '导入', '编辑', '分析', '查看'],
-                             iconName=['home', 'upload', 'edit', 'person', 'article'], default_choice=0)
+        tabs = on_hover_tabs(tabName=['主页', '文库', '导入', '编辑', '分析', '查看'],
+                             iconName=['home', 'library_books', 'upload', 'edit', 'person', 'article'], default_choice=0)
     if tabs == '主页':
         home_page()
+    elif tabs == '文库':
+        library()
     elif tabs == '导入':
         upload()
     elif tabs == '编辑':
@@ -0,0 +1,346 @@
+import copy
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from chatgpt_api import api_processing
+from utils import saved_session_state_keys
+from config.config import jobs_dir, max_background_jobs
+
+# 提交后台任务时，除论文数据外还需复制的处理设置
+job_setting_keys = ["translate_flag", "polish_flag", "polish_language_is_english", "summary_result"]
+# 仅保存在内存中、不写入任务文件的API设置，进程重启后恢复任务时需重新提供
+job_secret_keys = ["api_key-area", "openai_service"]
+# submit_job生成的任务ID及session_owner_id生成的所有者ID的格式
+job_id_pattern = re.compile(r"[0-9a-f]{12}")
+owner_id_pattern = re.compile(r"[0-9a-f]{32}")
+# 任务状态及步骤的显示名称
+job_status_names = {
+    "pending": "排队中",
+    "running": "处理中",
+    "finished": "已完成",
+    "failed": "失败",
+    "interrupted": "已中断",
+}
+job_step_names = {
+    "format_processing": "格式处理及翻译",
+    "paper_analysis": "总结、评审论文",
+    "paper_polishing": "论文润色",
+}
+
+
+class StepCheckpoint:
+    """
+    后台任务中某一步骤的检查点，逐条记录该步骤已完成的API调用任务结果，用于任务中断后从最后完成的章节继续处理。
+    结果以追加方式写入任务的检查点文件（JSONL），每完成一个任务只写入一行。
+    """
+
+    def __init__(self, job, step):
+        """
+        :param job: 所属的后台任务(AnalysisJob)
+        :param step: 步骤名称，例如"format_processing"
+        """
+        self.job = job
+        self.step = step
+
+    @property
+    def results(self):
+        """
+        已完成任务的结果字典，键为任务序号
+        """
+        return self.job.checkpoints.setdefault(self.step, {})
+
+    def start(self, total):
+        """
+        开始执行步骤，记录任务总数。任务总数与上次记录不一致时，说明任务列表已变化，丢弃该步骤的检查点
+        :param total: 该步骤的API调用任务总数
+        """
+        with self.job.lock:
+            progress = self.job.steps[self.step]
+            if progress["total"] and progress["total"] != total:
+                self.job.checkpoints[self.step] = {}
+                self.job.rewrite_checkpoints()
+            progress["total"] = total
+            progress["done"] = len(self.results)
+        self.job.save()
+
+    def record(self, index, result):
+        """
+        记录一个已完成任务的结果
+        :param index: 任务序号
+        :param result: 任务结果，需可被JSON序列化
+        """
+        with self.job.lock:
+            self.results[index] = result
+            self.job.steps[self.step]["done"] = len(self.results)
+            with open(self.job.checkpoint_path, "a", encoding='utf8') as file:
+                file.write(json.dumps({"step": self.step, "index": index, "result": result}, ensure_ascii=False) + "\n")
+
+
+class AnalysisJob:
+    """
+    后台分析任务。任务持有论文数据的独立副本(state)，在后台线程中执行api_processing，不依赖提交任务的Streamlit会话。
+
+    任务文件默认保存在config.jobs_dir目录下：
+    - <job_id>.json: 任务元数据（状态、各步骤进度等），用于任务列表显示
+    - <job_id>.state.json: 论文数据及处理结果，在任务开始及每个步骤完成时写入
+    - <job_id>.checkpoints.jsonl: 各步骤已完成的API调用结果，每完成一个任务追加一行
+    """
+
+    def __init__(self, job_id, state, steps, status="pending", error="", created_at=None, directory=jobs_dir, owner=""):
+        """
+        :param job_id: 任务ID
+        :param state: 论文数据及处理设置字典，键与st.session_state一致
+        :param steps: 各步骤进度字典，键为步骤名称，值为{"done": 已完成任务数, "total": 任务总数, "finished": 是否已完成}
+        :param status: 任务状态，取值见job_status_names
+        :param error: 任务失败时的错误信息
+        :param created_at: 任务创建时间戳
+        :param directory: 任务文件保存目录
+        :param owner: 提交任务的会话的所有者ID（参见session_owner_id），任务列表只显示当前会话提交的任务
+        """
+        self.job_id = job_id
+        self.directory = directory
+        self.owner = owner
+        self.state = state
+        self.steps = steps
+        self.status = status
+        self.error = error
+        self.created_at = created_at if created_at is not None else time.time()
+        self.updated_at = self.created_at
+        self.checkpoints = {}
+        # 正在处理的结果（状态键值），供页面实时显示处理进度
+        self.preview = None
+        self.lock = threading.RLock()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{self.job_id}.json")
+
+    @property
+    def state_path(self):
+        return os.path.join(self.directory, f"{self.job_id}.state.json")
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.directory, f"{self.job_id}.checkpoints.jsonl")
+
+    def metadata(self):
+        """
+        任务元数据
+        """
+        return {
+            "job_id": self.job_id,
+            "owner": self.owner,
+            "title": self.state.get("title-area", ""),
+            "mode": "润色" if self.state.get("polish_flag") else "总结",
+            "status": self.status,
+            "error": self.error,
+            "steps": self.steps,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    def save(self, save_state=False):
+        """
+        保存任务元数据，save_state为True时同时保存论文数据（不含API设置）
+        """
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self.updated_at = time.time()
+            write_json_atomic(self.path, self.metadata())
+            if save_state:
+                state = {key: value for key, value in self.state.items() if key not in job_secret_keys}
+                write_json_atomic(self.state_path, state)
+
+    def rewrite_checkpoints(self):
+        """
+        按内存中的检查点重写检查点文件
+        """
+        with self.lock:
+            with open(self.checkpoint_path, "w", encoding='utf8') as file:
+                for step, results in self.checkpoints.items():
+                    for index, result in results.items():
+                        file.write(json.dumps({"step": step, "index": index, "result": result}, ensure_ascii=False) + "\n")
+
+    def checkpoint(self, step):
+        return StepCheckpoint(self, step)
+
+    def is_step_finished(self, step):
+        return self.steps[step]["finished"]
+
+    def finish_step(self, step):
+        """
+        标记步骤完成，并保存此时的论文数据，恢复任务时从下一步骤开始
+        """
+        with self.lock:
+            progress = self.steps[step]
+            progress["finished"] = True
+            progress["total"] = max(progress["total"], 1)
+            progress["done"] = progress["total"]
+        self.save(save_state=True)
+
+    def update_preview(self, values):
+        self.preview = values
+
+    def set_status(self, status, error=""):
+        self.status = status
+        self.error = error
+        self.save()
+
+    @classmethod
+    def load(cls, job_id, directory=jobs_dir):
+        """
+        从任务文件加载任务。文件中状态为排队中或处理中的任务不在当前进程中运行，视为已中断
+        """
+        with open(os.path.join(directory, f"{job_id}.json"), "r", encoding='utf8') as file:
+            metadata = json.load(file)
+        with open(os.path.join(directory, f"{job_id}.state.json"), "r", encoding='utf8') as file:
+            state = json.load(file)
+        status = "interrupted" if metadata["status"] in ("pending", "running") else metadata["status"]
+        job = cls(job_id=job_id, state=state, steps=metadata["steps"], status=status, error=metadata["error"], created_at=metadata["created_at"],
+                  directory=directory, owner=metadata.get("owner", ""))
+        job.updated_at = metadata["updated_at"]
+        if os.path.exists(job.checkpoint_path):
+            with open(job.checkpoint_path, "r", encoding='utf8') as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 进程中断时最后一行可能不完整
+                        continue
+                    job.checkpoints.setdefault(record["step"], {})[record["index"]] = record["result"]
+        for step, progress in job.steps.items():
+            if not progress["finished"]:
+                progress["done"] = len(job.checkpoints.get(step, {}))
+        return job
+
+
+def write_json_atomic(path, data):
+    """
+    先写入临时文件再替换目标文件，避免进程中断时留下不完整的JSON文件
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding='utf8') as file:
+        json.dump(data, file, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+# 进程内共享的任务表及后台线程池，跨会话、跨Streamlit重运行保留
+jobs = {}
+jobs_lock = threading.Lock()
+job_executor = ThreadPoolExecutor(max_workers=max_background_jobs, thread_name_prefix="analysis-job")
+
+
+def run_job(job):
+    """
+    在后台线程中执行任务
+    """
+    job.set_status("running")
+    try:
+        api_processing(state=job.state, job=job, on_progress=job.update_preview)
+        job.set_status("finished")
+    except Exception as e:
+        print(f"后台任务{job.job_id}失败: {e}")
+        job.set_status("failed", error=str(e))
+    finally:
+        job.preview = None
+
+
+def start_job(job):
+    job.set_status("pending")
+    job_executor.submit(run_job, job)
+
+
+def session_owner_id(session_state, persisted_owner=None):
+    """
+    当前会话的任务所有者ID，用于在任务列表中只显示本浏览器提交的任务。
+    首次使用时采用会话之外保存的ID（如页面地址中的查询参数），刷新页面或进程重启后的新会话仍能看到此前提交的任务；没有时生成新ID
+    :param session_state: st.session_state
+    :param persisted_owner: 会话之外保存的所有者ID，格式不符时忽略
+    """
+    if "job_owner_id" not in session_state:
+        if persisted_owner and owner_id_pattern.fullmatch(persisted_owner):
+            session_state["job_owner_id"] = persisted_owner
+        else:
+            session_state["job_owner_id"] = uuid.uuid4().hex
+    return session_state["job_owner_id"]
+
+
+def submit_job(session_state):
+    """
+    以当前会话中的论文数据及处理设置创建后台任务并开始执行
+    :param session_state: st.session_state
+    :return: 任务ID
+    """
+    state = {key: copy.deepcopy(session_state[key]) for key in saved_session_state_keys + job_setting_keys + job_secret_keys if key in session_state}
+    steps = ["paper_polishing"] if state.get("polish_flag") else ["format_processing", "paper_analysis"]
+    job = AnalysisJob(job_id=uuid.uuid4().hex[:12], state=state, steps={step: {"done": 0, "total": 0, "finished": False} for step in steps},
+                      owner=session_owner_id(session_state))
+    with jobs_lock:
+        jobs[job.job_id] = job
+    job.save(save_state=True)
+    start_job(job)
+    return job.job_id
+
+
+def get_job(job_id):
+    """
+    获取任务，当前进程中不存在时从任务文件加载
+    :return: AnalysisJob，任务不存在或任务ID格式不符时返回None
+    """
+    # 任务ID可由用户输入（按任务ID打开任务），只接受submit_job生成的格式，避免读取任务目录之外的文件
+    if not job_id_pattern.fullmatch(job_id):
+        return None
+    with jobs_lock:
+        if job_id not in jobs:
+            try:
+                jobs[job_id] = AnalysisJob.load(job_id, directory=jobs_dir)
+            except (OSError, json.JSONDecodeError, KeyError):
+                return None
+        return jobs[job_id]
+
+
+def resume_job(job_id, api_key, openai_service):
+    """
+    继续执行已中断或失败的任务，已完成的步骤及章节不再重复处理
+    :param job_id: 任务ID
+    :param api_key: API Key（不保存在任务文件中，需重新提供）
+    :param openai_service: 是否使用官方API服务
+    """
+    job = get_job(job_id)
+    if job is None or job.status not in ("interrupted", "failed"):
+        return
+    job.state["api_key-area"] = api_key
+    job.state["openai_service"] = openai_service
+    start_job(job)
+
+
+def list_jobs(owner=None):
+    """
+    列出任务的元数据，按创建时间从新到旧排列。当前进程中的任务使用内存中的最新状态
+    :param owner: 所有者ID（参见session_owner_id），传入时只列出该所有者提交的任务，不显示其他会话的任务
+    """
+    records = {}
+    if os.path.isdir(jobs_dir):
+        for file_name in os.listdir(jobs_dir):
+            if not file_name.endswith(".json") or file_name.endswith(".state.json"):
+                continue
+            try:
+                with open(os.path.join(jobs_dir, file_name), "r", encoding='utf8') as file:
+                    metadata = json.load(file)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if metadata["status"] in ("pending", "running"):
+                metadata["status"] = "interrupted"
+            records[metadata["job_id"]] = metadata
+    with jobs_lock:
+        for job_id, job in jobs.items():
+            records[job_id] = job.metadata()
+    if owner is not None:
+        records = {job_id: record for job_id, record in records.items() if record.get("owner") == owner}
+    return sorted(records.values(), key=lambda record: record["created_at"], reverse=True)
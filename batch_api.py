@@ -0,0 +1,300 @@
+import copy
+import hashlib
+import json
+import os
+import time
+import httpx
+from chatgpt_api import (build_format_jobs, build_polish_jobs, build_paper_data, build_summary_chunks, build_reduce_request, use_map_reduce_summary,
+                         format_processing, paper_polishing)
+from cost_estimator import describe_job
+from background_jobs import write_json_atomic
+from paper_document import PaperDocument, FormatResult, PolishResult, sections_from_dicts
+from response_cache import ResponseCache, get_response_cache
+from utils import calculate_token, flatten_numbered_sections, escape_backslashes_except_newlines
+from config.config import (chatgpt_model, chatgpt_temperature, max_attempts, proxy_base_url, api_timeout, summarize_system_prompt,
+                           section_summarize_system_prompt, summarize_reduce_system_prompt, batch_api_base_url, batch_completion_window,
+                           batch_poll_interval, batch_max_requests, batch_max_file_bytes, batch_max_rounds)
+
+# 批处理任务的终止状态
+batch_final_statuses = {"completed", "failed", "expired", "cancelled"}
+# 未完成即结束的状态，没有结果文件的此类任务在重新运行时重新提交
+batch_failed_statuses = {"failed", "expired", "cancelled"}
+
+
+class BatchClient:
+    """
+    OpenAI Batch API的HTTP客户端（openai==1.9.0尚不支持batches接口，直接以httpx调用）：
+    上传JSONL请求文件、创建批处理任务、查询任务状态及下载结果文件。
+    """
+
+    def __init__(self, api_key, base_url, transport=None):
+        """
+        :param api_key: API Key
+        :param base_url: API地址，如"https://api.openai.com/v1"，可指向模拟批处理接口的本地服务
+        :param transport: 可选的httpx传输层，测试时可传入httpx.MockTransport
+        """
+        self.client = httpx.Client(base_url=base_url.rstrip("/") + "/", headers={"Authorization": f"Bearer {api_key}"},
+                                   timeout=api_timeout, transport=transport)
+
+    def request(self, method, path, **kwargs):
+        response = self.client.request(method, path, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def upload_file(self, content, file_name="batch_input.jsonl"):
+        """
+        上传批处理请求文件
+        :param content: JSONL文件内容(bytes)
+        :return: 文件ID
+        """
+        return self.request("POST", "files", data={"purpose": "batch"}, files={"file": (file_name, content, "application/jsonl")}).json()["id"]
+
+    def create_batch(self, input_file_id):
+        """
+        创建批处理任务
+        :return: 批处理任务字典，包含"id"、"status"等
+        """
+        return self.request("POST", "batches", json={
+            "input_file_id": input_file_id,
+            "endpoint": "/v1/chat/completions",
+            "completion_window": batch_completion_window,
+        }).json()
+
+    def get_batch(self, batch_id):
+        return self.request("GET", f"batches/{batch_id}").json()
+
+    def file_content(self, file_id):
+        return self.request("GET", f"files/{file_id}/content").text
+
+
+def batch_request_line(custom_id, system_prompt, request_prompt):
+    """
+    批处理请求文件中的一行，请求体与call_openai_api发出的请求一致
+    """
+    return json.dumps({
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": chatgpt_model,
+            "temperature": chatgpt_temperature,
+            "messages": [
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': request_prompt}
+            ],
+        },
+    }, ensure_ascii=False)
+
+
+def cached_summary(cache, system_prompt, request_prompt):
+    """
+    读取并解析缓存中的总结结果，与summarize_api的解析方式一致；无法解析的响应从缓存中删除
+    :return: 总结结果字典，缓存未命中或无法解析时返回None
+    """
+    key = ResponseCache.make_key(chatgpt_model, system_prompt, request_prompt, chatgpt_temperature)
+    response = cache.get(key)
+    if response is None:
+        return None
+    try:
+        return json.loads(escape_backslashes_except_newlines(response))
+    except json.JSONDecodeError:
+        cache.delete(key)
+        return None
+
+
+def step_requests(step, state, cache):
+    """
+    列出步骤在当前状态下将发出、且响应尚未缓存的API请求
+    :param step: 步骤名称，"format_processing"、"paper_analysis"或"paper_polishing"
+    :param state: 论文数据及设置所在的状态字典，paper_analysis需在格式处理结果写入后调用
+    :param cache: 响应缓存
+    :return: (系统提示词, 请求文本)列表。分层总结的reduce请求依赖各分块的总结结果，分块结果全部缓存后才会列出
+    """
+    paper = PaperDocument.from_state(state)
+    if step == "paper_analysis":
+        paper_data = build_paper_data(paper, sections_from_dicts(state["sections_processed"]))
+        paper_data_json = json.dumps(paper_data, indent=4)
+        if not use_map_reduce_summary(calculate_token(paper_data_json)):
+            requests = [(summarize_system_prompt, paper_data_json)]
+        else:
+            flat_sections = flatten_numbered_sections(paper_data["body"])
+            chunks = build_summary_chunks(paper_data["paper_title"], flat_sections)
+            chunk_results = [cached_summary(cache, section_summarize_system_prompt, chunk) for chunk in chunks]
+            if any(result is None for result in chunk_results):
+                requests = [(section_summarize_system_prompt, chunk) for chunk, result in zip(chunks, chunk_results) if result is None]
+            else:
+                requests = [(summarize_reduce_system_prompt, build_reduce_request(paper_data["paper_title"], flat_sections, chunk_results)[0])]
+    else:
+        if step == "paper_polishing":
+            jobs, _, _, _ = build_polish_jobs(paper, PolishResult.from_state(state), max_attempts=1, settings=state)
+        else:
+            jobs, _, _, _ = build_format_jobs(paper, FormatResult.from_state(state), state["translate_flag"], max_attempts=1, settings=state)
+        requests = [request[1:] for request in (describe_job(func, kwargs, state) for func, kwargs in jobs) if request is not None]
+    return [(system_prompt, request_prompt) for system_prompt, request_prompt in requests
+            if not cache.contains(ResponseCache.make_key(chatgpt_model, system_prompt, request_prompt, chatgpt_temperature))]
+
+
+def split_batches(lines):
+    """
+    按config.batch_max_requests及batch_max_file_bytes将请求行分为若干批
+    """
+    batches = [[]]
+    size = 0
+    for line in lines:
+        line_size = len(line.encode('utf8')) + 1
+        if batches[-1] and (len(batches[-1]) >= batch_max_requests or size + line_size > batch_max_file_bytes):
+            batches.append([])
+            size = 0
+        batches[-1].append(line)
+        size += line_size
+    return batches
+
+
+class BatchRunner:
+    """
+    通过Batch API预先获取处理所需的响应并写入响应缓存，之后按常规流程处理论文时全部命中缓存，结果以请求的缓存键(custom_id)合并回论文。
+    Batch API的费用约为同步调用的一半，适用于无需实时显示结果的批量处理。
+
+    各步骤依次执行（格式处理的结果是总结请求的输入）：每一步汇总所有论文尚未缓存的请求，分批提交并轮询至完成，
+    再以缓存中的结果执行该步骤，得到下一步的输入。已提交的批处理任务及其状态记录在工作目录中，中断后重新运行时继续轮询而不重复提交，失败或过期的任务则重新提交。
+    """
+
+    def __init__(self, client, directory, on_status=None):
+        """
+        :param client: BatchClient
+        :param directory: 工作目录，保存请求文件及已提交的批处理任务记录(batches.json)
+        :param on_status: 可选回调函数，轮询时以on_status(batch)的形式调用
+        """
+        self.client = client
+        self.directory = directory
+        self.on_status = on_status
+        self.cache = get_response_cache()
+        if self.cache is None:
+            raise RuntimeError("Batch API模式通过响应缓存合并结果，需启用config.response_cache_enabled")
+        os.makedirs(directory, exist_ok=True)
+        self.records_path = os.path.join(directory, "batches.json")
+        self.records = {}
+        if os.path.exists(self.records_path):
+            with open(self.records_path, "r", encoding='utf8') as file:
+                self.records = json.load(file)
+
+    def submit(self, lines):
+        """
+        提交一批请求，相同的请求已提交过时返回已有的批处理任务ID。
+        已有的任务已结束（失败、过期或取消）且没有结果文件时删除记录并重新提交
+        :param lines: 请求行列表
+        """
+        content = "\n".join(lines) + "\n"
+        digest = hashlib.sha256(content.encode('utf8')).hexdigest()[:16]
+        record = self.records.get(digest)
+        if isinstance(record, str):
+            # 旧版本的记录只保存批处理任务ID
+            record = {"id": record, "status": None, "output_file_id": None}
+        if record is not None:
+            if record["status"] not in batch_failed_statuses or record.get("output_file_id"):
+                return record["id"]
+            print(f"批处理任务{record['id']}{record['status']}，没有结果文件，重新提交")
+            del self.records[digest]
+            write_json_atomic(self.records_path, self.records)
+        input_path = os.path.join(self.directory, f"batch_input_{digest}.jsonl")
+        with open(input_path, "w", encoding='utf8') as file:
+            file.write(content)
+        file_id = self.client.upload_file(content.encode('utf8'), file_name=os.path.basename(input_path))
+        batch = self.client.create_batch(file_id)
+        print(f"已提交批处理任务{batch['id']}，共{len(lines)}个请求")
+        self.records[digest] = {"id": batch["id"], "status": batch.get("status"), "output_file_id": batch.get("output_file_id")}
+        write_json_atomic(self.records_path, self.records)
+        return batch["id"]
+
+    def record_status(self, batch):
+        """
+        将批处理任务的最新状态写入记录，重新运行时据此判断是否需要重新提交
+        :param batch: 批处理任务字典
+        """
+        for digest, record in self.records.items():
+            if record == batch["id"] or (isinstance(record, dict) and record["id"] == batch["id"]):
+                self.records[digest] = {"id": batch["id"], "status": batch["status"], "output_file_id": batch.get("output_file_id")}
+                write_json_atomic(self.records_path, self.records)
+                return
+
+    def wait(self, batch_id):
+        """
+        轮询批处理任务直至结束，结束时的状态写入记录
+        :return: 批处理任务字典
+        """
+        while True:
+            batch = self.client.get_batch(batch_id)
+            if self.on_status is not None:
+                self.on_status(batch)
+            if batch["status"] in batch_final_statuses:
+                self.record_status(batch)
+                return batch
+            time.sleep(batch_poll_interval)
+
+    def collect(self, batch):
+        """
+        下载批处理结果并写入响应缓存
+        :return: 写入的响应数
+        """
+        if not batch.get("output_file_id"):
+            print(f"批处理任务{batch['id']}{batch['status']}，没有结果文件")
+            return 0
+        responses = []
+        failed = 0
+        for line in self.client.file_content(batch["output_file_id"]).splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                failed += 1
+                continue
+            responses.append((record["custom_id"], response["body"]["choices"][0]["message"]["content"]))
+        self.cache.set_many(responses)
+        print(f"批处理任务{batch['id']}{batch['status']}：成功{len(responses)}个请求，失败{failed}个")
+        return len(responses)
+
+    def run_round(self, requests):
+        """
+        提交一轮请求并等待全部完成，结果写入响应缓存
+        :param requests: (系统提示词, 请求文本)列表
+        """
+        lines = {}
+        for system_prompt, request_prompt in requests:
+            custom_id = ResponseCache.make_key(chatgpt_model, system_prompt, request_prompt, chatgpt_temperature)
+            lines[custom_id] = batch_request_line(custom_id, system_prompt, request_prompt)
+        batch_ids = [self.submit(batch) for batch in split_batches(sorted(lines.values()))]
+        for batch_id in batch_ids:
+            self.collect(self.wait(batch_id))
+
+    def run(self, states):
+        """
+        为多篇论文预先获取全部步骤的响应。传入的状态字典不会被修改
+        :param states: 论文数据及设置所在的状态字典列表，键与st.session_state一致
+        """
+        states = [copy.deepcopy(state) for state in states]
+        plans = [["paper_polishing"] if state["polish_flag"] else ["format_processing", "paper_analysis"] for state in states]
+        for step_index in range(max(map(len, plans), default=0)):
+            active = [(state, plan[step_index]) for state, plan in zip(states, plans) if step_index < len(plan)]
+            # 分层总结的reduce请求在分块结果返回后才能构建，批处理部分失败时也在下一轮重新提交
+            for round_number in range(1, batch_max_rounds + 1):
+                requests = {request for state, step in active for request in step_requests(step, state, self.cache)}
+                if not requests:
+                    break
+                print(f"第{step_index + 1}步第{round_number}轮：{len(requests)}个请求")
+                self.run_round(sorted(requests))
+            # 以缓存中的结果执行该步骤，得到下一步的输入；仍未获取到的响应按同步方式调用
+            for state, step in active:
+                if step == "format_processing":
+                    format_processing(max_attempts=max_attempts, state=state)
+                elif step == "paper_polishing":
+                    paper_polishing(max_attempts=max_attempts, state=state)
+
+
+def batch_base_url(openai_service):
+    """
+    Batch API地址：默认与同步调用相同（官方API或config.proxy_base_url），可由config.batch_api_base_url指定
+    """
+    if batch_api_base_url:
+        return batch_api_base_url
+    return "https://api.openai.com/v1" if openai_service else proxy_base_url
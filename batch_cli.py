@@ -0,0 +1,301 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from background_jobs import AnalysisJob, write_json_atomic
+from batch_api import BatchClient, BatchRunner, batch_base_url
+from chatgpt_api import api_processing, is_failed_result
+from init import default_session_state
+from paper_io import PaperFormatError, loads, validate_paper_data, load_paper_file, iter_paper_files, read_directory_files
+from paper_document import sections_from_dicts, walk_sections
+from rate_limiter import get_rate_limiter, init_rate_limiter
+from response_cache import init_response_cache
+from utils import saved_session_state_keys
+from config.config import batch_output_dir, batch_paper_workers
+
+# 文件名中不允许出现的字符
+unsafe_file_name_pattern = re.compile(r'[\\/:*?"<>|\r\n\t]')
+
+
+def safe_file_name(name):
+    return unsafe_file_name_pattern.sub("_", name).strip()[:120] or "paper"
+
+
+def read_papers(path):
+    """
+    读取待处理的论文，论文文件按paper_io.load_paper_file解析及检查，格式不符的文件跳过
+    :param path: 论文文件所在目录、单个论文文件（JSON、gzip压缩的JSON、紧凑二进制文件或包含这些文件的zip压缩包）或JSONL文件
+    :return: 列表，每个元素为(论文名称, 论文数据字典)，论文名称用作输出文件名
+    """
+    if path.endswith(".jsonl"):
+        papers = []
+        with open(path, "r", encoding='utf8') as file:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    data = validate_paper_data(loads(line))
+                except PaperFormatError as e:
+                    print(f"读取第{line_number}行失败: {e}")
+                    continue
+                papers.append((safe_file_name(f'{line_number:05d} {data.get("title-area", "")}'), data))
+        return papers
+    if os.path.isdir(path):
+        files = read_directory_files(path)
+    else:
+        with open(path, "rb") as file:
+            files = [(os.path.basename(path), file.read())]
+    papers = []
+    for file_name, content in files:
+        try:
+            paper_files = list(iter_paper_files(file_name, content))
+        except zipfile.BadZipFile as e:
+            print(f"读取{file_name}失败: zip解压失败: {e}")
+            continue
+        for name, paper_content in paper_files:
+            try:
+                papers.append((safe_file_name(paper_name(name)), load_paper_file(paper_content)))
+            except PaperFormatError as e:
+                print(f"读取{name}失败: {e}")
+    return papers
+
+
+def paper_name(file_name):
+    """
+    由论文文件名得到论文名称（去掉扩展名），zip压缩包中的文件以"压缩包名称-文件名"命名
+    """
+    for extension in [".json.gz", ".json", ".sapk"]:
+        if file_name.endswith(extension):
+            file_name = file_name[:-len(extension)]
+            break
+    return file_name.replace(".zip/", "-")
+
+
+def build_state(data, args):
+    """
+    以默认值、论文数据及命令行的处理设置构建api_processing所需的状态字典
+    """
+    state = default_session_state()
+    state.update(data)
+    state["polish_flag"] = args.mode == "polish"
+    state["translate_flag"] = args.translate and not state["polish_flag"]
+    state["polish_language_is_english"] = args.english_polish
+    state["api_key-area"] = args.api_key
+    state["openai_service"] = args.openai_service
+    return state
+
+
+def init_worker_process(processes):
+    """
+    多进程处理时的子进程初始化：各进程拥有独立的限流器，RPM/TPM限额按进程数均分；
+    各进程使用独立的响应缓存数据库连接，共用同一数据库文件
+    """
+    init_rate_limiter(share=1 / processes)
+    init_response_cache()
+
+
+def process_paper(name, data, args):
+    """
+    处理一篇论文，处理进度以后台任务(background_jobs.AnalysisJob)的形式保存在输出目录的.checkpoints子目录中。
+    论文数据及处理结果均可序列化，可在子进程中执行；多进程处理时每个进程同时只处理一篇论文，记录中包含该论文的API用量
+    :return: 处理记录字典
+    """
+    output_path = os.path.join(args.output_dir, f"{name}.json")
+    if os.path.exists(output_path) and not args.force:
+        return {"name": name, "status": "skipped", "seconds": 0.0}
+    checkpoint_dir = os.path.join(args.output_dir, ".checkpoints")
+    # 输入内容或处理设置变化后，旧的检查点不再适用
+    fingerprint = hashlib.sha256(json.dumps([data, args.mode, args.translate, args.english_polish], sort_keys=True).encode('utf8')).hexdigest()
+    job_id = f"{safe_file_name(name)}-{fingerprint[:12]}"
+    job = None
+    if not args.force and os.path.exists(os.path.join(checkpoint_dir, f"{job_id}.json")):
+        try:
+            job = AnalysisJob.load(job_id, directory=checkpoint_dir)
+            # API设置不保存在检查点中，需重新提供
+            job.state["api_key-area"] = args.api_key
+            job.state["openai_service"] = args.openai_service
+            print(f"{name}: 从检查点继续处理")
+        except (OSError, json.JSONDecodeError, KeyError) as e:
+            print(f"{name}: 读取检查点失败，重新处理: {e}")
+    if job is None:
+        state = build_state(data, args)
+        steps = ["paper_polishing"] if state["polish_flag"] else ["format_processing", "paper_analysis"]
+        job = AnalysisJob(job_id=job_id, state=state, steps={step: {"done": 0, "total": 0, "finished": False} for step in steps},
+                          directory=checkpoint_dir)
+        job.save(save_state=True)
+
+    start = time.monotonic()
+    usage_before = get_rate_limiter().stats()
+    job.set_status("running")
+    try:
+        api_processing(state=job.state, job=job)
+        failures = failed_outputs(job.state)
+        if failures:
+            error = f'{job.state.get("failed_calls", 0)}个API调用失败，失败的部分：{"、".join(failures)}'
+            retry_failed_steps(job, error)
+            print(f"{name}: 处理失败: {error}")
+            record = {"name": name, "status": "failed", "error": error}
+        else:
+            record = {"name": name, "status": "finished"}
+    except Exception as e:
+        job.set_status("failed", error=str(e))
+        print(f"{name}: 处理失败: {e}")
+        record = {"name": name, "status": "failed", "error": str(e)}
+    record["seconds"] = time.monotonic() - start
+    if args.processes > 1:
+        record["usage"] = usage_difference(usage_before, get_rate_limiter().stats())
+    if record["status"] == "failed":
+        return record
+    result = {key: job.state[key] for key in saved_session_state_keys if key in job.state}
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, "w", encoding='utf8') as file:
+        json.dump(result, file, indent=4, ensure_ascii=False)
+    os.replace(temp_path, output_path)
+    for path in [job.path, job.state_path, job.checkpoint_path]:
+        if os.path.exists(path):
+            os.remove(path)
+    return record
+
+
+def failed_outputs(state):
+    """
+    检查处理结果中调用失败的部分。API调用失败时以带有失败标记的回退结果（参见chatgpt_api.is_failed_result）或总结失败标记写入处理结果，
+    检查点中的回退结果在恢复时同样会写回，因此除api_processing累计的失败调用数外，还按处理结果中的失败标记判断
+    :param state: 处理后的状态字典
+    :return: 失败部分的名称列表，全部成功时为空列表
+    """
+    failures = []
+    if state.get("failed_calls"):
+        failures.append("API调用")
+    if state["polish_flag"]:
+        keys = ["polished_title", "polished_introduction", "polished_abstract"]
+        section_keys = ["polished_sections"]
+    else:
+        keys = ["abstract_processed", "introduction_processed"]
+        section_keys = ["sections_processed"]
+        if state["translate_flag"]:
+            keys += ["zh_title-area", "zh_institutes-area", "zh_keywords-area", "zh_abstract_processed", "zh_introduction_processed"]
+            section_keys.append("zh_sections_processed")
+    failures.extend(key for key in keys if is_failed_result(state.get(key)))
+    for key in section_keys:
+        failures.extend(section.title for section in walk_sections(sections_from_dicts(state.get(key) or []))
+                        if is_failed_result(section.title) or is_failed_result(section.texts))
+    summary_result = state.get("summary_result")
+    if not state["polish_flag"] and isinstance(summary_result, dict) and summary_result.get("flag") == "调用失败":
+        failures.append("summary_result")
+    return failures
+
+
+def retry_failed_steps(job, error):
+    """
+    将处理失败的任务标记为失败并保留检查点，各步骤重置为未完成：重新运行时从检查点中的处理结果继续，
+    已成功的章节按指纹复用，只重新调用失败的部分
+    """
+    with job.lock:
+        for progress in job.steps.values():
+            progress.update({"done": 0, "total": 0, "finished": False})
+        job.checkpoints = {}
+        job.rewrite_checkpoints()
+        job.state["failed_calls"] = 0
+        job.status = "failed"
+        job.error = error
+    job.save(save_state=True)
+
+
+def run_batch_api(papers, args):
+    """
+    以Batch API预先获取全部待处理论文所需的响应，写入响应缓存；之后按常规流程处理时全部命中缓存。
+    已提交的批处理任务记录在输出目录的.batch子目录中，中断后重新运行时继续等待而不重复提交
+    """
+    pending = [data for name, data in papers if args.force or not os.path.exists(os.path.join(args.output_dir, f"{name}.json"))]
+    if not pending:
+        return
+    client = BatchClient(api_key=args.api_key, base_url=args.batch_base_url or batch_base_url(args.openai_service))
+    runner = BatchRunner(client, directory=os.path.join(args.output_dir, ".batch"),
+                         on_status=lambda batch: print(f'批处理任务{batch["id"]}: {batch["status"]} {batch.get("request_counts", "")}'))
+    print(f"以Batch API提交{len(pending)}篇论文的请求")
+    runner.run([build_state(data, args) for data in pending])
+
+
+def usage_difference(before, after):
+    return {key: after[key] - before[key] for key in ["requests", "used_tokens", "retries"]}
+
+
+def print_summary(records, seconds, usage):
+    """
+    输出吞吐量统计
+    :param usage: API用量，包含"requests"、"used_tokens"、"retries"
+    """
+    counts = {status: sum(record["status"] == status for record in records) for status in ["finished", "skipped", "failed"]}
+    requests = usage["requests"]
+    used_tokens = usage["used_tokens"]
+    print(f'批量处理结束：共{len(records)}篇论文，完成{counts["finished"]}篇，跳过{counts["skipped"]}篇，失败{counts["failed"]}篇，'
+          f'总耗时{seconds:.1f}秒')
+    if seconds > 0:
+        print(f'吞吐量：{counts["finished"] * 60 / seconds:.2f}篇/分钟，API调用{requests}次（{requests * 60 / seconds:.1f}次/分钟），'
+              f'token用量{used_tokens}（{used_tokens / seconds:.1f} token/秒），'
+              f'重试{usage["retries"]}次')
+    for record in records:
+        if record["status"] == "failed":
+            print(f'失败：{record["name"]}: {record["error"]}')
+
+
+def main(argv=None):
+    """
+    命令行批量处理论文，无需启动Streamlit。输入为论文文件所在目录（"保存"页面下载的各格式文件及其zip压缩包）或JSONL文件（每行一篇论文），
+    处理结果以相同的JSON格式写入输出目录，可直接在"导入"页面上传。
+    论文之间按--paper-workers并发处理，每篇论文内的章节按config.max_workers并发调用API，所有调用共享同一限流器。
+    中断后以相同参数重新运行即可继续：已输出的论文被跳过，未完成的论文从检查点（已完成的步骤及章节）继续处理；
+    有API调用失败的论文不输出结果，重新运行时只重新调用失败的部分。
+    :param argv: 命令行参数，默认为sys.argv[1:]
+    :return: 退出码，有论文处理失败时为1
+    """
+    parser = argparse.ArgumentParser(description="批量处理论文（格式处理及翻译、总结评审或润色），结果可在\"导入\"页面上传")
+    parser.add_argument("input", help="论文文件所在目录、单个论文文件（.json、.json.gz、.sapk或zip压缩包）或JSONL文件（每行一篇论文）")
+    parser.add_argument("--output-dir", default=batch_output_dir, help="处理结果输出目录")
+    parser.add_argument("--mode", choices=["summary", "polish"], default="summary", help="summary: 格式处理及总结评审；polish: 润色")
+    parser.add_argument("--translate", action="store_true", help="格式处理时翻译为中文（summary模式）")
+    parser.add_argument("--english-polish", action="store_true", help="英文润色（polish模式，默认中文润色）")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY", ""), help="API Key，默认读取环境变量OPENAI_API_KEY")
+    parser.add_argument("--openai-service", action="store_true", help="使用官方API服务（默认使用config.proxy_base_url）")
+    parser.add_argument("--paper-workers", type=int, default=batch_paper_workers, help="同时处理的论文数（线程）")
+    parser.add_argument("--processes", type=int, default=1, help="以多个进程同时处理论文，大于1时替代--paper-workers，各进程的RPM/TPM限额按进程数均分")
+    parser.add_argument("--force", action="store_true", help="忽略已有的输出及检查点，重新处理全部论文")
+    parser.add_argument("--batch-api", action="store_true", help="先以OpenAI Batch API提交全部请求（费用约为同步调用的一半，最长等待config.batch_completion_window），结果经响应缓存合并")
+    parser.add_argument("--batch-base-url", default=None, help="Batch API地址，默认为config.batch_api_base_url或与同步调用相同的地址")
+    args = parser.parse_args(argv)
+    if not args.api_key:
+        parser.error("请通过--api-key或环境变量OPENAI_API_KEY提供API Key")
+
+    papers = read_papers(args.input)
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.force:
+        shutil.rmtree(os.path.join(args.output_dir, ".checkpoints"), ignore_errors=True)
+    start = time.monotonic()
+    if args.batch_api:
+        run_batch_api(papers, args)
+    if args.processes > 1:
+        print(f"共{len(papers)}篇论文，{args.processes}个进程同时处理")
+        with ProcessPoolExecutor(max_workers=args.processes, initializer=init_worker_process, initargs=(args.processes,)) as executor:
+            futures = [executor.submit(process_paper, name, data, args) for name, data in papers]
+            records = [future.result() for future in futures]
+        usage = {key: sum(record.get("usage", {}).get(key, 0) for record in records) for key in ["requests", "used_tokens", "retries"]}
+    else:
+        print(f"共{len(papers)}篇论文，同时处理{args.paper_workers}篇")
+        usage_before = get_rate_limiter().stats()
+        with ThreadPoolExecutor(max_workers=max(1, args.paper_workers), thread_name_prefix="batch-paper") as executor:
+            records = list(executor.map(lambda paper: process_paper(paper[0], paper[1], args), papers))
+        usage = usage_difference(usage_before, get_rate_limiter().stats())
+    seconds = time.monotonic() - start
+    print_summary(records, seconds, usage)
+    write_json_atomic(os.path.join(args.output_dir, "batch_summary.json"), {"seconds": seconds, "papers": records})
+    return 1 if any(record["status"] == "failed" for record in records) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,32 +1,160 @@
 import json
 import streamlit as st
-import copy
+import threading
+import httpx
 from openai import OpenAI
-from utils import escape_backslashes_except_newlines, add_section_numbers, get_section_summary
-from config.config import (chatgpt_model, paragraph_process_system_prompt,paragraph_process_with_translate_system_prompt,
-                           summarize_system_prompt, translate_system_prompt, english_polish_system_prompt,
-                           chinese_polish_system_prompt, max_attempts)
+from utils import (StreamingJsonFieldExtractor, escape_backslashes_except_newlines, get_section_summary, section_fingerprint,
+                   calculate_token, calculate_tokens, memoized_token_counts, section_token_counts, pack_by_token_budget, split_oversized_sections,
+                   flatten_numbered_sections, nest_section_summaries)
+from executor import run_jobs, write_results, write_target
+from paper_document import (PaperDocument, FormatResult, AnalysisResult, PolishResult, sections_from_dicts, copy_sections, walk_sections,
+                            numbered_sections)
+from response_cache import ResponseCache, get_response_cache
+from rate_limiter import get_rate_limiter
+from config.config import (chatgpt_model, chatgpt_temperature, paragraph_process_system_prompt,paragraph_process_with_translate_system_prompt,
+                           summarize_system_prompt, section_summarize_system_prompt, summarize_reduce_system_prompt,
+                           summarize_mode, summarize_max_input_tokens, summarize_chunk_tokens, translate_system_prompt, english_polish_system_prompt,
+                           chinese_polish_system_prompt, batch_translate_system_prompt, batch_translate_token_budget,
+                           batch_translate_max_text_tokens, stream_responses, progress_render_interval, max_attempts, proxy_base_url, api_max_connections,
+                           api_max_keepalive_connections, api_keepalive_expiry, api_connect_timeout, api_timeout)
+
+
+# OpenAI客户端注册表，键为(api_key, base_url, openai_service)。
+# 模块在进程内只加载一次，因此客户端及其HTTP连接池可跨调用、跨Streamlit重运行复用，避免重复建立连接及TLS握手
+openai_clients = {}
+openai_clients_lock = threading.Lock()
+# 润色、格式处理及翻译失败时返回的回退结果带有的文本前缀，据此判断结果是否为调用失败时的回退结果
+polish_failure_marker = "<润色失败>"
+format_failure_marker = "<处理失败>"
+translate_failure_marker = "<翻译失败>"
+failure_markers = (polish_failure_marker, format_failure_marker, translate_failure_marker)
+failed_calls_lock = threading.Lock()
+
+
+def get_openai_client(api_key, openai_service):
+    """
+    获取（必要时创建）可复用的OpenAI客户端。
+    :param api_key: API Key
+    :param openai_service: 是否使用官方API服务
+    :return: OpenAI客户端
+    """
+    base_url = None if openai_service else proxy_base_url
+    client_key = (api_key, base_url, openai_service)
+    with openai_clients_lock:
+        client = openai_clients.get(client_key)
+        if client is None:
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=api_max_connections,
+                    max_keepalive_connections=api_max_keepalive_connections,
+                    keepalive_expiry=api_keepalive_expiry,
+                )
+            )
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=httpx.Timeout(api_timeout, connect=api_connect_timeout),
+                http_client=http_client,
+                # 重试由限流器统一处理（退避、Retry-After及自适应并发），关闭SDK内置重试
+                max_retries=0,
+            )
+            openai_clients[client_key] = client
+    return client
+
+
+def call_openai_api(system_prompt, request_prompt, use_cache=True, on_delta=None, state=None):
+    """
+    调用OpenAI API，并处理响应。相同的请求优先从响应缓存中返回，实际请求经由共享限流器发出（参见rate_limiter）。
+    :param system_prompt: 系统提示词
+    :param request_text: 请求提示词
+    :param use_cache: 是否使用响应缓存
+    :param on_delta: 可选回调函数，传入时以流式方式(stream=True)接收响应，每收到一段新内容调用on_delta(delta)
+    :param state: 读取API Key等设置的状态字典，默认为st.session_state，后台任务中传入任务自身的状态
+    """
+    state = st.session_state if state is None else state
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        cache_key = ResponseCache.make_key(chatgpt_model, system_prompt, request_prompt, chatgpt_temperature)
+        cached_response = cache.get(cache_key)
+        if cached_response is not None:
+            if on_delta is not None:
+                on_delta(cached_response)
+            return cached_response
+
+    client = get_openai_client(api_key=state["api_key-area"], openai_service=state["openai_service"])
+    messages = [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'user', 'content': request_prompt}
+    ]
+    # 预估token用量：提示词token数加上与请求文本等长的响应，响应后按实际用量校正
+    system_tokens, request_tokens = calculate_tokens([system_prompt, request_prompt])
+    estimated_tokens = system_tokens + 2 * request_tokens
+
+    def request():
+        if on_delta is None:
+            completion = client.chat.completions.create(model=chatgpt_model, temperature=chatgpt_temperature, messages=messages)
+            return completion.choices[0].message.content
+        stream = client.chat.completions.create(model=chatgpt_model, temperature=chatgpt_temperature, messages=messages, stream=True)
+        chunks = []
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks.append(chunk.choices[0].delta.content)
+                    on_delta(chunks[-1])
+        except Exception as e:
+            if chunks:
+                # 已传出部分内容时不再由限流器重试，交由调用方以新的流式回调重新请求
+                raise RuntimeError(f"流式响应中断: {e}") from e
+            raise
+        return "".join(chunks)
+
+    rate_limiter = get_rate_limiter()
+    response = rate_limiter.call(request, tokens=estimated_tokens)
+    rate_limiter.record_usage(estimated_tokens, system_tokens + request_tokens + calculate_token(response))
+
+    if cache is not None:
+        cache.set(cache_key, response)
+    return response
+
+
+def make_stream_callback(fields, on_partial):
+    """
+    创建流式响应回调，从流式返回的JSON中增量提取指定字段，并以on_partial(values)的形式传出已生成的内容
+    :param fields: 需要提取的JSON字段名列表
+    :param on_partial: 回调函数，参数为字段名到已生成内容的字典；为None时返回None，即不使用流式响应
+    """
+    if on_partial is None:
+        return None
+    extractor = StreamingJsonFieldExtractor(fields)
+
+    def on_delta(delta):
+        on_partial(extractor.feed(delta))
 
+    return on_delta
 
-def call_openai_api(system_prompt, request_prompt):
+
+def make_partial_writer(field_targets):
+    """
+    创建将流式生成的字段内容实时写回目标位置的回调函数
+    :param field_targets: 字典，键为JSON字段名，值为写回位置(container, key)
     """
-    调用OpenAI API，并处理响应。
+    def on_partial(values):
+        for field, (container, key) in field_targets.items():
+            if field in values:
+                write_target(container, key, values[field])
+
+    return on_partial
+
+
+def invalidate_cached_response(system_prompt, request_prompt):
+    """
+    删除缓存中的响应，用于丢弃无法解析的结果，避免重试时再次命中
     :param system_prompt: 系统提示词
     :param request_text: 请求提示词
     """
-    api_key = st.session_state["api_key-area"]
-    base_url = "https://api.aiguoguo199.com/v1" if not st.session_state["openai_service"] else None
-    client = OpenAI(api_key=api_key, base_url=base_url)
-    response = client.chat.completions.create(
-        model=chatgpt_model,
-        temperature=0,
-        messages=[
-            {'role': 'system', 'content': system_prompt},
-            {'role': 'user', 'content': request_prompt}
-        ]
-    )
-    response = response.choices[0].message.content
-    return response
+    cache = get_response_cache()
+    if cache is not None:
+        cache.delete(ResponseCache.make_key(chatgpt_model, system_prompt, request_prompt, chatgpt_temperature))
 
 
 def test_api():
@@ -38,18 +166,37 @@ def test_api():
     try:
         system_prompt = "say hello to me"
         request_prompt = "hello"
-        _ = call_openai_api(system_prompt=system_prompt, request_prompt=request_prompt)
+        _ = call_openai_api(system_prompt=system_prompt, request_prompt=request_prompt, use_cache=False)
         st.session_state['api_flag'] = True
     except Exception as e:
         print(e)
 
 
-def polish_api(text, max_attempts):
+def record_failed_call(state=None):
+    """
+    记录重试次数用尽后仍失败、以回退结果返回的API调用，累计在状态字典的failed_calls键中，批量处理据此判断论文是否处理失败
+    :param state: 状态字典，默认为st.session_state
+    """
+    state = st.session_state if state is None else state
+    with failed_calls_lock:
+        state["failed_calls"] = state.get("failed_calls", 0) + 1
+
+
+def is_failed_result(value):
+    """
+    判断处理结果是否为调用失败时的回退结果（带有failure_markers中的前缀），空文本等无需调用API的结果不视为失败
+    """
+    return isinstance(value, str) and value.startswith(failure_markers)
+
+
+def polish_api(text, max_attempts, on_partial=None, state=None):
     """
     使用OpenAI的API润色论文文本。
 
     :param text: str, 需要润色的文本。
     :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param on_partial: 可选回调函数，传入时以流式方式接收响应，并以on_partial({"polished_text": ...})的形式传出已生成的内容。
+    :param state: 状态字典，默认为st.session_state，参见call_openai_api
     :return: str, 润色后的文本或在重试次数用尽后的失败信息。
     """
     if not text.strip():
@@ -59,31 +206,39 @@ def polish_api(text, max_attempts):
     text = text.replace('"', "'")
 
     # 根据润色的语言选择不同的提示信息
-    system_prompt = english_polish_system_prompt if st.session_state[
-        "polish_language_is_english"] else chinese_polish_system_prompt
+    state = st.session_state if state is None else state
+    system_prompt = english_polish_system_prompt if state["polish_language_is_english"] else chinese_polish_system_prompt
 
     for attempt in range(1, max_attempts + 1):
         print(f"Attempt {attempt}: Polishing text")
         try:
-            response = call_openai_api(system_prompt=system_prompt, request_prompt=text)
+            response = call_openai_api(system_prompt=system_prompt, request_prompt=text, on_delta=make_stream_callback(["polished_text"], on_partial), state=state)
             response = escape_backslashes_except_newlines(response)
             result = json.loads(response)
-            return result.get("polished_text", f"<润色失败>{text}")
+            if "polished_text" in result:
+                return result["polished_text"]
+            record_failed_call(state)
+            return f"{polish_failure_marker}{text}"
         except json.JSONDecodeError:
             print(f"Attempt {attempt} failed with JSON decode error")
+            invalidate_cached_response(system_prompt=system_prompt, request_prompt=text)
         except Exception:
             print(f"Attempt {attempt} failed with error")
 
     print(f"Failed after {max_attempts} attempts, returning original text with failure notice.")
-    return f"<润色失败>{text}"
+    record_failed_call(state)
+    return f"{polish_failure_marker}{text}"
 
 
-def paragraph_translate_and_format_processing_api(text, translate_flag, max_attempts):
+def paragraph_translate_and_format_processing_api(text, translate_flag, max_attempts, on_partial=None, state=None):
     """
     调用chatgpt api调整论文段落格式、公式显示及去除引用，并根据translate_flag决定是否翻译为中文
     :param text: 需要处理的论文片段
     :param translate_flag: 是否需要翻译为中文
     :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param on_partial: 可选回调函数，传入时以流式方式接收响应，并以字段名到已生成内容的字典形式传出en_context/zh_context（或context）
+    :param state: 状态字典，默认为st.session_state，参见call_openai_api
+    :return: 处理结果，翻译时为(英文, 中文)元组。重试次数用尽后返回输入文本，其中不翻译时的处理结果及翻译时的中文带有format_failure_marker前缀
     """
     # 将text中所有"替换为'避免json解析出现问题
     if not text.strip():
@@ -93,10 +248,11 @@ def paragraph_translate_and_format_processing_api(text, translate_flag, max_atte
     text = text.replace('"', "'")
 
     system_prompt = paragraph_process_with_translate_system_prompt if translate_flag else paragraph_process_system_prompt
+    fields = ['en_context', 'zh_context'] if translate_flag else ['context']
     for attempt in range(1, 1 + max_attempts):  # 最多尝试两次
         print(f"Attempt {attempt}: Processing text")
         try:
-            response = call_openai_api(system_prompt=system_prompt, request_prompt=text)
+            response = call_openai_api(system_prompt=system_prompt, request_prompt=text, on_delta=make_stream_callback(fields, on_partial), state=state)
             result = escape_backslashes_except_newlines(text=response)
 
             result_dict = json.loads(result)
@@ -106,41 +262,48 @@ def paragraph_translate_and_format_processing_api(text, translate_flag, max_atte
                 return result_dict.get('context')
         except json.JSONDecodeError:
             print(f"Attempt {attempt} failed with JSON decode error")
+            invalidate_cached_response(system_prompt=system_prompt, request_prompt=text)
         except Exception as e:
             print(f"Attempt {attempt} failed with error")
 
     print(f"超过最大测试次数：{max_attempts}，调用失败")
-    # 所有尝试失败后的回退，按照输入文本返回
-    return (text, text) if translate_flag else text
+    record_failed_call(state)
+    # 所有尝试失败后的回退，按照输入文本返回，并带有失败标记
+    return (text, f"{format_failure_marker}{text}") if translate_flag else f"{format_failure_marker}{text}"
 
 
-def summarize_api(text, max_attempts):
+def summarize_api(text, max_attempts, system_prompt=summarize_system_prompt, state=None):
     """
     ChatGPT API分析整篇文章
     :param 待总结文章数据
     :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param system_prompt: 系统提示词，默认为整篇论文总结提示词，分块总结及汇总时使用对应的提示词
+    :param state: 状态字典，默认为st.session_state，参见call_openai_api
     """
-    system_prompt = summarize_system_prompt
     for attempt in range(1, 1 + max_attempts):
         print(f"Attempt {attempt}: Summarizing article")
         try:
-            response = call_openai_api(system_prompt=system_prompt, request_prompt=text)
+            response = call_openai_api(system_prompt=system_prompt, request_prompt=text, state=state)
             result = escape_backslashes_except_newlines(response)
             return json.loads(result)
         except json.JSONDecodeError:
             print(f"Attempt {attempt} failed with JSON decode error")
+            invalidate_cached_response(system_prompt=system_prompt, request_prompt=text)
         except Exception:
             print(f"Attempt {attempt} failed with error")
 
     print(f"超过最大测试次数：{max_attempts}，调用失败")
+    record_failed_call(state)
     return {"flag": "调用失败"}
 
 
-def translate_api(text, max_attempts):
+def translate_api(text, max_attempts, state=None):
     """
     调用chatgpt api翻译文本
     :param text: 文本
     :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param state: 状态字典，默认为st.session_state，参见call_openai_api
+    :return: 译文，重试次数用尽或响应中缺少译文时返回带有translate_failure_marker前缀的原文
     """
     if not text.strip():
         return text
@@ -149,155 +312,546 @@ def translate_api(text, max_attempts):
     for attempt in range(1, 1 + max_attempts):  # 最多尝试两次
         print(f"Attempt {attempt}: Translating text")
         try:
-            response = call_openai_api(system_prompt=system_prompt, request_prompt=text)
+            response = call_openai_api(system_prompt=system_prompt, request_prompt=text, state=state)
             result = json.loads(response)
-            return result.get('zh_text', text)  # 如果没有'zh_text'键，则返回原文本
+            if 'zh_text' in result:
+                return result['zh_text']
+            record_failed_call(state)
+            return f"{translate_failure_marker}{text}"
         except json.JSONDecodeError:
             print(f"Attempt {attempt} failed with JSON decode error")
+            invalidate_cached_response(system_prompt=system_prompt, request_prompt=text)
         except Exception:
             print(f"Attempt {attempt} failed with error")
 
     print(f"超过最大测试次数：{max_attempts}，调用失败")
-    return text  # 所有尝试失败后，返回原文本
+    record_failed_call(state)
+    return f"{translate_failure_marker}{text}"  # 所有尝试失败后，返回带有失败标记的原文本
 
 
-def format_processing(max_attempts):
+def batch_translate_request(texts):
     """
-    处理论文格式(段落格式、公式)，并根据translate_flag确定是否需要翻译为中文
+    将多段文本以序号为键打包为批量翻译的请求文本
+    """
+    return json.dumps({str(index): text for index, text in enumerate(texts)}, ensure_ascii=False, indent=4)
+
+
+def batch_translate_api(texts, max_attempts, state=None):
+    """
+    调用chatgpt api在单次请求中翻译多段短文本，文本以键值形式打包为JSON，按键解包翻译结果。
+    响应无法解析或缺少部分键时，将批次一分为二分别重试，直至单段文本退化为translate_api。
+    :param texts: 文本列表
+    :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param state: 状态字典，默认为st.session_state，参见call_openai_api
+    :return: 与texts顺序一致的翻译结果列表，翻译失败的文本为translate_api的失败回退结果
+    """
+    if len(texts) == 1:
+        return [translate_api(text=texts[0], max_attempts=max_attempts, state=state)]
+
+    system_prompt = batch_translate_system_prompt
+    request_prompt = batch_translate_request(texts)
+    for attempt in range(1, 1 + max_attempts):
+        print(f"Attempt {attempt}: Translating {len(texts)} texts in batch")
+        try:
+            response = call_openai_api(system_prompt=system_prompt, request_prompt=request_prompt, state=state)
+            result = json.loads(response)['zh_texts']
+            return [result[str(index)] for index in range(len(texts))]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            print(f"Attempt {attempt} failed with JSON decode error")
+            invalidate_cached_response(system_prompt=system_prompt, request_prompt=request_prompt)
+        except Exception:
+            print(f"Attempt {attempt} failed with error")
+
+    print("批量翻译失败，拆分为两个批次重试")
+    middle = len(texts) // 2
+    return (batch_translate_api(texts=texts[:middle], max_attempts=max_attempts, state=state)
+            + batch_translate_api(texts=texts[middle:], max_attempts=max_attempts, state=state))
+
+
+def build_translate_jobs(translations, max_attempts, state=None):
+    """
+    将待翻译文本按token预算打包为批量翻译任务，较长的文本单独翻译
+    :param translations: 列表，每个元素为(text, target)元组，target为翻译结果的写回位置(container, key)
     :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param state: 状态字典，默认为st.session_state，参见call_openai_api
+    :return: (jobs, targets)，格式与run_jobs及write_results一致
+    """
+    jobs = []
+    targets = []
+    small_texts = []
+    pending_translations = []
+    for text, target in translations:
+        if not text.strip():
+            # 空文本无需翻译，直接写回
+            container, key = target
+            write_target(container, key, text)
+        else:
+            pending_translations.append((text, target))
+    token_counts = memoized_token_counts([text for text, _ in pending_translations])
+    for (text, target), num_tokens in zip(pending_translations, token_counts):
+        if num_tokens > batch_translate_max_text_tokens:
+            jobs.append((translate_api, {"text": text, "max_attempts": max_attempts, "state": state}))
+            targets.append([target])
+        else:
+            small_texts.append((text, target, num_tokens))
+
+    batches = pack_by_token_budget(small_texts, [num_tokens for _, _, num_tokens in small_texts], batch_translate_token_budget)
+    for batch in batches:
+        if len(batch) == 1:
+            jobs.append((translate_api, {"text": batch[0][0], "max_attempts": max_attempts, "state": state}))
+        else:
+            jobs.append((batch_translate_api, {"texts": [text for text, _, _ in batch], "max_attempts": max_attempts, "state": state}))
+        targets.append([target for _, target, _ in batch])
+    return jobs, targets
+
+
+def run_processing_jobs(jobs, targets, max_workers=None, on_progress=None, checkpoint=None):
+    """
+    并发执行处理任务，每个任务完成后立即将结果写回对应位置。
+    传入on_progress时，待写回的位置先被置空，执行期间每隔config.progress_render_interval秒调用一次on_progress()刷新进度显示。
+    :param jobs: 任务列表，格式与run_jobs一致
+    :param targets: 与jobs一一对应的写回位置列表，格式与write_results一致
+    :param max_workers: int, 最大并发数，默认为config.max_workers。
+    :param on_progress: 可选的无参回调函数
+    :param checkpoint: 可选的任务检查点(background_jobs.StepCheckpoint)。检查点中已有结果的任务不再执行，直接写回结果；
+                       新完成的任务结果写入检查点，用于后台任务中断后从最后完成的章节继续处理
+    """
+    completed = {}
+    if checkpoint is not None:
+        checkpoint.start(total=len(jobs))
+        completed = checkpoint.results
+        if completed:
+            print(f"从检查点恢复{len(completed)}个已完成的任务")
+    pending_indexes = [index for index in range(len(jobs)) if index not in completed]
+
+    if on_progress is not None:
+        for index in pending_indexes:
+            for container, key in targets[index]:
+                write_target(container, key, "")
+    write_results([targets[index] for index in completed], [completed[index] for index in completed])
+
+    def on_result(index, result):
+        write_results([targets[pending_indexes[index]]], [result])
+        if checkpoint is not None:
+            checkpoint.record(pending_indexes[index], result)
+
+    run_jobs([jobs[index] for index in pending_indexes], max_workers=max_workers, on_result=on_result, on_poll=on_progress, poll_interval=progress_render_interval)
+
+
+class FingerprintTarget:
     """
+    章节处理结果的写回位置：将结果写入章节的同名属性，章节的标题及正文均不是失败的回退结果（参见is_failed_result）时记录章节指纹。
+    指纹只在处理成功后记录，调用失败的章节（包括标题翻译失败的章节）下次处理时重新调用API，而不是一直复用失败的结果
+    """
+
+    def __init__(self, section, fingerprints, fingerprint):
+        """
+        :param section: 写入结果的章节(paper_document.Section)
+        :param fingerprints: 章节ID到指纹的字典，即处理结果的fingerprints
+        :param fingerprint: 章节的指纹
+        """
+        self.section = section
+        self.fingerprints = fingerprints
+        self.fingerprint = fingerprint
+
+    def __setitem__(self, key, value):
+        setattr(self.section, key, value)
+        # 流式处理时会先写入部分内容，以最后写入的完整结果为准
+        if is_failed_result(self.section.title) or is_failed_result(self.section.texts):
+            self.fingerprints.pop(self.section.id, None)
+        else:
+            self.fingerprints[self.section.id] = self.fingerprint
+
+
+def build_format_jobs(paper, previous, translate_flag, max_attempts, settings, streaming=False):
+    """
+    构建格式处理阶段的API调用任务，仅处理指纹发生变化的章节，未修改章节直接复用上次的处理结果
+    :param paper: 待处理的论文(paper_document.PaperDocument)
+    :param previous: 上次的处理结果(paper_document.FormatResult)
+    :param translate_flag: 是否翻译为中文
+    :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param settings: API设置字典（api_key-area、openai_service），参见call_openai_api
+    :param streaming: 是否以流式方式接收响应，并将已生成的内容实时写回对应位置
+    :return: (jobs, targets, result, reused_count)，result为新的FormatResult，任务结果写回其中；reused_count为复用处理结果的章节数
+    """
+    # 任务列表及对应的写回位置
+    jobs = []
+    targets = []
+    # 待翻译的短文本及写回位置，最后统一打包为批量翻译任务
+    translations = []
+    result = FormatResult()
+
     # 1. 翻译论文标题、论文机构、论文关键词
-    print("step 1.1: 翻译论文标题、论文机构、论文关键词...")
-    if st.session_state["translate_flag"]:
-        st.session_state['zh_title-area'] = translate_api(text=st.session_state['title-area'], max_attempts=max_attempts)
-        st.session_state['zh_institutes-area'] = translate_api(text=st.session_state['institutes-area'], max_attempts=max_attempts)
-        st.session_state['zh_keywords-area'] = translate_api(text=st.session_state['keywords-area'], max_attempts=max_attempts)
+    if translate_flag:
+        for text, field in [(paper.title, "zh_title"), (paper.institutes, "zh_institutes"), (paper.keywords, "zh_keywords")]:
+            translations.append((text, (result, field)))
     # 2. 处理论文通用章节: abstract, introduction
-    print("step 1.2: 处理论文通用章节...")
-    if st.session_state["translate_flag"]:
-        st.session_state['abstract_processed'], st.session_state['zh_abstract_processed'] = paragraph_translate_and_format_processing_api(text=st.session_state["abstract-area"], translate_flag=st.session_state["translate_flag"], max_attempts=max_attempts)
-        st.session_state['introduction_processed'], st.session_state['zh_introduction_processed'] = paragraph_translate_and_format_processing_api(text=st.session_state["introduction-area"], translate_flag=st.session_state["translate_flag"], max_attempts=max_attempts)
+    fields = ['en_context', 'zh_context'] if translate_flag else ['context']
+    for name in ['abstract', 'introduction']:
+        if translate_flag:
+            target = [(result, name), (result, f"zh_{name}")]
+        else:
+            target = [(result, name)]
+        kwargs = {"text": getattr(paper, name), "translate_flag": translate_flag, "max_attempts": max_attempts, "state": settings}
+        if streaming:
+            kwargs["on_partial"] = make_partial_writer(dict(zip(fields, target)))
+        jobs.append((paragraph_translate_and_format_processing_api, kwargs))
+        targets.append(target)
+
+    # 3. 处理论文正文，仅处理指纹发生变化的章节（含新增章节），未修改章节复用上次的处理结果
+    previous_en_sections = {section.id: section for section in walk_sections(previous.sections)}
+    previous_zh_sections = {section.id: section for section in walk_sections(previous.zh_sections)}
+    reused_count = 0
+    # 处理结果为章节树结构的副本，字符串内容与原章节树共享
+    result.sections = copy_sections(paper.sections)
+    en_sections = walk_sections(result.sections)
+    if translate_flag:
+        result.zh_sections = copy_sections(paper.sections)
+        zh_sections = walk_sections(result.zh_sections)
     else:
-        st.session_state['abstract_processed'] = paragraph_translate_and_format_processing_api(text=st.session_state["abstract-area"], translate_flag=st.session_state["translate_flag"], max_attempts=max_attempts)
-        st.session_state['introduction_processed'] = paragraph_translate_and_format_processing_api(text=st.session_state["introduction-area"], translate_flag=st.session_state["translate_flag"], max_attempts=max_attempts)
-
-    def sections_process(en_section, zh_section, level=0, translate_flag=False):
+        zh_sections = [None] * len(en_sections)
+    for en_section, zh_section in zip(en_sections, zh_sections):
+        fingerprint = section_fingerprint({"title": en_section.title, "texts": en_section.texts}, translate_flag)
+        if (en_section.id in previous_en_sections and previous.fingerprints.get(en_section.id) == fingerprint
+                and (not translate_flag or en_section.id in previous_zh_sections)):
+            result.fingerprints[en_section.id] = fingerprint
+            en_section.texts = previous_en_sections[en_section.id].texts
+            if translate_flag:
+                zh_section.title = previous_zh_sections[en_section.id].title
+                zh_section.texts = previous_zh_sections[en_section.id].texts
+            reused_count += 1
+            continue
+        # 调用失败的回退结果带有失败标记，不记录指纹
         if translate_flag:
+            # 中文标题及正文均翻译成功后记录指纹
+            zh_target = FingerprintTarget(zh_section, result.fingerprints, fingerprint)
             # 翻译章节标题为中文
-            zh_section['title'] = translate_api(text=en_section['title'], max_attempts=max_attempts)
+            translations.append((en_section.title, (zh_target, 'title')))
             # 调整论文段落格式、公式显示及去除引用，并翻译为中文
-            en_section['texts'], zh_section['texts'] = paragraph_translate_and_format_processing_api(text=en_section['texts'], translate_flag=st.session_state["translate_flag"], max_attempts=max_attempts)
-            # 如果当前章节有子章节，则递归遍历子章节
-            for en_subsection, zh_subsection in zip(en_section['sections'], zh_section['sections']):
-                sections_process(en_subsection, zh_subsection, level + 1, translate_flag=translate_flag)
+            target = [(en_section, 'texts'), (zh_target, 'texts')]
         else:
             # 调整论文段落格式、公式显示及去除引用
-            en_section['texts'] = paragraph_translate_and_format_processing_api(text=en_section['texts'], translate_flag=st.session_state["translate_flag"], max_attempts=max_attempts)
-            # 如果当前章节有子章节，则递归遍历子章节
-            for subsection in en_section['sections']:
-                sections_process(subsection, None, level + 1, translate_flag=translate_flag)
-
-    # 3. 处理论文正文'
-    # 创建sections的深拷贝，避免指向同一数据
-    if st.session_state["translate_flag"]:
-        st.session_state['sections_processed'] = copy.deepcopy(st.session_state['sections'])
-        st.session_state['zh_sections_processed'] = copy.deepcopy(st.session_state['sections'])
-        # 遍历并处理 en_sections 和 zh_sections 的每个章节
-        for en_section, zh_section in zip(st.session_state['sections_processed'], st.session_state['zh_sections_processed']):
-            sections_process(en_section, zh_section, translate_flag=st.session_state["translate_flag"])
-    else:
-        st.session_state['sections_processed'] = copy.deepcopy(st.session_state['sections'])
-        # 遍历并处理 en_sections 和 zh_sections 的每个章节
-        for section in st.session_state['sections_processed']:
-            sections_process(section, None, translate_flag=st.session_state["translate_flag"])
+            en_target = FingerprintTarget(en_section, result.fingerprints, fingerprint)
+            target = [(en_target, 'texts')]
+        kwargs = {"text": en_section.texts, "translate_flag": translate_flag, "max_attempts": max_attempts, "state": settings}
+        if streaming:
+            kwargs["on_partial"] = make_partial_writer(dict(zip(fields, target)))
+        jobs.append((paragraph_translate_and_format_processing_api, kwargs))
+        targets.append(target)
+
+    translate_jobs, translate_targets = build_translate_jobs(translations, max_attempts=max_attempts, state=settings)
+    jobs.extend(translate_jobs)
+    targets.extend(translate_targets)
+    return jobs, targets, result, reused_count
+
+
+def run_format_stage(paper, previous, translate_flag, max_attempts, settings, max_workers=None, on_progress=None, checkpoint=None):
+    """
+    格式处理阶段：处理论文格式(段落格式、公式)，并根据translate_flag确定是否需要翻译为中文。
+    所有API调用被展开为相互独立的任务并发执行，结果按文档顺序写回处理结果；输入的paper及previous不会被修改
+    :param paper: 待处理的论文(paper_document.PaperDocument)
+    :param previous: 上次的处理结果(paper_document.FormatResult)，未修改章节复用其中的结果
+    :param translate_flag: 是否翻译为中文
+    :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param settings: API设置字典，参见call_openai_api
+    :param max_workers: int, 最大并发数，默认为config.max_workers。
+    :param on_progress: 可选回调函数，处理期间定时以on_progress(result)的形式调用，result为正在处理的FormatResult，
+                        其中已完成的章节为处理结果，config.stream_responses为True时正在处理的章节为已生成的部分内容。
+    :param checkpoint: 可选的任务检查点，参见run_processing_jobs
+    :return: paper_document.FormatResult
+    """
+    jobs, targets, result, reused_count = build_format_jobs(
+        paper, previous, translate_flag, max_attempts=max_attempts, settings=settings, streaming=on_progress is not None and stream_responses)
+    print(f"复用{reused_count}个未修改章节的处理结果，共{len(jobs)}个API调用任务，并发执行中...")
+    run_processing_jobs(jobs, targets, max_workers=max_workers, on_progress=(lambda: on_progress(result)) if on_progress is not None else None, checkpoint=checkpoint)
+    return result
 
 
-def paper_analysis(max_attempts):
+def format_processing(max_attempts, max_workers=None, on_progress=None, state=None, checkpoint=None):
     """
-    总结论文，汇总论文的标题、摘要、导言、正文各部分内容，并评估论文的创新性等内容
+    以状态字典为输入输出执行格式处理阶段（参见run_format_stage），结果写回sections_processed、zh_sections_processed等键
     :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param max_workers: int, 最大并发数，默认为config.max_workers。
+    :param on_progress: 可选回调函数，处理期间定时以on_progress(values)的形式调用，values为正在处理的结果对应的状态键值
+                        （如"sections_processed"、"zh_sections_processed"、"abstract_processed"），用于实时显示处理进度。
+    :param state: 论文数据及设置所在的状态字典，默认为st.session_state，后台任务中传入任务自身的状态
+    :param checkpoint: 可选的任务检查点，参见run_processing_jobs
+    """
+    state = st.session_state if state is None else state
+    translate_flag = state["translate_flag"]
+    result = run_format_stage(
+        PaperDocument.from_state(state), FormatResult.from_state(state), translate_flag, max_attempts=max_attempts, settings=state,
+        max_workers=max_workers, on_progress=(lambda result: on_progress(result.to_state(translate_flag))) if on_progress is not None else None,
+        checkpoint=checkpoint)
+    state.update(result.to_state(translate_flag))
+
+
+def build_paper_data(paper, sections):
+    """
+    整理待总结的论文数据：合并摘要、引言及带章节号的正文
+    :param paper: 论文(paper_document.PaperDocument)
+    :param sections: 格式处理后的正文章节列表(paper_document.Section)
+    :return: 论文数据字典，包含"paper_title"及"body"
     """
-    # 重新整理论文格式，去掉无用信息
-    body = copy.deepcopy(st.session_state['sections_processed'])  # 论文正文，深度复制防止修改sections_processed
-    body = add_section_numbers(body=body)  # 增加章节号，去掉无效的id和flag字段
-    # 将摘要和引言部分合并
+    # 将摘要和引言部分合并，正文增加章节号并去掉无效的id和flag字段
     paper_body = [
         {
             "title": "abstract",
-            "texts": st.session_state["abstract-area"],
+            "texts": paper.abstract,
             "sections": [],
             "section_number": 1,
         },
         {
             "title": "introduction",
-            "texts": st.session_state["introduction-area"],
+            "texts": paper.introduction,
             "sections": [],
             "section_number": 2,
         }
     ]
-    paper_body.extend(body)
+    paper_body.extend(numbered_sections(sections))
     # 论文数据
     paper_data = {
-        "paper_title": st.session_state["title-area"],
+        "paper_title": paper.title,
         "body": paper_body
     }
-    paper_data = json.dumps(paper_data, indent=4)
-    st.session_state["summary_result"] = summarize_api(text=paper_data, max_attempts=max_attempts)
-    if "section_summaries" in st.session_state["summary_result"]:
-        st.session_state["section_summaries"] = copy.deepcopy(get_section_summary(sections=st.session_state["summary_result"]["section_summaries"]))
-    if "summary" in st.session_state["summary_result"]:
-        st.session_state["summary"] = copy.deepcopy(st.session_state["summary_result"]["summary"])
-    if "overall_assessment" in st.session_state["summary_result"]:
-        st.session_state["overall_assessment"] = copy.deepcopy(st.session_state["summary_result"]["overall_assessment"])
+    return paper_data
+
+
+def use_map_reduce_summary(num_tokens):
+    """
+    根据config.summarize_mode及论文token数判断是否使用分层（map-reduce）总结
+    """
+    return summarize_mode == "map_reduce" or (summarize_mode == "auto" and num_tokens > summarize_max_input_tokens)
+
+
+def run_analysis_stage(paper, sections, max_attempts, settings):
+    """
+    总结评审阶段：汇总论文的标题、摘要、导言、正文各部分内容，总结论文并评估论文的创新性等内容
+    :param paper: 论文(paper_document.PaperDocument)
+    :param sections: 格式处理后的正文章节列表(paper_document.Section)
+    :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param settings: API设置字典，参见call_openai_api
+    :return: paper_document.AnalysisResult
+    """
+    paper_data = build_paper_data(paper, sections)
+    paper_data_json = json.dumps(paper_data, indent=4)
+    num_tokens = calculate_token(paper_data_json)
+    if use_map_reduce_summary(num_tokens):
+        print(f"论文共{num_tokens}个token，分块总结后汇总...")
+        summary_result = hierarchical_summarize(paper_data=paper_data, max_attempts=max_attempts, state=settings)
+    else:
+        summary_result = summarize_api(text=paper_data_json, max_attempts=max_attempts, state=settings)
+    result = AnalysisResult(summary_result=summary_result)
+    if "section_summaries" in summary_result:
+        result.section_summaries = get_section_summary(sections=summary_result["section_summaries"])
+    if "summary" in summary_result:
+        result.summary = summary_result["summary"]
+    if "overall_assessment" in summary_result:
+        result.overall_assessment = summary_result["overall_assessment"]
+    return result
+
+
+def paper_analysis(max_attempts, state=None):
+    """
+    以状态字典为输入输出执行总结评审阶段（参见run_analysis_stage），结果写回summary_result、summary等键
+    :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param state: 论文数据及设置所在的状态字典，默认为st.session_state，后台任务中传入任务自身的状态
+    """
+    state = st.session_state if state is None else state
+    result = run_analysis_stage(PaperDocument.from_state(state), sections_from_dicts(state["sections_processed"]), max_attempts=max_attempts,
+                                settings=state)
+    state.update(result.to_state())
+
+
+def build_summary_chunks(paper_title, flat_sections):
+    """
+    按token预算将章节打包为若干分块，用于分层总结的map阶段。超过预算的章节拆分到多个分块中，各部分的总结在reduce阶段合并
+    :param paper_title: 论文标题
+    :param flat_sections: flatten_numbered_sections展开的章节列表
+    :return: 各分块的请求文本（JSON）列表
+    """
+    token_counts = section_token_counts(flat_sections)
+    # 超过预算的章节先按段落拆分，避免单个章节独占一个超出预算的分块
+    flat_sections, token_counts = split_oversized_sections(flat_sections, token_counts, summarize_chunk_tokens)
+    chunks = pack_by_token_budget(flat_sections, token_counts, summarize_chunk_tokens)
+    return [json.dumps({"paper_title": paper_title, "sections": chunk}, indent=4, ensure_ascii=False) for chunk in chunks]
+
+
+def build_reduce_request(paper_title, flat_sections, chunk_results):
+    """
+    由各分块的总结结果构建分层总结reduce阶段的请求文本
+    :param paper_title: 论文标题
+    :param flat_sections: flatten_numbered_sections展开的章节列表
+    :param chunk_results: 各分块的总结结果（summarize_api的返回值）
+    :return: (请求文本, 按文档顺序排列的章节总结列表)
+    """
+    flat_summaries = []
+    # 拆分到多个分块中的章节有多条总结，按章节号合并
+    summaries_by_number = {}
+    for chunk_result in chunk_results:
+        for item in chunk_result.get("section_summaries", []):
+            if "section_number" not in item:
+                continue
+            section_number = str(item["section_number"])
+            if section_number in summaries_by_number:
+                summary = summaries_by_number[section_number]
+                summary["content_summary"] = f'{summary.get("content_summary", "")}\n{item.get("content_summary", "")}'
+                continue
+            summaries_by_number[section_number] = dict(item)
+            flat_summaries.append(summaries_by_number[section_number])
+    titles = {str(section["section_number"]): section["title"] for section in flat_sections}
+    reduce_data = {
+        "paper_title": paper_title,
+        "section_summaries": [
+            {
+                "section_number": str(item["section_number"]),
+                "title": titles.get(str(item["section_number"]), ""),
+                "content_summary": item.get("content_summary", ""),
+            }
+            for item in flat_summaries
+        ]
+    }
+    return json.dumps(reduce_data, indent=4, ensure_ascii=False), flat_summaries
 
 
-def paper_polishing(max_attempts):
+def hierarchical_summarize(paper_data, max_attempts, max_workers=None, state=None):
+    """
+    分层（map-reduce）总结长论文：先按token预算将章节打包为若干分块并发总结，再将各章节总结汇总为论文概述及整体评价。
+    返回结果与summarize_api一致，包含"summary"、"section_summaries"、"overall_assessment"键。
+    :param paper_data: 论文数据字典，包含"paper_title"及带章节号的"body"
+    :param max_attempts: int, 最大重试次数，以应对API调用可能的失败。
+    :param max_workers: int, 最大并发数，默认为config.max_workers。
+    :param state: 状态字典，默认为st.session_state，参见call_openai_api
+    """
+    # 1. map: 按token预算打包章节，并发总结各分块
+    flat_sections = flatten_numbered_sections(paper_data["body"])
+    chunks = build_summary_chunks(paper_data["paper_title"], flat_sections)
+    jobs = [(summarize_api, {"text": chunk_data, "max_attempts": max_attempts, "system_prompt": section_summarize_system_prompt, "state": state})
+            for chunk_data in chunks]
+    print(f"共{len(flat_sections)}个章节，分为{len(chunks)}个分块并发总结...")
+    chunk_results = run_jobs(jobs, max_workers=max_workers)
+
+    # 2. reduce: 汇总各章节总结，生成论文概述及整体评价
+    reduce_request, flat_summaries = build_reduce_request(paper_data["paper_title"], flat_sections, chunk_results)
+    result = summarize_api(text=reduce_request, max_attempts=max_attempts, system_prompt=summarize_reduce_system_prompt, state=state)
+    if flat_summaries:
+        result["section_summaries"] = nest_section_summaries(flat_summaries)
+    return result
+
+
+def build_polish_jobs(paper, previous, max_attempts, settings, streaming=False):
     """
-    润色论文
+    构建润色阶段的API调用任务，仅润色指纹发生变化的章节，未修改章节直接复用上次的润色结果
+    :param paper: 待润色的论文(paper_document.PaperDocument)
+    :param previous: 上次的润色结果(paper_document.PolishResult)
     :param max_attempts: 最大重试次数
+    :param settings: API设置字典（api_key-area、openai_service、polish_language_is_english），参见polish_api
+    :param streaming: 是否以流式方式接收响应，并将已生成的内容实时写回对应位置
+    :return: (jobs, targets, result, reused_count)，含义同build_format_jobs，result为新的PolishResult
     """
+    jobs = []
+    targets = []
+    result = PolishResult()
+
+    def add_polish_job(text, target):
+        kwargs = {"text": text, "max_attempts": max_attempts, "state": settings}
+        if streaming:
+            kwargs["on_partial"] = make_partial_writer({"polished_text": target})
+        jobs.append((polish_api, kwargs))
+        targets.append([target])
+
     # 1. 润色论文标题, introduction, abstract
-    st.session_state['polished_title'] = polish_api(text=st.session_state['title-area'], max_attempts=max_attempts)
-    st.session_state["polished_introduction"] = polish_api(text=st.session_state["introduction-area"], max_attempts=max_attempts)
-    st.session_state["polished_abstract"] = polish_api(text=st.session_state["abstract-area"], max_attempts=max_attempts)
-    # 2. 润色论文正文
-    st.session_state["polished_sections"] = copy.deepcopy(st.session_state["sections"])
-    # 遍历正文，润色标题和正文
-
-    def section_polish(section, max_attempts):
-        """
-        遍历章节及子章节，润色标题和论文
-        :param section: 论文章节
-        :param max_attempts: 最大重试次数
-        """
-        section['texts'] = polish_api(text=section['texts'], max_attempts=max_attempts)
-        # 如果当前章节有子章节，则递归遍历子章节
-        for subsection in section['sections']:
-            section_polish(subsection, max_attempts=max_attempts)
+    for name in ['title', 'introduction', 'abstract']:
+        add_polish_job(getattr(paper, name), (result, name))
+    # 2. 润色论文正文，仅润色指纹发生变化的章节（含新增章节），未修改章节复用上次的润色结果
+    previous_sections = {section.id: section for section in walk_sections(previous.sections)}
+    reused_count = 0
+    result.sections = copy_sections(paper.sections)
+    # 遍历正文，润色各章节正文
+    for section in walk_sections(result.sections):
+        fingerprint = section_fingerprint({"title": section.title, "texts": section.texts}, settings["polish_language_is_english"])
+        if section.id in previous_sections and previous.fingerprints.get(section.id) == fingerprint:
+            result.fingerprints[section.id] = fingerprint
+            section.texts = previous_sections[section.id].texts
+            reused_count += 1
+            continue
+        # 润色失败的结果带有polish_failure_marker标记，不记录指纹
+        target = FingerprintTarget(section, result.fingerprints, fingerprint)
+        add_polish_job(section.texts, (target, 'texts'))
+    return jobs, targets, result, reused_count
+
+
+def run_polish_stage(paper, previous, max_attempts, settings, max_workers=None, on_progress=None, checkpoint=None):
+    """
+    润色阶段：所有章节的润色任务并发执行，结果按文档顺序写回润色结果；输入的paper及previous不会被修改
+    :param paper: 待润色的论文(paper_document.PaperDocument)
+    :param previous: 上次的润色结果(paper_document.PolishResult)，未修改章节复用其中的结果
+    :param max_attempts: 最大重试次数
+    :param settings: API设置字典，参见build_polish_jobs
+    :param max_workers: int, 最大并发数，默认为config.max_workers。
+    :param on_progress: 可选回调函数，处理期间定时以on_progress(result)的形式调用，result为正在润色的PolishResult
+    :param checkpoint: 可选的任务检查点，参见run_processing_jobs
+    :return: paper_document.PolishResult
+    """
+    jobs, targets, result, reused_count = build_polish_jobs(
+        paper, previous, max_attempts=max_attempts, settings=settings, streaming=on_progress is not None and stream_responses)
+    print(f"复用{reused_count}个未修改章节的润色结果，共{len(jobs)}个API调用任务，并发执行中...")
+    run_processing_jobs(jobs, targets, max_workers=max_workers, on_progress=(lambda: on_progress(result)) if on_progress is not None else None, checkpoint=checkpoint)
+    return result
+
 
-    for section in st.session_state["polished_sections"]:
-        section_polish(section=section, max_attempts=max_attempts)
+def paper_polishing(max_attempts, max_workers=None, on_progress=None, state=None, checkpoint=None):
+    """
+    以状态字典为输入输出执行润色阶段（参见run_polish_stage），结果写回polished_sections等键
+    :param max_attempts: 最大重试次数
+    :param max_workers: int, 最大并发数，默认为config.max_workers。
+    :param on_progress: 可选回调函数，处理期间定时以on_progress(values)的形式调用，values为正在润色的结果对应的状态键值
+                        （如"polished_sections"、"polished_title"），用于实时显示润色进度。
+    :param state: 论文数据及设置所在的状态字典，默认为st.session_state，后台任务中传入任务自身的状态
+    :param checkpoint: 可选的任务检查点，参见run_processing_jobs
+    """
+    state = st.session_state if state is None else state
+    result = run_polish_stage(
+        PaperDocument.from_state(state), PolishResult.from_state(state), max_attempts=max_attempts, settings=state, max_workers=max_workers,
+        on_progress=(lambda result: on_progress(result.to_state())) if on_progress is not None else None, checkpoint=checkpoint)
+    state.update(result.to_state())
 
 
-def api_processing():
+def api_processing(on_progress=None, state=None, job=None):
     """
     处理论文格式(段落格式、公式)，分析，润色
+    :param on_progress: 可选回调函数，处理期间定时以on_progress(values)的形式调用，values为正在处理的结果对应的状态键值，
+                        用于实时显示已完成的章节，参见format_processing及paper_polishing
+    :param state: 论文数据及设置所在的状态字典，默认为st.session_state，后台任务中传入任务自身的状态
+    :param job: 可选的后台任务(background_jobs.AnalysisJob)。传入时记录各步骤进度，已完成的步骤不再重复执行
     """
-    # 处理论文格式，根据st.session_state["translate_flag"]决定是否需要翻译
+    state = st.session_state if state is None else state
+
+    def run_step(step, func, **kwargs):
+        if job is not None and job.is_step_finished(step):
+            print(f"{step}已完成，跳过")
+            return
+        func(max_attempts=max_attempts, state=state, **kwargs)
+        if job is not None:
+            job.finish_step(step)
+
+    # 处理论文格式，根据state["translate_flag"]决定是否需要翻译
     # 论文润色：
-    if st.session_state["polish_flag"]:
+    if state["polish_flag"]:
         print("paper polishing...")
-        paper_polishing(max_attempts=max_attempts)
+        run_step("paper_polishing", paper_polishing, on_progress=on_progress, checkpoint=job.checkpoint("paper_polishing") if job is not None else None)
         print("finished.")
     # 论文翻译总结：
     else:
         print("paper translating...")
         print("step 1: 处理论文格式...")
-        format_processing(max_attempts=max_attempts)
+        run_step("format_processing", format_processing, on_progress=on_progress, checkpoint=job.checkpoint("format_processing") if job is not None else None)
         print("step 2: 总结、评审论文...")
         # 总结、评审论文
-        paper_analysis(max_attempts=max_attempts)
+        run_step("paper_analysis", paper_analysis)
         print("finished.")
-
-
-
+    # 输出响应缓存命中情况
+    cache = get_response_cache()
+    if cache is not None:
+        print(f"响应缓存统计: {cache.stats()}")
+    print(f"API限流统计: {get_rate_limiter().stats()}")
@@ -1,7 +1,4 @@
-import streamlit as st
-
-
-def component_style():
+def component_style_css():
     # 按照苹果风格样式, 对st.text_area、st.code、st.button、st.text_input、st.chat_input组件进行了样式的重调，增加边角圆润度和阴影效果，更改背景颜色。
     # 去除组件选中时显示红色边框效果
     style = """
@@ -122,4 +119,4 @@ def component_style():
         }
     </style>
     """
-    st.markdown(style, unsafe_allow_html=True)
+    return style
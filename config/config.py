@@ -1,6 +1,100 @@
 # ChatGPT API设置
 chatgpt_model = "gpt-3.5-turbo"
+chatgpt_temperature = 0
 max_attempts = 1  # API调用重试次数
+max_workers = 8  # API并发调用数（线程池大小）
+proxy_base_url = "https://api.aiguoguo199.com/v1"  # 非官方API服务地址
+# HTTP连接池设置，同一(api_key, base_url)的客户端在进程内复用，保持keep-alive连接
+api_max_connections = 20  # 连接池最大连接数
+api_max_keepalive_connections = 10  # 连接池最大空闲keep-alive连接数
+api_keepalive_expiry = 60  # 空闲连接保持时间（秒）
+api_connect_timeout = 10  # 建立连接超时时间（秒）
+api_timeout = 120  # 单次请求超时时间（秒）
+# API限流设置，所有API调用共享同一限流器，超出限额的请求排队等待；遇到429/5xx/连接错误时按指数退避（含随机抖动）重试，
+# 响应包含Retry-After时按其等待；并发请求数在rate_limit_min_concurrency与max_workers之间自适应调整，429时减半
+rate_limit_rpm = 3500  # 每分钟最大请求数，None为不限制
+rate_limit_tpm = 90000  # 每分钟最大token数（按请求文本估算，响应后按实际用量校正），None为不限制
+rate_limit_max_retries = 6  # 可重试错误的最大重试次数
+rate_limit_backoff_base = 1.0  # 退避初始等待时间（秒），每次重试翻倍
+rate_limit_backoff_max = 60.0  # 退避最大等待时间（秒）
+rate_limit_min_concurrency = 1  # 自适应并发请求数下限
+stream_responses = True  # 页面显示处理进度时，是否以流式方式接收响应并实时显示已生成的内容
+progress_render_interval = 1.0  # 处理进度显示的刷新间隔（秒）
+# 后台分析任务设置，任务在后台线程中执行，页面刷新或重运行不影响任务进度
+jobs_dir = "jobs"  # 任务文件（进度、检查点、处理结果）保存目录
+max_background_jobs = 2  # 同时执行的后台任务数
+# 命令行批量处理设置（batch_cli.py），检查点保存在输出目录的.checkpoints子目录中
+batch_output_dir = "batch_output"  # 处理结果输出目录
+batch_paper_workers = 2  # 同时处理的论文数，每篇论文内的章节按max_workers并发
+# Batch API设置（batch_cli.py --batch-api），请求以批处理任务提交，费用约为同步调用的一半，结果经响应缓存合并
+batch_api_base_url = None  # Batch API地址，None为与同步调用相同的地址
+batch_completion_window = "24h"  # 批处理任务的完成时限
+batch_poll_interval = 60  # 查询批处理任务状态的间隔（秒）
+batch_max_requests = 50000  # 单个批处理任务的最大请求数
+batch_max_file_bytes = 200 * 1024 * 1024  # 单个批处理请求文件的最大字节数
+batch_max_rounds = 3  # 每个步骤最多提交的轮数（分层总结的汇总请求及失败的请求在下一轮提交）
+# 论文文库设置，论文元数据与正文分表存储，列表及搜索只读取元数据
+library_path = "library/papers.sqlite3"  # 文库数据库路径
+library_page_size = 20  # 文库列表每页显示的论文数
+library_storage_format = "json"  # 论文正文的存储格式："json"为zlib压缩的JSON；"pack"为紧凑二进制格式(paper_pack.py)，读取时自动识别
+paper_pack_codec = "zstd"  # 紧凑二进制格式各数据帧的压缩方式："zstd"（需安装zstandard，未安装时使用zlib）或"zlib"
+paper_pack_level = 6  # 压缩级别
+library_mapped_reading = True  # 是否为文库论文另存紧凑二进制文件，阅读时内存映射、按章节解压正文，常驻内存不随论文大小及会话数增长
+library_pack_dir = "library/packs"  # 紧凑二进制文件目录，保存论文时同步更新
+mapped_paper_cache_size = 64  # 进程内共享的内存映射论文数
+mapped_frame_cache_size = 8  # 每篇内存映射论文缓存的已解压一级章节数
+search_index_path = "library/search_index.sqlite3"  # 全文索引数据库路径，保存论文时增量更新
+search_result_limit = 20  # 全文搜索最多显示的章节数
+semantic_index_dir = "library/semantic"  # 语义向量索引目录，保存论文时增量更新
+semantic_encoder = "hashing"  # 语义向量编码器："hashing"为无需联网的特征哈希编码器，或"模块名:工厂函数名"接入本地句向量模型
+semantic_dim = 512  # 特征哈希编码器的向量维度
+semantic_result_limit = 10  # 相关论文、相关章节最多显示的条数
+# LLM响应缓存设置，以(模型, 系统提示词, 请求文本, temperature)的哈希为键，未修改的内容再次提交时直接返回缓存结果
+response_cache_enabled = True  # 是否启用响应缓存
+response_cache_path = "cache/llm_responses.sqlite3"  # 缓存数据库路径
+response_cache_max_bytes = 200 * 1024 * 1024  # 缓存最大容量（字节），超出后按LRU淘汰
+response_cache_ttl = 30 * 24 * 3600  # 缓存有效期（秒），None为永不过期
+response_cache_busy_timeout = 30  # 数据库被其他进程锁定时的最长等待时间（秒），批量处理的多个进程共用同一缓存数据库
+
+# 处理前预估设置，分析页面提交前按以下参数估算API调用次数、token数、耗时及费用
+chatgpt_input_price = 0.0005  # 每1000个输入token的价格（美元）
+chatgpt_output_price = 0.0015  # 每1000个输出token的价格（美元）
+estimate_request_latency = 1.0  # 单次API调用的固定延迟（秒），不含生成输出的时间
+estimate_output_tokens_per_second = 50  # 模型生成输出的速度（token/秒）
+# 各类API调用的输出token数与请求文本token数之比
+estimate_output_ratios = {
+    "format": 1.0,  # 格式处理
+    "format_translate": 2.5,  # 格式处理并翻译（英文+中文）
+    "translate": 1.5,  # 翻译
+    "batch_translate": 1.6,  # 批量翻译（含JSON键）
+    "polish": 1.1,  # 润色
+}
+estimate_summary_output_tokens = 1500  # 单次总结调用的输出token数
+
+# 公式渲染设置
+# "cdn": 浏览器从CDN加载MathJax渲染公式；
+# "local": 从本地静态文件加载MathJax，可离线使用，需将MathJax的es5目录放入static/mathjax（.streamlit/config.toml已开启静态文件服务）；
+# "server": 服务端将公式预先转换为MathML（需安装latex2mathml），浏览器直接显示，无法转换的公式仍由MathJax渲染
+mathjax_mode = "cdn"
+mathjax_cdn_url = "https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-mml-chtml.js"
+mathjax_local_path = "static/mathjax/tex-mml-chtml.js"  # 本地MathJax文件路径
+mathjax_local_url = "/app/static/mathjax/tex-mml-chtml.js"  # 本地MathJax文件的访问地址
+
+# 阅读页面设置：长论文分页显示，每次只向浏览器发送当前页及预取的章节
+reader_paginate_min_chars = 60000  # 论文正文超过该字符数时默认分页显示
+reader_sections_per_page = 1  # 每页的一级章节数（引言为第1节）
+reader_prefetch_sections = 1  # 当前页之后预先加载的一级章节数，向下滚动时可连续阅读
+
+# 论文总结设置
+# "single": 整篇论文单次调用总结；"map_reduce": 按token预算分块并发总结各章节，再汇总为整体评价；
+# "auto": 论文token数超过summarize_max_input_tokens时使用map_reduce，否则单次调用
+summarize_mode = "auto"
+summarize_max_input_tokens = 10000  # 单次调用总结允许的最大输入token数
+summarize_chunk_tokens = 6000  # map_reduce模式下每个分块的token预算
+
+# 短文本批量翻译设置，标题、机构、关键词及章节标题等短文本打包为单次请求翻译
+batch_translate_token_budget = 1000  # 每个批量请求中待翻译文本的token预算
+batch_translate_max_text_tokens = 200  # 超过该token数的文本单独翻译，不参与打包
 
 # 不同服务的系统提示词
 paragraph_process_with_translate_system_prompt = """
@@ -119,6 +213,45 @@ summarize_system_prompt = """
 请不要在结果中包含任何注释。确保响应可以被Python json.loads解析
 """
 
+section_summarize_system_prompt = """
+作为论文评审专家，请按照论文的顺序，依次总结给定论文片段中各章节（包括摘要、引言和正文章节）或小节的主要内容，并从论文评审专家角度进行评价。
+
+您应该仅以下述的JSON格式响应。
+响应格式：
+{
+  "section_summaries": [
+    {
+      "section_number": "章节号，与输入中的section_number保持一致（例如，1、1.1、1.1.1）",
+      "content_summary": "该部分的主要内容摘要。"
+    }
+    // 输入中的每个章节对应一项
+  ]
+}
+请不要在结果中包含任何注释。确保响应可以被Python json.loads解析
+"""
+
+summarize_reduce_system_prompt = """
+作为论文评审专家，请根据给定的论文标题及各章节的内容摘要，按照以下步骤处理：
+
+1. 专业、规范、逻辑清晰、系统性地总结论文核心内容（涵盖研究内容、创新点、与其他方法的比较以及结论等）。
+2. 从论文评审专家角度，尽可能详细和专业地评估研究论文的研究主题、研究价值、数据集、研究方法、创新点和结论。
+
+您应该仅以下述的JSON格式响应。
+响应格式：
+{
+  "summary": "详细且系统地总结研究论文的核心内容，包括研究内容、创新点、与其他方法的比较以及结论。",
+  "overall_assessment": {
+    "research_topic": "描述研究主题及其在该领域内的重要性。",
+    "research_outcomes": "总结论文的关键发现及其对现有知识体系的贡献。",
+    "dataset_description": "描述论文中使用的数据集。如果没有使用数据集，则此部分应留空。",
+    "methodology": "评估研究方法。",
+    "innovations": "讨论论文的创新方面。",
+    "conclusions": "专业、全面、系统地评价论文。"
+  }
+}
+请不要在结果中包含任何注释。确保响应可以被Python json.loads解析
+"""
+
 translate_system_prompt = """
 You are ChatGPT, a large language model trained by OpenAI, based on the GPT-3.5 architecture. Translate the given text into Chinese, ensuring that the translation is accurate, fluent, and faithful to the original.You should only respond in the JSON format described below.
 Response Format:
@@ -128,6 +261,17 @@ Response Format:
 Ensure the response can be parsed by Python json.loads
 """
 
+batch_translate_system_prompt = """
+You are ChatGPT, a large language model trained by OpenAI, based on the GPT-3.5 architecture. Translate each value of the given JSON object into Chinese, ensuring that the translations are accurate, fluent, and faithful to the original. Keep every key unchanged and translate every value.You should only respond in the JSON format described below.
+Response Format:
+{
+  "zh_texts": {
+    "key of the given text": "translation result in Chinese"
+  }
+}
+Ensure the response can be parsed by Python json.loads
+"""
+
 english_polish_system_prompt = """
 As a high-level professor, your task is to polish a given section of the academic paper to enhance its academic professionalism, language fluency, and logical clarity, ensuring it meets the standards of high-level academic papers. You should only respond in the JSON format described below.
 Response Format:
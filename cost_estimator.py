@@ -0,0 +1,199 @@
+import heapq
+import json
+import streamlit as st
+from functools import lru_cache
+from chatgpt_api import (paragraph_translate_and_format_processing_api, translate_api, batch_translate_api, polish_api, summarize_api,
+                         batch_translate_request, build_format_jobs, build_polish_jobs, build_paper_data, build_summary_chunks,
+                         use_map_reduce_summary)
+from utils import calculate_token, memoized_token_counts, flatten_numbered_sections
+from paper_document import PaperDocument, FormatResult, PolishResult
+from response_cache import ResponseCache, get_response_cache
+from config.config import (chatgpt_model, chatgpt_temperature, max_workers, rate_limit_rpm, rate_limit_tpm, chatgpt_input_price,
+                           chatgpt_output_price, estimate_request_latency, estimate_output_tokens_per_second, estimate_output_ratios,
+                           estimate_summary_output_tokens, paragraph_process_system_prompt, paragraph_process_with_translate_system_prompt,
+                           translate_system_prompt, batch_translate_system_prompt, english_polish_system_prompt,
+                           chinese_polish_system_prompt, summarize_system_prompt, section_summarize_system_prompt,
+                           summarize_reduce_system_prompt)
+
+
+@lru_cache(maxsize=None)
+def prompt_tokens(prompt):
+    """
+    系统提示词的token数，提示词为固定文本，计算结果在进程内缓存
+    """
+    return calculate_token(prompt)
+
+
+def describe_job(func, kwargs, state):
+    """
+    还原API调用任务实际发出的请求
+    :param func: 任务函数
+    :param kwargs: 任务参数
+    :param state: 论文数据及设置所在的状态字典
+    :return: (调用类型, 系统提示词, 请求文本)，任务不会发出API调用（如文本为空）时返回None
+    """
+    if func is paragraph_translate_and_format_processing_api:
+        if not kwargs["text"].strip():
+            return None
+        if kwargs["translate_flag"]:
+            return "format_translate", paragraph_process_with_translate_system_prompt, kwargs["text"].replace('"', "'")
+        return "format", paragraph_process_system_prompt, kwargs["text"].replace('"', "'")
+    if func is translate_api:
+        return "translate", translate_system_prompt, kwargs["text"]
+    if func is batch_translate_api:
+        if len(kwargs["texts"]) == 1:
+            return "translate", translate_system_prompt, kwargs["texts"][0]
+        return "batch_translate", batch_translate_system_prompt, batch_translate_request(kwargs["texts"])
+    if func is polish_api:
+        if not kwargs["text"].strip():
+            return None
+        system_prompt = english_polish_system_prompt if state["polish_language_is_english"] else chinese_polish_system_prompt
+        return "polish", system_prompt, kwargs["text"].replace('"', "'")
+    if func is summarize_api:
+        return "summarize", kwargs.get("system_prompt", summarize_system_prompt), kwargs["text"]
+    raise ValueError(f"无法估算的任务: {func.__name__}")
+
+
+def estimate_calls(step, requests, check_cache=True):
+    """
+    估算各次API调用的输入、输出token数，并检查响应是否已缓存
+    :param step: 步骤名称
+    :param requests: (调用类型, 系统提示词, 请求文本)列表
+    :param check_cache: 是否检查响应缓存，请求文本仅为估算值时应为False
+    :return: 调用估算字典列表
+    """
+    cache = get_response_cache() if check_cache else None
+    # 未修改章节的请求文本不变，token数命中缓存
+    request_tokens = memoized_token_counts([request_prompt for _, _, request_prompt in requests])
+    calls = []
+    for (kind, system_prompt, request_prompt), num_tokens in zip(requests, request_tokens):
+        if kind == "summarize":
+            output_tokens = estimate_summary_output_tokens
+        else:
+            output_tokens = round(num_tokens * estimate_output_ratios[kind])
+        cached = cache is not None and cache.contains(ResponseCache.make_key(chatgpt_model, system_prompt, request_prompt, chatgpt_temperature))
+        calls.append({
+            "step": step,
+            "kind": kind,
+            "input_tokens": prompt_tokens(system_prompt) + num_tokens,
+            "output_tokens": output_tokens,
+            "cached": cached,
+        })
+    return calls
+
+
+def call_seconds(call):
+    """
+    单次API调用的预计耗时，命中缓存的调用不计时间
+    """
+    if call["cached"]:
+        return 0.0
+    return estimate_request_latency + call["output_tokens"] / estimate_output_tokens_per_second
+
+
+def schedule_seconds(calls, concurrency):
+    """
+    模拟按提交顺序在concurrency个并发线程中执行API调用，并计入RPM/TPM限流，返回预计耗时
+    """
+    calls = [call for call in calls if not call["cached"]]
+    if not calls:
+        return 0.0
+    workers = [0.0] * max(1, min(concurrency, len(calls)))
+    for call in calls:
+        heapq.heappush(workers, heapq.heappop(workers) + call_seconds(call))
+    seconds = max(workers)
+    # 令牌桶初始为满，超出一分钟限额的部分按限额速度执行
+    if rate_limit_rpm:
+        seconds = max(seconds, (len(calls) - rate_limit_rpm) * 60 / rate_limit_rpm)
+    if rate_limit_tpm:
+        total_tokens = sum(call["input_tokens"] + call["output_tokens"] for call in calls)
+        seconds = max(seconds, (total_tokens - rate_limit_tpm) * 60 / rate_limit_tpm)
+    return seconds
+
+
+def summarize_step(step, phases):
+    """
+    汇总步骤的调用次数、token数、耗时及费用
+    :param step: 步骤名称
+    :param phases: 依次执行的阶段列表，每个阶段为可并发执行的调用估算列表
+    """
+    calls = [call for phase in phases for call in phase]
+    paid_calls = [call for call in calls if not call["cached"]]
+    input_tokens = sum(call["input_tokens"] for call in paid_calls)
+    output_tokens = sum(call["output_tokens"] for call in paid_calls)
+    return {
+        "step": step,
+        "calls": len(calls),
+        "cached_calls": len(calls) - len(paid_calls),
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "seconds": sum(schedule_seconds(phase, max_workers) for phase in phases),
+        "cost": input_tokens / 1000 * chatgpt_input_price + output_tokens / 1000 * chatgpt_output_price,
+    }
+
+
+def estimate_processing(state=None):
+    """
+    处理前预估：按当前的处理选项构建与api_processing相同的API调用任务（不发出请求），
+    估算各步骤的API调用次数、每次调用的输入及输出token数、按config.max_workers并发执行的耗时及费用。
+    未修改的章节复用上次的处理结果，命中响应缓存的调用不计token、耗时及费用。
+    :param state: 论文数据及设置所在的状态字典，默认为st.session_state
+    :return: 字典，"steps"为各步骤的汇总列表，"calls"为各次调用的估算列表，"total"为合计
+    """
+    state = st.session_state if state is None else state
+    paper = PaperDocument.from_state(state)
+    steps = []
+    calls = []
+    if state["polish_flag"]:
+        jobs, _, _, _ = build_polish_jobs(paper, PolishResult.from_state(state), max_attempts=1, settings=state)
+        requests = [request for request in (describe_job(func, kwargs, state) for func, kwargs in jobs) if request is not None]
+        polish_calls = estimate_calls("paper_polishing", requests)
+        steps.append(summarize_step("paper_polishing", [polish_calls]))
+        calls.extend(polish_calls)
+    else:
+        jobs, _, result, _ = build_format_jobs(paper, FormatResult.from_state(state), state["translate_flag"], max_attempts=1, settings=state)
+        requests = [request for request in (describe_job(func, kwargs, state) for func, kwargs in jobs) if request is not None]
+        format_calls = estimate_calls("format_processing", requests)
+        steps.append(summarize_step("format_processing", [format_calls]))
+        calls.extend(format_calls)
+
+        # 以待处理的正文（未修改的章节为上次的处理结果）近似格式处理后的正文；
+        # 仅当格式处理的调用全部命中缓存时，总结请求才与实际一致，可检查缓存
+        exact = all(call["cached"] for call in format_calls)
+        paper_data = build_paper_data(paper, result.sections)
+        paper_data_json = json.dumps(paper_data, indent=4)
+        if use_map_reduce_summary(memoized_token_counts([paper_data_json])[0]):
+            chunks = build_summary_chunks(paper_data["paper_title"], flatten_numbered_sections(paper_data["body"]))
+            map_calls = estimate_calls("paper_analysis", [("summarize", section_summarize_system_prompt, chunk) for chunk in chunks], check_cache=exact)
+            # 汇总阶段的请求由各分块的总结结果组成
+            reduce_call = {
+                "step": "paper_analysis",
+                "kind": "summarize",
+                "input_tokens": prompt_tokens(summarize_reduce_system_prompt) + len(chunks) * estimate_summary_output_tokens,
+                "output_tokens": estimate_summary_output_tokens,
+                "cached": False,
+            }
+            steps.append(summarize_step("paper_analysis", [map_calls, [reduce_call]]))
+            calls.extend(map_calls + [reduce_call])
+        else:
+            analysis_calls = estimate_calls("paper_analysis", [("summarize", summarize_system_prompt, paper_data_json)], check_cache=exact)
+            steps.append(summarize_step("paper_analysis", [analysis_calls]))
+            calls.extend(analysis_calls)
+
+    total = {key: sum(step[key] for step in steps) for key in ["calls", "cached_calls", "input_tokens", "output_tokens", "seconds", "cost"]}
+    return {"steps": steps, "calls": calls, "total": total}
+
+
+def cached_estimate(state=None):
+    """
+    获取处理前预估：按(state_version, 翻译、润色选项)缓存在状态字典中，论文数据及处理选项未修改时
+    页面重运行（如后台任务执行期间的定时刷新）不再重新构建任务及检查响应缓存
+    :param state: 论文数据及设置所在的状态字典，默认为st.session_state
+    """
+    state = st.session_state if state is None else state
+    cache_key = (state.get("state_version", 0), state["translate_flag"], state["polish_flag"], state.get("polish_language_is_english"))
+    cached = state.get("estimate_cache")
+    if cached is None or cached[0] != cache_key:
+        cached = (cache_key, estimate_processing(state))
+        state["estimate_cache"] = cached
+    return cached[1]
@@ -1,138 +1,182 @@
+import os
+import re
+import json
 import streamlit.components.v1 as components
+from functools import lru_cache
+from config.config import mathjax_mode, mathjax_cdn_url, mathjax_local_path, mathjax_local_url
 
+try:
+    from latex2mathml.converter import convert as latex_to_mathml_converter
+except ImportError:
+    latex_to_mathml_converter = None
 
-def create_section_html(sections, section_summaries, api_comments_flag, selected_icon, level=1, num_prefix=""):
+# 行间公式$$...$$及行内公式$...$，忽略转义的\$
+formula_pattern = re.compile(r'\$\$(.+?)\$\$|(?<!\\)\$(.+?)(?<!\\)\$', re.DOTALL)
+
+
+@lru_cache(maxsize=8192)
+def latex_to_mathml(latex, display):
     """
-    递归地生成HTML内容，用于表示文档或文章的层次结构化节(section)。
+    将LaTeX公式转换为MathML，以公式字符串为键缓存
+    :param latex: LaTeX公式（不含$）
+    :param display: 是否为行间公式
+    :return: MathML字符串，转换失败时返回None
+    """
+    try:
+        return latex_to_mathml_converter(latex, display="block" if display else "inline")
+    except Exception:
+        return None
 
-    :param sections: 包含文档各节信息的列表。每个节可以有标题("title")、文本("texts")，以及子节("sections")。
-                     其中，"texts"是通过换行符('\n')分隔的字符串，表示一个或多个段落。
-                     "sections"是包含更多此类节信息的列表，允许递归地构建文档结构。
-    :param section_summaries: ChatGPT API生成的论文分章节总结内容，字典形式，键为章节号（其中0代表abstract），值为总结内容。
-    :param api_comments_flag: 是否显示ChatGPT API汇总结果，布尔形式。
-    :param level: 当前节的HTML标题等级。默认为1，表示顶级节用<h2>标签，因为HTML中<h1>通常保留给页面标题。
-                  该参数随着递归进入子节而增加，用于生成适当等级的HTML标题标签。
-    :param num_prefix: 用于前缀章节编号的字符串。在递归处理子节时，该前缀会根据父节的编号和当前子节的序号更新，以反映节的层次结构。
-                       例如，顶级节为"1."，其第一个子节为"1.1."，依此类推。
 
-    :return: 一个表示输入节结构的HTML字符串。包括标题、段落以及根据层次嵌套的子节。
+def render_formulas(text, formula_mode):
+    """
+    formula_mode为"server"时，将文本中的公式替换为预先转换的MathML，无法转换的公式保持原样，由MathJax渲染
+    :param text: 包含$...$或$$...$$公式的文本
+    :param formula_mode: 公式渲染方式，参见config.mathjax_mode
+    """
+    if formula_mode != "server" or latex_to_mathml_converter is None or '$' not in text:
+        return text
+
+    def replace(match):
+        display = match.group(1) is not None
+        mathml = latex_to_mathml(match.group(1) if display else match.group(2), display)
+        return match.group(0) if mathml is None else mathml
+
+    return formula_pattern.sub(replace, text)
+
+
+def mathjax_script_url():
+    """
+    MathJax脚本地址。本地模式（及服务端渲染模式下的剩余公式）优先使用本地文件，文件不存在时使用CDN
+    """
+    if mathjax_mode in ("local", "server") and os.path.exists(mathjax_local_path):
+        return mathjax_local_url
+    return mathjax_cdn_url
+
+
+def section_anchor(section_num):
+    """
+    章节标题的HTML锚点，例如"3.2."对应"sec-3-2"，中英文两栏的同一章节锚点相同
+    """
+    return "sec-" + section_num.rstrip('.').replace('.', '-')
+
+
+def build_section_toc(sections, num_prefix="", top_index=None):
     """
-    html_content = ""
+    生成章节目录，编号规则与create_section_html一致
+    :param sections: 章节列表
+    :param num_prefix: 章节编号前缀
+    :param top_index: 所属一级章节的序号，递归时使用
+    :return: 列表，每个元素为(一级章节序号, 章节编号, 章节标题)，一级章节序号从0开始
+    """
+    toc = []
     section_counter = 1
+    for index, item in enumerate(sections):
+        current_num = f"{num_prefix}{section_counter}." if num_prefix else f"{section_counter}."
+        item_top_index = index if top_index is None else top_index
+        if 'title' in item:
+            toc.append((item_top_index, current_num, item['title']))
+            section_counter += 1
+        if 'sections' in item:
+            toc.extend(build_section_toc(item['sections'], current_num, item_top_index))
+    return toc
+
+
+@lru_cache(maxsize=4096)
+def render_section_fragment(title, texts, current_num, level, note, formula_mode):
+    """
+    生成单个章节（不含子章节）的HTML片段，以章节内容、编号、层级及注释为键缓存，
+    Streamlit重运行或切换显示选项时，未变化的章节直接复用已生成的片段。
+
+    :param title: 章节标题，None表示没有标题。
+    :param texts: 章节正文，None表示没有正文。
+    :param current_num: 章节编号，例如"1.2."。
+    :param level: 章节的HTML标题等级。
+    :param note: 章节概述注释（含图标），None表示不显示注释。
+    :param formula_mode: 公式渲染方式，参见config.mathjax_mode。
+    :return: HTML字符串。
+    """
+    fragments = []
+    if title is not None:
+        fragments.append(f'<h{level + 1} id="{section_anchor(current_num)}">{current_num} {render_formulas(title, formula_mode)}</h{level + 1}>')
+        if note is not None:
+            fragments.append(f'<p class="note-paragraph">{note}</p>')
+    if texts is not None:
+        # 分割文本为段落，为每个段落添加<p>标签
+        fragments.extend(f'<p class="paragraph">{render_formulas(paragraph, formula_mode)}</p>' for paragraph in texts.split('\n'))
+    return "".join(fragments)
+
+
+def collect_section_html(sections, section_summaries, api_comments_flag, selected_icon, level, num_prefix, fragments, first_number=1):
+    """
+    递归地收集各章节的HTML片段，参数含义同create_section_html。
+    :param fragments: 用于收集HTML片段的列表。
+    :param first_number: 第一个章节的序号，分页显示时为当前页第一个章节在全文中的序号。
+    """
+    section_counter = first_number
 
     for item in sections:
         # 在每个可能的路径中确保current_num都被赋值
         current_num = f"{num_prefix}{section_counter}." if num_prefix else f"{section_counter}."
 
-        # 处理章节标题
-        if 'title' in item:
-            # 添加HTML标题，级别由当前level决定
-            html_content += f"<h{level + 1}>{current_num} {item['title']}</h{level + 1}>"
+        title = item.get('title')
+        note = None
+        if title is not None:
             section_counter += 1  # 更新章节计数器
             # 如果api_comments_flag为True，则增加注释显示
             if api_comments_flag and current_num[:-1] in section_summaries:  # 去掉末尾的点
-                html_content += f'<p class="note-paragraph">{selected_icon}[{current_num} {item["title"]}-章节概述]:{section_summaries[current_num[:-1]]}</p>'
-
-        # 处理单一字符串形式的多段文本
-        if 'texts' in item:
-            # 分割文本为段落
-            paragraphs = item['texts'].split('\n')
-            for paragraph in paragraphs:
-                # 为每个段落添加<p>标签
-                html_content += f'<p class="paragraph">{paragraph}</p>'
+                note = f'{selected_icon}[{current_num} {title}-章节概述]:{section_summaries[current_num[:-1]]}'
+        fragments.append(render_section_fragment(title, item.get('texts'), current_num, level, note, mathjax_mode))
 
         # 递归处理子章节
         if 'sections' in item:
             # 递归调用，增加层级，更新编号前缀，此时current_num已定义
-            html_content += create_section_html(item['sections'], section_summaries, api_comments_flag, selected_icon, level + 1, current_num)
-
-    return html_content
+            collect_section_html(item['sections'], section_summaries, api_comments_flag, selected_icon, level + 1, current_num, fragments)
 
 
-def display_paper(language, font, title, authors, institutes, introduction, abstract, keywords, body, api_comments_flag, selected_icon, summary, section_summaries, overall_assessment):
+def create_section_html(sections, section_summaries, api_comments_flag, selected_icon, level=1, num_prefix=""):
     """
-    在streamlit中显示论文。
+    递归地生成HTML内容，用于表示文档或文章的层次结构化节(section)。
+    各章节的HTML片段由render_section_fragment生成并缓存，最后以列表拼接为完整的HTML。
 
-    :param language: 语言，"en" or "zh"
-    :param font: 页面显示字体，字符串格式。
-    :param title: 论文的标题，字符串格式。
-    :param authors: 论文作者，字符串格式。
-    :param institutes: 作者所属机构名称，字符串格式。
-    :param introduction: 论文的引言，字符串格式。
-    :param abstract: 论文的摘要，字符串格式。
-    :param keywords: 论文关键词，字符串格式。
-    :param body: 论文正文内容，以列表形式组织，列表中的每个元素是一个字典，包含"title"、"texts"和可选的"sections"键。
-                 "title"键对应章节的标题，为字符串格式。
-                 "texts"键对应章节的正文内容，为字符串格式，可以包含多段，使用"\n"进行分段。
-                 "sections"键是可选的，对应于子章节，其值为一个列表，列表中的每个元素也是一个字典，包含"title"和"texts"键及可选的"sections"键，结构与上级相同。
-    :param api_comments_flag: 是否显示ChatGPT API汇总结果，布尔形式
-    :param selected_icon: 论文助手图标
-    :param summary: ChatGPT API对整篇论文概述，字符串形式
+    :param sections: 包含文档各节信息的列表。每个节可以有标题("title")、文本("texts")，以及子节("sections")。
+                     其中，"texts"是通过换行符('\n')分隔的字符串，表示一个或多个段落。
+                     "sections"是包含更多此类节信息的列表，允许递归地构建文档结构。
     :param section_summaries: ChatGPT API生成的论文分章节总结内容，字典形式，键为章节号（其中0代表abstract），值为总结内容。
-    :param overall_assessment: ChatGPT API对整篇论文评估，列表形式，
-
+    :param api_comments_flag: 是否显示ChatGPT API汇总结果，布尔形式。
+    :param level: 当前节的HTML标题等级。默认为1，表示顶级节用<h2>标签，因为HTML中<h1>通常保留给页面标题。
+                  该参数随着递归进入子节而增加，用于生成适当等级的HTML标题标签。
+    :param num_prefix: 用于前缀章节编号的字符串。在递归处理子节时，该前缀会根据父节的编号和当前子节的序号更新，以反映节的层次结构。
+                       例如，顶级节为"1."，其第一个子节为"1.1."，依此类推。
 
-    本函数将输入的论文信息整合成一个HTML格式的模板，并使用Streamlit库的markdown方法进行显示。该函数设计用于展示论文的结构化内容，包括标题、作者、机构、摘要、关键词以及正文。
+    :return: 一个表示输入节结构的HTML字符串。包括标题、段落以及根据层次嵌套的子节。
     """
-    # 根据语言选择Abstract和Keywords的标题
-    abstract_title = "Abstract" if language == "en" else "摘要"
-    keywords_title = "Keywords" if language == "en" else "关键词"
-    introduction_title = "Introduction" if language == "en" else "引言"
-    # 将引言部分作为正文的第一节
-    introduction_section = [{"title": f"{introduction_title}", "texts": introduction}]
-    # 创建正文HTML
-    body_html = create_section_html(introduction_section + body, section_summaries, api_comments_flag, selected_icon)
-    # abstract注释(ChatGPT API生成的中文总结)
-    if api_comments_flag:
-        self_introduction = f'<p class="note">{selected_icon}[自我介绍]:您好⊂◉‿◉つ！我是论文小助理，我会为您耐心、专业地讲解论文。在论文的开头，我会为您提供"论文概述"以及我对论文"研究主题"、"研究成果"、"研究方法"、"创新点"、"数据集"、"写作逻辑"的总结和评价，并给出我对论文的总体评价。在正文中，我会对每一章节的内容进行汇总，方便您高效阅读论文。下面让我们开始吧！</p>'
-    else:
-        self_introduction = ""
-
-    if api_comments_flag and summary:
-        paper_summary = f'<p class="note">{selected_icon}[论文概述]:{summary}</p>'
-    else:
-        paper_summary = ""
-
-    if api_comments_flag and "research_topic" in overall_assessment:
-        paper_research_topic = f'<p class="note">{selected_icon}[研究主题]:{overall_assessment["research_topic"]}</p>'
-    else:
-        paper_research_topic = ""
-
-    if api_comments_flag and "research_outcomes" in overall_assessment:
-        paper_research_outcomes = f'<p class="note">{selected_icon}[研究成果]:{overall_assessment["research_outcomes"]}</p>'
-    else:
-        paper_research_outcomes = ""
-
-    if api_comments_flag and "methodology" in overall_assessment:
-        paper_methodology = f'<p class="note">{selected_icon}[研究方法]:{overall_assessment["methodology"]}</p>'
-    else:
-        paper_methodology = ""
-
-    if api_comments_flag and "innovations" in overall_assessment:
-        paper_innovations = f'<p class="note">{selected_icon}[创新点]:{overall_assessment["innovations"]}</p>'
-    else:
-        paper_innovations = ""
+    fragments = []
+    collect_section_html(sections, section_summaries, api_comments_flag, selected_icon, level, num_prefix, fragments)
+    return "".join(fragments)
 
-    if api_comments_flag and "dataset_description" in overall_assessment:
-        paper_dataset_description = f'<p class="note">{selected_icon}[数据集]:{overall_assessment["dataset_description"]}</p>'
-    else:
-        paper_dataset_description = ""
 
-    if api_comments_flag and "paper_structure" in overall_assessment:
-        paper_structure = f'<p class="note">{selected_icon}[写作逻辑]:{overall_assessment["paper_structure"]}</p>'
-    else:
-        paper_structure = ""
+# 论文整体评价的各项内容及显示名称，按显示顺序排列
+assessment_labels = [
+    ("research_topic", "研究主题"),
+    ("research_outcomes", "研究成果"),
+    ("methodology", "研究方法"),
+    ("innovations", "创新点"),
+    ("dataset_description", "数据集"),
+    ("paper_structure", "写作逻辑"),
+    ("conclusions", "整体评价"),
+]
 
-    if api_comments_flag and "conclusions" in overall_assessment:
-        paper_conclusions = f'<p class="note">{selected_icon}[整体评价]:{overall_assessment["conclusions"]}</p>'
-    else:
-        paper_conclusions = ""
 
-    abstract_note = ''
-    if api_comments_flag and "0" in section_summaries:
-        abstract_note = f'<p class="note-paragraph">{selected_icon}[摘要概述]:{section_summaries["0"]}</p>'
-    # 定义整个页面的HTML模板
-    paper_html_template = f"""
+@lru_cache(maxsize=64)
+def render_page_head(font, mathjax_url):
+    """
+    生成页面头部（MathJax配置及样式），以字体及MathJax地址为键缓存
+    :param font: 页面显示字体
+    :param mathjax_url: MathJax脚本地址，None表示公式已全部在服务端渲染，不加载MathJax
+    """
+    mathjax_script = f'<script id="MathJax-script" async src="{mathjax_url}"></script>' if mathjax_url else ""
+    return f"""
     <html>
     <head>
         <script>
@@ -145,7 +189,7 @@ def display_paper(language, font, title, authors, institutes, introduction, abst
                 }}
             }};
         </script>
-        <script id="MathJax-script" async src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-mml-chtml.js"></script>
+        {mathjax_script}
     </head>
     <style>
         body {{ font-family: "{font}", serif; }}
@@ -161,6 +205,7 @@ def display_paper(language, font, title, authors, institutes, introduction, abst
         .abstract-content {{ font-size: 20px; text-align: justify; text-justify: inter-word; margin: 5px 0; text-indent: 0em;  padding-left: 100px; padding-right: 100px; }}
         .note {{ font-size: 18px; font-weight: bold; text-align: left; margin-top: 20px; color: #967BB6;}} /* 设置注释文字颜色为淡紫色 */
         .note-paragraph {{ font-size: 18px; font-weight: bold; text-align: left; margin-top: 20px; color: #967BB6;}} /* 设置注释文字颜色为淡紫色 */
+        .page-info {{ font-size: 14px; text-align: center; color: #888; margin-top: 20px; }}
         /* 额外样式，用于可滚动内容 */
         .scrollable-section {{
             background-color: #DFF0D8; /* 护眼色 */
@@ -171,29 +216,154 @@ def display_paper(language, font, title, authors, institutes, introduction, abst
             border: 1px solid #ccc;
         }}
     </style>
-    <div class="scrollable-section">
-        {self_introduction}
-        <br>
-        {paper_summary}
-        {paper_research_topic}
-        {paper_research_outcomes}
-        {paper_methodology}
-        {paper_innovations}
-        {paper_dataset_description}
-        {paper_structure}
-        {paper_conclusions}
-        <br>
-        <h1>{title}</h1>
-        <div class="authors">{authors}</div>
-        <div class="institute">{institutes}</div>
-        <p class="abstract-title">{abstract_title}</p>
-        {abstract_note}
-        <p class="abstract-content">{abstract}</p>
-        <p class="keywords-title">{keywords_title}</p>
-        <p class="keywords">{keywords}</p>
-        {body_html}
-    </div>
-    </html>
     """
+
+
+def collect_front_matter_html(language, title, authors, institutes, abstract, keywords, api_comments_flag, selected_icon, summary,
+                              section_summaries, overall_assessment, fragments):
+    """
+    收集论文开头部分（论文小助手的整体评价、标题、作者、机构、摘要、关键词）的HTML片段，参数含义同display_paper。
+    :param fragments: 用于收集HTML片段的列表。
+    """
+    # 根据语言选择Abstract和Keywords的标题
+    abstract_title = "Abstract" if language == "en" else "摘要"
+    keywords_title = "Keywords" if language == "en" else "关键词"
+    # 论文开头的注释(ChatGPT API生成的中文总结)
+    if api_comments_flag:
+        fragments.append(f'<p class="note">{selected_icon}[自我介绍]:您好⊂◉‿◉つ！我是论文小助理，我会为您耐心、专业地讲解论文。在论文的开头，我会为您提供"论文概述"以及我对论文"研究主题"、"研究成果"、"研究方法"、"创新点"、"数据集"、"写作逻辑"的总结和评价，并给出我对论文的总体评价。在正文中，我会对每一章节的内容进行汇总，方便您高效阅读论文。下面让我们开始吧！</p>')
+    fragments.append('<br>')
+    if api_comments_flag and summary:
+        fragments.append(f'<p class="note">{selected_icon}[论文概述]:{summary}</p>')
+    if api_comments_flag:
+        for key, label in assessment_labels:
+            if key in overall_assessment:
+                fragments.append(f'<p class="note">{selected_icon}[{label}]:{overall_assessment[key]}</p>')
+    fragments.extend([
+        '<br>',
+        f'<h1>{title}</h1>',
+        f'<div class="authors">{authors}</div>',
+        f'<div class="institute">{institutes}</div>',
+        f'<p class="abstract-title">{abstract_title}</p>',
+    ])
+    # abstract注释(ChatGPT API生成的中文总结)
+    if api_comments_flag and "0" in section_summaries:
+        fragments.append(f'<p class="note-paragraph">{selected_icon}[摘要概述]:{section_summaries["0"]}</p>')
+    fragments.extend([
+        f'<p class="abstract-content">{render_formulas(abstract, mathjax_mode)}</p>',
+        f'<p class="keywords-title">{keywords_title}</p>',
+        f'<p class="keywords">{keywords}</p>',
+    ])
+
+
+def render_scroll_script(anchor, sync_channel):
+    """
+    生成滚动脚本：加载后滚动到anchor对应的章节（MathJax排版完成后再次定位）；
+    传入sync_channel时，滚动到新的章节后通过BroadcastChannel通知同一频道的其他栏滚动到相同编号的章节。
+    """
+    return f"""
+    <script>
+    (function () {{
+        var container = document.querySelector(".scrollable-section");
+        var headings = Array.prototype.slice.call(container.querySelectorAll("[id^='sec-']"));
+        var currentId = {json.dumps(anchor)};
+        var ignoreUntil = 0;
+        function scrollToSection(id) {{
+            var element = id && document.getElementById(id);
+            if (element) {{
+                ignoreUntil = Date.now() + 500;
+                element.scrollIntoView();
+            }}
+        }}
+        scrollToSection(currentId);
+        window.addEventListener("load", function () {{
+            if (window.MathJax && window.MathJax.startup) {{
+                window.MathJax.startup.promise.then(function () {{ scrollToSection(currentId); }});
+            }}
+        }});
+        var channelName = {json.dumps(sync_channel)};
+        if (!channelName || !window.BroadcastChannel) {{
+            return;
+        }}
+        var channel = new BroadcastChannel(channelName);
+        container.addEventListener("scroll", function () {{
+            if (Date.now() < ignoreUntil) {{
+                return;
+            }}
+            var top = container.getBoundingClientRect().top + 10;
+            var visibleId = null;
+            for (var i = 0; i < headings.length && headings[i].getBoundingClientRect().top <= top; i++) {{
+                visibleId = headings[i].id;
+            }}
+            if (visibleId && visibleId !== currentId) {{
+                currentId = visibleId;
+                channel.postMessage(visibleId);
+            }}
+        }});
+        channel.onmessage = function (event) {{
+            if (event.data !== currentId) {{
+                currentId = event.data;
+                scrollToSection(currentId);
+            }}
+        }};
+    }})();
+    </script>
+    """
+
+
+def display_paper(language, font, title, authors, institutes, introduction, abstract, keywords, body, api_comments_flag, selected_icon, summary, section_summaries, overall_assessment,
+                  section_range=None, anchor=None, sync_channel=None):
+    """
+    在streamlit中显示论文。
+
+    :param language: 语言，"en" or "zh"
+    :param font: 页面显示字体，字符串格式。
+    :param title: 论文的标题，字符串格式。
+    :param authors: 论文作者，字符串格式。
+    :param institutes: 作者所属机构名称，字符串格式。
+    :param introduction: 论文的引言，字符串格式。
+    :param abstract: 论文的摘要，字符串格式。
+    :param keywords: 论文关键词，字符串格式。
+    :param body: 论文正文内容，以列表形式组织，列表中的每个元素是一个字典，包含"title"、"texts"和可选的"sections"键。
+                 "title"键对应章节的标题，为字符串格式。
+                 "texts"键对应章节的正文内容，为字符串格式，可以包含多段，使用"\n"进行分段。
+                 "sections"键是可选的，对应于子章节，其值为一个列表，列表中的每个元素也是一个字典，包含"title"和"texts"键及可选的"sections"键，结构与上级相同。
+    :param api_comments_flag: 是否显示ChatGPT API汇总结果，布尔形式
+    :param selected_icon: 论文助手图标
+    :param summary: ChatGPT API对整篇论文概述，字符串形式
+    :param section_summaries: ChatGPT API生成的论文分章节总结内容，字典形式，键为章节号（其中0代表abstract），值为总结内容。
+    :param overall_assessment: ChatGPT API对整篇论文评估，列表形式，
+    :param section_range: 分页显示时本页显示的一级章节范围(start, end)，序号从0开始（0为引言），不含end；
+                          None表示显示全文。仅第一页显示论文标题、摘要等开头部分。
+    :param anchor: 显示后滚动到的章节锚点，参见section_anchor
+    :param sync_channel: 同步滚动的频道名称，使用同一频道的各栏滚动时按章节编号互相同步
+
+
+    本函数将输入的论文信息整合成一个HTML格式的模板，并使用Streamlit库的markdown方法进行显示。该函数设计用于展示论文的结构化内容，包括标题、作者、机构、摘要、关键词以及正文。
+    """
+    introduction_title = "Introduction" if language == "en" else "引言"
+    # 将引言部分作为正文的第一节
+    introduction_section = [{"title": f"{introduction_title}", "texts": introduction}]
+
+    sections = introduction_section + body
+    start, end = (0, len(sections)) if section_range is None else section_range
+
+    fragments = ['<div class="scrollable-section">']
+    if start == 0:
+        collect_front_matter_html(language, title, authors, institutes, abstract, keywords, api_comments_flag, selected_icon, summary,
+                                  section_summaries, overall_assessment, fragments)
+    # 正文HTML，各章节片段已缓存
+    collect_section_html(sections[start:end], section_summaries, api_comments_flag, selected_icon, 1, "", fragments, first_number=start + 1)
+    if section_range is not None:
+        fragments.append(f'<p class="page-info">第{start + 1}-{end}节，共{len(sections)}节</p>')
+    fragments.append('</div>')
+    if anchor or sync_channel:
+        fragments.append(render_scroll_script(anchor, sync_channel))
+    fragments.append('</html>')
+    content = "".join(fragments)
+    # 服务端渲染模式下，公式已全部转换时不再加载MathJax
+    if mathjax_mode == "server" and latex_to_mathml_converter is not None and '$' not in content:
+        mathjax_url = None
+    else:
+        mathjax_url = mathjax_script_url()
     # 使用Streamlit的components.html方法来渲染HTML模板
-    components.html(paper_html_template, height=800, scrolling=True)
+    components.html(render_page_head(font, mathjax_url) + content, height=800, scrolling=True)
@@ -0,0 +1,71 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from config.config import max_workers as default_max_workers
+
+
+def run_jobs(jobs, max_workers=None, on_result=None, on_poll=None, poll_interval=1.0):
+    """
+    在有界线程池中并发执行相互独立的任务，并按任务提交顺序返回结果。
+
+    工作线程会继承当前Streamlit脚本的运行上下文，因此任务内部仍可读取st.session_state。
+
+    :param jobs: 任务列表，每个元素为(func, kwargs)元组，任务以func(**kwargs)的形式执行。
+    :param max_workers: 最大并发数，默认为config.max_workers。
+    :param on_result: 可选回调函数，每个任务完成时在调用线程中以on_result(index, result)的形式调用。
+    :param on_poll: 可选回调函数，执行期间每隔poll_interval秒及全部任务结束时在调用线程中调用，用于刷新进度显示。
+    :param poll_interval: on_poll的调用间隔（秒）。
+    :return: 与jobs顺序一致的结果列表。
+    """
+    if max_workers is None:
+        max_workers = default_max_workers
+    results = [None] * len(jobs)
+    if not jobs:
+        return results
+
+    ctx = get_script_run_ctx()
+
+    def attach_script_run_ctx():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs))), initializer=attach_script_run_ctx) as executor:
+        futures = {executor.submit(func, **kwargs): index for index, (func, kwargs) in enumerate(jobs)}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=poll_interval if on_poll is not None else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                results[index] = future.result()
+                if on_result is not None:
+                    on_result(index, results[index])
+            if on_poll is not None:
+                on_poll()
+    return results
+
+
+def write_results(targets, results):
+    """
+    按文档顺序将任务结果写回目标位置。
+
+    :param targets: 与结果一一对应的写回位置列表。每个元素为(container, key)元组组成的列表（参见write_target）：
+                    只有一个元组时，结果整体写入container[key]；有多个元组时，结果应为等长的元组，逐项写入。
+    :param results: run_jobs返回的结果列表。
+    """
+    for target, result in zip(targets, results):
+        if len(target) == 1:
+            container, key = target[0]
+            write_target(container, key, result)
+        else:
+            for (container, key), value in zip(target, result):
+                write_target(container, key, value)
+
+
+def write_target(container, key, value):
+    """
+    将结果写入写回位置：container为字典等映射时写入container[key]，否则写入同名属性（如paper_document中的对象）
+    """
+    if hasattr(container, "__setitem__"):
+        container[key] = value
+    else:
+        setattr(container, key, value)
@@ -1,21 +1,18 @@
 import streamlit as st
-import json
-from component_style import component_style
+from component_style import component_style_css
+from static_assets import load_asset
 
 
-def initialize_session_state_variables():
-    # 读取ChatGPT图标可选列表
-    with open('config/ChatGPT_icons.json', "r", encoding='utf8') as file:
-        chatgpt_icon_options = json.load(file)
-    # 读取字体可选列表
-    with open('config/fonts.json', "r", encoding='utf8') as file:
-        font_options = json.load(file)
-
+def default_session_state():
+    """
+    论文数据及界面变量的默认值，也用于在Streamlit之外（如batch_cli）构建处理所需的状态字典
+    :return: 字典，键与st.session_state一致
+    """
     keys_with_default_values = {
-        # ChatGPT图标可选列表
-        "chatgpt_icon_options": chatgpt_icon_options,
+        # ChatGPT图标可选列表，进程内共享读取，各会话持有副本（选择后的排序为个人偏好，只保存在会话中）
+        "chatgpt_icon_options": list(load_asset('config/ChatGPT_icons.json', kind="json")),
         # 显示界面字体可选列表
-        "font_options": font_options,
+        "font_options": list(load_asset('config/fonts.json', kind="json")),
         # 文本框key
         "publish_time": "",  # 论文发表日期
         "title": "",
@@ -43,6 +40,9 @@ def initialize_session_state_variables():
         "zh_abstract_processed": "",
         "zh_keywords-area": "",
         "zh_sections_processed": [],
+        # 正文各章节内容指纹，用于增量处理时判断章节是否被修改
+        "sections_processed_fingerprints": {},
+        "polished_sections_fingerprints": {},
         # 正文内容
         "sections": [],  # Assuming sections is a list; adjust if it's supposed to be a different type
         # api key
@@ -63,7 +63,11 @@ def initialize_session_state_variables():
         "polished_sections_processed": [],
     }
 
-    for key, default_value in keys_with_default_values.items():
+    return keys_with_default_values
+
+
+def initialize_session_state_variables():
+    for key, default_value in default_session_state().items():
         if key not in st.session_state:
             st.session_state[key] = default_value
 
@@ -83,9 +87,5 @@ def init():
             .stApp { margin-top: -100px; }
         </style>
     """
-    # 将自定义CSS添加到页面
-    st.markdown(custom_css, unsafe_allow_html=True)
-    # 设置组件样式为自定义样式，符合苹果风格
-    component_style()
-    # 设置侧边栏样式
-    st.markdown('<style>' + open('sidebar.css').read() + '</style>', unsafe_allow_html=True)
\ No newline at end of file
+    # 通用样式、组件样式（符合苹果风格）及侧边栏样式合并为一次输出，侧边栏样式文件在进程内缓存，修改后自动重新读取
+    st.markdown(custom_css + component_style_css() + '<style>' + load_asset('sidebar.css') + '</style>', unsafe_allow_html=True)
\ No newline at end of file
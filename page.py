@@ -2,10 +2,20 @@ import streamlit.components.v1 as components
 import streamlit_antd_components as sac
 import streamlit as st
 import json
+import copy
+import time
 from datetime import datetime, timedelta
-from utils import run_chapter_editor, save_session_state
-from chatgpt_api import test_api, api_processing
-from display_paper import display_paper
+from utils import run_chapter_editor, save_session_state, saved_session_state_keys, export_formats, cached_export, mark_state_changed
+from chatgpt_api import test_api
+from background_jobs import (submit_job, get_job, resume_job, list_jobs, session_owner_id, job_secret_keys, job_status_names,
+                             job_step_names)
+from display_paper import display_paper, build_section_toc, section_anchor
+from cost_estimator import cached_estimate
+from paper_library import get_paper_library, library_order_options
+from paper_io import load_paper_file, import_papers, PaperFormatError
+from paper_store import materialize_section_trees, text_chars
+from search_index import search_source_names
+from config.config import progress_render_interval, max_workers, library_page_size, search_result_limit, semantic_result_limit, reader_paginate_min_chars, reader_sections_per_page, reader_prefetch_sections
 
 
 def home_page():
@@ -103,6 +113,7 @@ def create_text_area(placeholder, key, height=0):
 
     def on_text_area_change():
         st.session_state[key + "-area"] = st.session_state[key]
+        mark_state_changed()
 
     st.text_area(
         label="xxx",  # 非空即可
@@ -126,6 +137,7 @@ def paper_entry_page():
         根据不同文章会有不同
     :return:
     """
+    materialize_section_trees(st.session_state)
     html_content = """
     <!DOCTYPE html>
     <html>
@@ -171,6 +183,7 @@ def paper_entry_page():
 
         def on_select_date_change():
             st.session_state[f"publish_time"] = st.session_state[f"publish_time-date"].strftime("%Y-%m-%d")
+            mark_state_changed()
 
         # 设置日期选择的最小值和最大值
         min_date = datetime.now() - timedelta(days=30 * 365)  # 30年前
@@ -187,7 +200,9 @@ def paper_entry_page():
         # 如果用户选择了日期，更新session state中的 'publish_time'
         if selected_date:
             formatted_date = selected_date.strftime("%Y-%m-%d")
-            st.session_state['publish_time'] = formatted_date
+            if st.session_state.get('publish_time') != formatted_date:
+                st.session_state['publish_time'] = formatted_date
+                mark_state_changed()
     
         # 创建输入框录入论文信息：
         with st.expander(label="论文基本信息录入（不存在项可为空）", expanded=True):
@@ -259,18 +274,23 @@ def paper_entry_page():
         else:
             st.success("2. API调用测试成功！")
         col1, col2 = st.columns([1, 1.15])
+        with col1:
+            export_format = st.selectbox("下载格式", list(export_formats), key="export_format", label_visibility="collapsed")
         with col2:
+            extension, mime, _ = export_formats[export_format]
+
             # 定义文件名生成逻辑
             def generate_file_name():
                 if st.session_state['publish_time']:
-                    return f"{st.session_state['publish_time']} {st.session_state['title-area']}.json"
+                    return f"{st.session_state['publish_time']} {st.session_state['title-area']}{extension}"
                 else:
-                    return f"{st.session_state['title-area']}.json"
+                    return f"{st.session_state['title-area']}{extension}"
+            # 下载文件内容按论文数据版本缓存，未修改论文时页面重运行不再重复序列化
             st.download_button(
                 label="下载",
-                data=save_session_state(),
+                data=cached_export(export_format),
                 file_name=generate_file_name(),  # 论文标题作为保存名称
-                mime="application/json"
+                mime=mime
             )
 
 
@@ -310,21 +330,203 @@ def upload():
     components.html(html_content, height=100)
 
     # 上传器，允许用户上传 JSON 文件来恢复会话状态
-    uploaded_file = st.file_uploader(label="xxx", label_visibility="collapsed", type=['json'])
+    uploaded_file = st.file_uploader(label="xxx", label_visibility="collapsed", type=['json', 'gz', 'sapk'])
 
     if uploaded_file is not None:
-        session_state_data = json.load(uploaded_file)
-        # 清空当前的session state
+        # 先解析并检查文件，格式不符时保留当前会话的论文数据
+        try:
+            session_state_data = load_paper_file(uploaded_file.getvalue())
+        except PaperFormatError as e:
+            st.error(f'导入失败：{e}')
+            return
+        # 清空当前的session state，保留任务所有者ID，导入后仍可查看本会话提交的后台任务
+        job_owner_id = st.session_state.get("job_owner_id")
         st.session_state.clear()
+        if job_owner_id is not None:
+            st.session_state["job_owner_id"] = job_owner_id
         for key, value in session_state_data.items():
             st.session_state[key] = value
-        st.success('导入成功!')
+        # 同时保存到文库，同一论文重复导入时更新原有记录
+        st.session_state["library_paper_id"] = get_paper_library().save(session_state_data)
+        st.success('导入成功，已保存到文库!')
+
+
+def show_processing_preview(values, state):
+    """
+    实时显示正在处理的论文，包括已完成的章节及正在生成的内容
+    :param values: 正在处理的结果对应的状态键值，参见chatgpt_api.api_processing
+    :param state: 论文数据所在的状态字典（后台任务的state）
+    """
+    state = {**state, **values}
+    if "polished_sections" in values:
+        language = 'en' if state["polish_language_is_english"] else 'zh'
+        title, introduction, abstract = "polished_title", "polished_introduction", "polished_abstract"
+        institutes, keywords = "institutes-area", "keywords-area"
+        body = values["polished_sections"]
+    elif "zh_sections_processed" in values:
+        language = 'zh'
+        title, introduction, abstract = "zh_title-area", "zh_introduction_processed", "zh_abstract_processed"
+        institutes, keywords = "zh_institutes-area", "zh_keywords-area"
+        body = values["zh_sections_processed"]
+    else:
+        language = 'en'
+        title, introduction, abstract = "title-area", "introduction_processed", "abstract_processed"
+        institutes, keywords = "institutes-area", "keywords-area"
+        body = values["sections_processed"]
+    display_paper(
+        language=language,
+        font=st.session_state["font_options"][0],
+        title=state.get(title, ""),
+        authors=state.get("authors-area", ""),
+        institutes=state.get(institutes, ""),
+        introduction=state.get(introduction, ""),
+        abstract=state.get(abstract, ""),
+        keywords=state.get(keywords, ""),
+        body=body,
+        api_comments_flag=False,
+        selected_icon="",
+        summary="",
+        section_summaries={},
+        overall_assessment={},
+    )
+
+
+def show_processing_estimate():
+    """
+    显示按当前处理选项提交后的预估：各步骤的API调用次数、每次调用的平均输入及输出token数、预计耗时及费用
+    """
+    estimate = cached_estimate(st.session_state)
+    total = estimate["total"]
+    with st.expander(f'处理前预估：{total["calls"]}次API调用，预计耗时约{format_seconds(total["seconds"])}，费用约${total["cost"]:.4f}'):
+        rows = []
+        for step in estimate["steps"]:
+            paid_calls = step["calls"] - step["cached_calls"]
+            rows.append({
+                "步骤": job_step_names[step["step"]],
+                "API调用次数": step["calls"],
+                "命中缓存": step["cached_calls"],
+                "平均输入token": round(step["input_tokens"] / paid_calls) if paid_calls else 0,
+                "平均输出token": round(step["output_tokens"] / paid_calls) if paid_calls else 0,
+                "输入token": step["input_tokens"],
+                "输出token": step["output_tokens"],
+                "预计耗时": format_seconds(step["seconds"]),
+                "预计费用($)": f'{step["cost"]:.4f}',
+            })
+        st.table(rows)
+        st.markdown(f"按{max_workers}个并发计算，输出token数及耗时为估算值，命中响应缓存的调用不计token、耗时及费用。")
+        if st.checkbox("显示每次API调用的估算", key="show_estimate_calls"):
+            st.dataframe([
+                {
+                    "步骤": job_step_names[call["step"]],
+                    "类型": call["kind"],
+                    "输入token": call["input_tokens"],
+                    "输出token": call["output_tokens"],
+                    "命中缓存": call["cached"],
+                }
+                for call in estimate["calls"]
+            ], use_container_width=True)
+
+
+def format_seconds(seconds):
+    """
+    将秒数格式化为"x分y秒"
+    """
+    minutes, seconds = divmod(round(seconds), 60)
+    return f"{minutes}分{seconds}秒" if minutes else f"{seconds}秒"
+
+
+def load_job_result(job_id):
+    """
+    将后台任务的处理结果载入当前会话
+    :param job_id: 任务ID
+    """
+    job = get_job(job_id)
+    if job is None:
+        return
+    for key, value in job.state.items():
+        if key not in job_secret_keys:
+            st.session_state[key] = copy.deepcopy(value)
+    st.session_state["loaded_job_id"] = job_id
+    mark_state_changed()
+
+
+def current_job_owner_id():
+    """
+    当前浏览器的任务所有者ID。ID同时保存在页面地址的查询参数job_owner中，刷新页面或进程重启后的新会话沿用同一ID，
+    仍可查看、载入及继续处理此前提交的任务
+    """
+    params = st.experimental_get_query_params()
+    owner = session_owner_id(st.session_state, persisted_owner=params.get("job_owner", [None])[0])
+    if params.get("job_owner") != [owner]:
+        params["job_owner"] = owner
+        st.experimental_set_query_params(**params)
+    return owner
+
+
+def show_analysis_jobs():
+    """
+    显示本浏览器提交的后台分析任务列表、所选任务的各步骤进度及实时处理结果，其他任务可按任务ID打开。
+    当前会话提交的任务完成后自动载入结果；中断或失败的任务可继续处理，已完成的章节不再重复处理。
+    :return: 所选任务是否仍在执行
+    """
+    job_records = list_jobs(owner=current_job_owner_id())
+    opened_job_id = st.text_input("按任务ID打开任务", key="open_job_id", placeholder="任务ID，如在其他浏览器中提交的任务").strip()
+    if opened_job_id and all(record["job_id"] != opened_job_id for record in job_records):
+        opened_job = get_job(opened_job_id)
+        if opened_job is None:
+            st.warning("未找到该任务")
+        else:
+            job_records.insert(0, opened_job.metadata())
+            st.session_state["job_id"] = opened_job_id
+    if not job_records:
+        return False
+    records = {record["job_id"]: record for record in job_records}
+    options = list(records)
+    current_job_id = st.session_state.get("job_id")
+    selected_job_id = st.selectbox(
+        label="后台任务",
+        options=options,
+        index=options.index(current_job_id) if current_job_id in records else 0,
+        format_func=lambda job_id: f'{datetime.fromtimestamp(records[job_id]["created_at"]).strftime("%Y-%m-%d %H:%M:%S")} '
+                                   f'[{records[job_id]["mode"]}] {records[job_id]["title"]} - {job_status_names[records[job_id]["status"]]} ({job_id})',
+    )
+    job = get_job(selected_job_id)
+    if job is None:
+        return False
+
+    for step, progress in job.steps.items():
+        if progress["finished"]:
+            fraction, text = 1.0, "已完成"
+        elif progress["total"]:
+            fraction, text = progress["done"] / progress["total"], f'{progress["done"]}/{progress["total"]}'
+        else:
+            fraction, text = 0.0, "等待中" if job.status in ("pending", "running") else "未开始"
+        st.progress(fraction, text=f"{job_step_names[step]}: {text}")
+
+    if job.status == "failed":
+        st.error(f"任务失败：{job.error}")
+    if job.status in ("interrupted", "failed"):
+        st.button("继续处理", key="resume_job_button", on_click=resume_job,
+                  args=(selected_job_id, st.session_state["api_key-area"], st.session_state["openai_service"]))
+    if job.status == "finished":
+        if selected_job_id == current_job_id and st.session_state.get("loaded_job_id") != selected_job_id:
+            load_job_result(selected_job_id)
+        if st.session_state.get("loaded_job_id") == selected_job_id:
+            st.success("处理结果已载入，可在\"查看\"页面阅读")
+        else:
+            st.button("载入结果", key="load_job_button", on_click=load_job_result, args=(selected_job_id,))
+
+    running = job.status in ("pending", "running")
+    if running and job.preview is not None:
+        show_processing_preview(job.preview, job.state)
+    return running
 
 
 def analysis():
     """
     使用ChatGPT对论文进行分析
     """
+    materialize_section_trees(st.session_state)
     html_content = """
     <!DOCTYPE html>
     <html>
@@ -351,7 +553,7 @@ def analysis():
     <body>
         <h1>论文分析</h1>
         <h2>1. 完成"编辑"页面论文信息录入，填写正确的API信息并通过测试</h2>
-        <h2>2. 选择选项进行处理，处理过程中页面会呈现阻塞状态，请耐心等待</h2>
+        <h2>2. 选择选项进行处理，任务在后台执行，页面刷新不影响处理进度，处理过程中将在下方实时显示已完成的章节</h2>
     </body>
     </html>
     """
@@ -359,6 +561,8 @@ def analysis():
 
     # 如果填写API Key且测试成功
     if st.session_state[f"api_key-area"] and st.session_state["api_flag"]:
+        # 提交任务前确定所有者ID，沿用页面地址中保存的ID
+        current_job_owner_id()
         api_service = sac.segmented(
             items=[
                 sac.SegmentedItem(label="总结"),
@@ -369,7 +573,10 @@ def analysis():
             st.session_state["polish_flag"] = False
             st.markdown(st.session_state["polish_flag"])
             st.session_state["translate_flag"] = sac.switch(label='是否翻译', value=False)
-            st.button("提交", key=f"chatgpt_api_button", on_click=api_processing)
+            show_processing_estimate()
+            if st.button("提交", key=f"chatgpt_api_button"):
+                st.session_state["job_id"] = submit_job(st.session_state)
+            job_running = show_analysis_jobs()
             if st.session_state["summary_result"]:
                 try:
                     st.markdown("ChatGPT总结结果如下：")
@@ -380,12 +587,74 @@ def analysis():
             st.session_state["translate_flag"] = False
             st.session_state["polish_flag"] = True
             st.markdown(st.session_state["polish_flag"])
-            st.session_state["polish_language_is_english"] = sac.switch(label='英文润色', value=False)
-            st.button("提交", key=f"chatgpt_api_button", on_click=api_processing)
+            polish_language_is_english = sac.switch(label='英文润色', value=False)
+            if st.session_state.get("polish_language_is_english") != polish_language_is_english:
+                st.session_state["polish_language_is_english"] = polish_language_is_english
+                mark_state_changed()
+            show_processing_estimate()
+            if st.button("提交", key=f"chatgpt_api_button"):
+                st.session_state["job_id"] = submit_job(st.session_state)
+            job_running = show_analysis_jobs()
+        # 任务执行期间定时刷新页面，显示最新进度
+        if job_running:
+            time.sleep(progress_render_interval)
+            st.rerun()
     else:
         st.error('请在"编辑-分析保存"页面填写正确的API Key信息，并通过API调用测试！')
 
 
+def reader_navigation(sections, toc_container):
+    """
+    阅读页面的章节导航：目录选择及分页。中英文两栏按同一章节编号定位，编号与display_paper一致（引言为第1节）
+    :param sections: 用于生成目录的正文章节列表（不含引言）
+    :param toc_container: 目录下拉列表所在的容器
+    :return: (section_range, anchor)，传入display_paper；不分页时section_range为None
+    """
+    toc = build_section_toc([{"title": "Introduction"}] + sections)
+    top_count = len(sections) + 1
+    # 论文切换后目录可能变短，重置为第一项
+    if st.session_state.get("reader_toc", 0) >= len(toc):
+        st.session_state["reader_toc"] = 0
+
+    with toc_container:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            selected = st.selectbox(
+                label="目录",
+                options=range(len(toc)),
+                format_func=lambda index: f"{toc[index][1]} {toc[index][2]}",
+                key="reader_toc",
+                label_visibility="collapsed"
+            )
+        with col2:
+            body_chars = text_chars(sections)
+            paginate = sac.switch(label='分页', value=body_chars > reader_paginate_min_chars, key="reader_paginate")
+
+    top_index, section_num, _ = toc[selected]
+    anchor = section_anchor(section_num)
+    if not paginate:
+        return None, anchor
+
+    page_start = top_index // reader_sections_per_page * reader_sections_per_page
+    section_range = (page_start, min(top_count, page_start + reader_sections_per_page + reader_prefetch_sections))
+
+    def go_to_page(start):
+        # 定位到该页第一个一级章节
+        st.session_state["reader_toc"] = next(index for index, item in enumerate(toc) if item[0] == start)
+
+    page_count = (top_count + reader_sections_per_page - 1) // reader_sections_per_page
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("上一页", key="reader_previous_page", disabled=page_start == 0,
+                  on_click=go_to_page, args=(page_start - reader_sections_per_page,))
+    with col2:
+        st.markdown(f"<div style='text-align: center'>第{page_start // reader_sections_per_page + 1}/{page_count}页</div>", unsafe_allow_html=True)
+    with col3:
+        st.button("下一页", key="reader_next_page", disabled=page_start + reader_sections_per_page >= top_count,
+                  on_click=go_to_page, args=(page_start + reader_sections_per_page,))
+    return section_range, anchor
+
+
 def display():
     font_key = 'font'
     icon_key = "ChatGPT_icon"
@@ -419,12 +688,10 @@ def display():
                 # 定义下拉列表内容变化时的回调函数
                 def on_select_area_change():
                     st.session_state[f"{icon_key}-selectbox"] = st.session_state[f"{icon_key}-select"]
-                    # 更新图标列表并保存
+                    # 最近选择的图标排在最前，作为个人偏好只保存在当前会话中，不修改共享的配置文件
                     if st.session_state[f"{icon_key}-select"] in st.session_state["chatgpt_icon_options"]:
                         st.session_state["chatgpt_icon_options"].remove(st.session_state[f"{icon_key}-select"])
                     st.session_state["chatgpt_icon_options"].insert(0, st.session_state[f"{icon_key}-select"])
-                    with open("config/ChatGPT_icons.json", "w", encoding='utf8') as file:
-                        json.dump(st.session_state["chatgpt_icon_options"], file, indent=4, ensure_ascii=False)
 
                 options = st.session_state[f"chatgpt_icon_options"]
                 selected_icon = st.selectbox(
@@ -441,12 +708,10 @@ def display():
             # 定义下拉列表内容变化时的回调函数
             def on_select_area_change():
                 st.session_state[f"{font_key}-selectbox"] = st.session_state[f"{font_key}-select"]
-                # 更新图标列表并保存
+                # 最近选择的字体排在最前，作为个人偏好只保存在当前会话中，不修改共享的配置文件
                 if st.session_state[f"{font_key}-select"] in st.session_state["font_options"]:
                     st.session_state["font_options"].remove(st.session_state[f"{font_key}-select"])
                 st.session_state["font_options"].insert(0, st.session_state[f"{font_key}-select"])
-                with open("config/fonts.json", "w", encoding='utf8') as file:
-                    json.dump(st.session_state["font_options"], file, indent=4, ensure_ascii=False)
 
             options = st.session_state["font_options"]
             selected_font = st.selectbox(
@@ -458,6 +723,11 @@ def display():
                 label_visibility="collapsed"
             )
 
+    # 章节导航，两栏显示相同编号的章节，滚动时按章节编号同步
+    toc_sections = st.session_state["sections_processed"] if selected_display_mode == "翻译模式" else st.session_state["sections"]
+    section_range, anchor = reader_navigation(toc_sections, col12)
+    reader_kwargs = {"section_range": section_range, "anchor": anchor, "sync_channel": "paper-reader"}
+
     col21, col22 = st.columns([1, 1])  # 左右两侧分配相等的空间
 
     if selected_display_mode == "翻译模式":
@@ -477,6 +747,7 @@ def display():
                 summary=st.session_state["summary"],
                 section_summaries=st.session_state["section_summaries"],
                 overall_assessment=st.session_state["overall_assessment"],
+                **reader_kwargs,
             )
 
         with col22:
@@ -495,6 +766,7 @@ def display():
                 summary=st.session_state["summary"],
                 section_summaries=st.session_state["section_summaries"],
                 overall_assessment=st.session_state["overall_assessment"],
+                **reader_kwargs,
             )
 
     elif selected_display_mode == "润色模式":
@@ -514,6 +786,7 @@ def display():
                 summary=st.session_state["summary"],
                 section_summaries=st.session_state["section_summaries"],
                 overall_assessment=st.session_state["overall_assessment"],
+                **reader_kwargs,
             )
 
         with col22:
@@ -532,6 +805,192 @@ def display():
                 summary=st.session_state["summary"],
                 section_summaries=st.session_state["section_summaries"],
                 overall_assessment=st.session_state["overall_assessment"],
+                **reader_kwargs,
             )
 
 
+
+
+def open_library_paper(paper_id, section_number=None):
+    """
+    从文库打开论文：读取论文正文并替换当前会话中的论文数据，其余论文数据在下次运行时由init恢复默认值。
+    文库启用内存映射阅读时，章节树以延迟视图的形式载入（参见paper_store.MappedTree），阅读时只解压显示的章节，
+    进入编辑、分析页面或保存时再解压为章节字典
+    :param paper_id: 论文ID
+    :param section_number: 可选的章节编号（如"3.2"），传入时阅读页面定位到该章节
+    """
+    paper_library = get_paper_library()
+    mapped_paper = paper_library.pack_store.open(paper_id) if paper_library.pack_store is not None else None
+    if mapped_paper is not None:
+        meta = mapped_paper.meta()
+        data = {key: meta[key] if key in meta else mapped_paper.tree_view(key) for key in mapped_paper.header["keys"]}
+    else:
+        data = paper_library.load(paper_id)
+    if data is None:
+        return
+    for key in saved_session_state_keys + ["summary_result", "loaded_job_id", "reader_toc"]:
+        st.session_state.pop(key, None)
+    for key, value in data.items():
+        st.session_state[key] = value
+    st.session_state["library_paper_id"] = paper_id
+    mark_state_changed()
+    if section_number:
+        toc = build_section_toc([{"title": "Introduction"}] + (data.get("sections_processed") or data.get("sections", [])))
+        st.session_state["reader_toc"] = next((index for index, item in enumerate(toc) if item[1] == f"{section_number}."), 0)
+
+
+def save_to_library():
+    """
+    将当前会话中的论文保存到文库，从文库打开的论文更新原有记录
+    """
+    materialize_section_trees(st.session_state)
+    data = json.loads(save_session_state())
+    st.session_state["library_paper_id"] = get_paper_library().save(data, paper_id=st.session_state.get("library_paper_id"))
+
+
+def show_search_hits(hits, key_prefix):
+    """
+    显示章节级的搜索结果，每条结果可打开论文并定位到章节，或查找与该章节相似的章节
+    :param hits: 搜索结果，格式见SearchIndex.search
+    :param key_prefix: 按钮key的前缀，同一页面中多处显示结果时需不同
+    """
+    for rank, hit in enumerate(hits):
+        col1, col2, col3 = st.columns([5.6, 0.6, 0.6])
+        with col1:
+            section = f'{hit["section_number"]} {hit["title"]}' if hit["section_number"] else "整篇论文"
+            sources = "、".join(search_source_names[source] for source in hit["sources"])
+            st.markdown(f'**{hit["paper_title"] or "未命名论文"}** · {section}  \n匹配：{sources}（得分{hit["score"]:.2f}）')
+        with col2:
+            st.button("打开", key=f'{key_prefix}_open_{rank}', on_click=open_library_paper, args=(hit["paper_id"], hit["section_number"]))
+        with col3:
+            st.button("相似", key=f'{key_prefix}_similar_{rank}', on_click=select_related,
+                      args=(("section", hit["paper_id"], hit["section_number"], f'{hit["paper_title"]} · {hit["title"]}'),))
+
+
+def select_related(related):
+    """
+    选择查找相关内容的对象
+    :param related: ("paper", 论文ID, 论文标题)或("section", 论文ID, 章节编号, 显示名称)，None为关闭
+    """
+    st.session_state["library_related"] = related
+
+
+def show_related(paper_library):
+    """
+    显示与选定论文相关的论文，或与选定章节相似的其他论文的章节（基于语义向量索引）
+    """
+    related = st.session_state.get("library_related")
+    if not related:
+        return
+    col1, col2 = st.columns([5.6, 0.6])
+    with col2:
+        st.button("关闭", key="library_related_close", on_click=select_related, args=(None,))
+    if related[0] == "paper":
+        _, paper_id, title = related
+        with col1:
+            st.markdown(f'##### 与《{title or "未命名论文"}》相关的论文')
+        papers = paper_library.semantic_index.related_papers(paper_id, limit=semantic_result_limit)
+        if not papers:
+            st.info("没有找到相关论文，可尝试重建索引")
+        for rank, paper in enumerate(papers):
+            col1, col2 = st.columns([5.6, 0.6])
+            with col1:
+                st.markdown(f'**{paper["paper_title"] or "未命名论文"}**（相似度{paper["score"]:.2f}）')
+            with col2:
+                st.button("打开", key=f'library_related_open_{rank}', on_click=open_library_paper, args=(paper["paper_id"],))
+    else:
+        _, paper_id, section_number, title = related
+        with col1:
+            st.markdown(f'##### 与“{title}”相似的章节')
+        hits = paper_library.semantic_index.related_sections(paper_id, section_number, limit=semantic_result_limit)
+        if not hits:
+            st.info("没有找到相似章节，可尝试重建索引")
+        show_search_hits(hits, "library_related_hit")
+    st.divider()
+
+
+def show_bulk_import(paper_library):
+    """
+    批量导入：上传多个论文文件或zip压缩包，一次导入文库，并显示每个文件的解析及保存耗时
+    """
+    with st.expander("批量导入"):
+        uploaded_files = st.file_uploader(label="批量导入", label_visibility="collapsed", type=['json', 'gz', 'sapk', 'zip'],
+                                          accept_multiple_files=True, key="library_bulk_import_files")
+        if uploaded_files and st.button("导入文库", key="library_bulk_import_button"):
+            start = time.perf_counter()
+            records = import_papers(paper_library, ((file.name, file.getvalue()) for file in uploaded_files))
+            imported = sum(record["status"] == "imported" for record in records)
+            st.success(f'已导入{imported}篇论文，失败{len(records) - imported}个文件，总耗时{time.perf_counter() - start:.2f}秒')
+            st.dataframe([
+                {
+                    "文件": record["name"],
+                    "状态": "成功" if record["status"] == "imported" else f'失败：{record["error"]}',
+                    "标题": record.get("title", ""),
+                    "解析耗时(ms)": round(record["parse_seconds"] * 1000, 1),
+                    "保存耗时(ms)": round(record["save_seconds"] * 1000, 1),
+                }
+                for record in records
+            ])
+
+
+def library():
+    """
+    文库页显示内容：论文列表、搜索筛选、标星、打开及删除论文
+    """
+    paper_library = get_paper_library()
+    col1, col2, col3, col4, col5 = st.columns([2, 0.6, 0.8, 0.8, 0.8])
+    with col1:
+        query = st.text_input(label="搜索", placeholder="按标题、作者、发表刊物搜索", key="library_query", label_visibility="collapsed")
+    with col2:
+        starred_only = sac.switch(label='只看标星', value=False, key="library_starred_only")
+    with col3:
+        order = st.selectbox(label="排序", options=list(library_order_options), key="library_order", label_visibility="collapsed")
+    with col4:
+        st.button("保存当前论文", key="library_save_button", disabled=not st.session_state["title-area"], on_click=save_to_library)
+    with col5:
+        if st.button("导入paper目录", key="library_import_button"):
+            st.success(f'已导入{paper_library.import_directory("paper")}篇论文')
+    show_bulk_import(paper_library)
+
+    # 全文搜索，结果定位到章节
+    col1, col2, col3 = st.columns([4, 0.6, 0.8])
+    with col1:
+        full_text_query = st.text_input(label="全文搜索", placeholder="全文搜索：在正文、译文及总结中搜索，结果定位到章节",
+                                        key="library_full_text_query", label_visibility="collapsed")
+    with col2:
+        semantic_search = sac.switch(label='语义搜索', value=False, key="library_semantic_search")
+    with col3:
+        if st.button("重建索引", key="library_rebuild_index_button"):
+            st.success(f"已为{paper_library.rebuild_indexes()}篇论文建立索引")
+    if full_text_query:
+        if semantic_search:
+            hits = paper_library.semantic_index.search(full_text_query, limit=search_result_limit)
+        else:
+            hits = paper_library.search_index.search(full_text_query, limit=search_result_limit)
+        if not hits:
+            st.info("没有找到相关章节")
+        show_search_hits(hits, "library_hit")
+        st.divider()
+    show_related(paper_library)
+
+    total = paper_library.count(query=query, starred_only=starred_only)
+    page_count = max(1, (total + library_page_size - 1) // library_page_size)
+    page_number = st.number_input(label=f"共{total}篇论文，{page_count}页", min_value=1, max_value=page_count, value=1, key="library_page")
+    papers = paper_library.list(query=query, starred_only=starred_only, order=order, limit=library_page_size,
+                                offset=(page_number - 1) * library_page_size)
+    for paper in papers:
+        col1, col2, col3, col4, col5 = st.columns([0.3, 5, 0.6, 0.6, 0.6])
+        with col1:
+            st.button("★" if paper["starred"] else "☆", key=f'library_star_{paper["paper_id"]}',
+                      on_click=paper_library.set_starred, args=(paper["paper_id"], not paper["starred"]))
+        with col2:
+            current = "（当前）" if paper["paper_id"] == st.session_state.get("library_paper_id") else ""
+            st.markdown(f'**{paper["title"] or "未命名论文"}**{current}  \n'
+                        f'{paper["authors"]} · {paper["publication"]} · {paper["publish_time"]}')
+        with col3:
+            st.button("打开", key=f'library_open_{paper["paper_id"]}', on_click=open_library_paper, args=(paper["paper_id"],))
+        with col4:
+            st.button("相关", key=f'library_related_{paper["paper_id"]}', on_click=select_related,
+                      args=(("paper", paper["paper_id"], paper["title"]),))
+        with col5:
+            st.button("删除", key=f'library_delete_{paper["paper_id"]}', on_click=paper_library.delete, args=(paper["paper_id"],))
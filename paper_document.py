@@ -0,0 +1,259 @@
+from typing import Any, Dict, List, Optional
+
+
+class Section:
+    """
+    论文章节，子章节位于sections中。字典形式（st.session_state['sections']等）的结构参见utils.run_chapter_editor
+    """
+    __slots__ = ("id", "title", "texts", "flag", "sections")
+    id: Optional[str]
+    title: str
+    texts: str
+    flag: bool
+    sections: List["Section"]
+
+    def __init__(self, id=None, title="", texts="", flag=True, sections=None):
+        self.id = id
+        self.title = title
+        self.texts = texts
+        self.flag = flag
+        self.sections = [] if sections is None else sections
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            id=data.get("id"),
+            title=data.get("title", ""),
+            texts=data.get("texts", ""),
+            flag=data.get("flag", True),
+            sections=sections_from_dicts(data.get("sections", [])),
+        )
+
+    def to_dict(self):
+        return {"flag": self.flag, "id": self.id, "title": self.title, "texts": self.texts, "sections": sections_to_dicts(self.sections)}
+
+    def copy(self):
+        """
+        复制章节树的结构，字符串内容共享，修改副本的字段不影响原章节树
+        """
+        return Section(id=self.id, title=self.title, texts=self.texts, flag=self.flag, sections=copy_sections(self.sections))
+
+    def to_numbered_dict(self, number):
+        """
+        转换为带章节号的字典（不含id、flag），子章节按层级编号，即utils.flatten_numbered_sections的输入格式
+        :param number: 章节号，如"3.1"
+        """
+        return {
+            "title": self.title,
+            "texts": self.texts,
+            "sections": [section.to_numbered_dict(f"{number}.{index}") for index, section in enumerate(self.sections, start=1)],
+            "section_number": number,
+        }
+
+
+def sections_from_dicts(items):
+    return [Section.from_dict(item) for item in items]
+
+
+def sections_to_dicts(sections):
+    return [section.to_dict() for section in sections]
+
+
+def copy_sections(sections):
+    return [section.copy() for section in sections]
+
+
+def walk_sections(sections):
+    """
+    按文档顺序（先序遍历）展开章节树，元素与原章节树中的章节为同一对象
+    """
+    flat_sections = []
+    for section in sections:
+        flat_sections.append(section)
+        flat_sections.extend(walk_sections(section.sections))
+    return flat_sections
+
+
+def numbered_sections(sections, first_number=3):
+    """
+    为正文章节添加章节号（摘要为第1章、引言为第2章，正文从第3章开始），子章节依次编号为3.1、3.1.1等
+    """
+    return [section.to_numbered_dict(str(number)) for number, section in enumerate(sections, start=first_number)]
+
+
+class PaperDocument:
+    """
+    待处理的论文（"编辑"页面录入的内容），各处理阶段的输入
+    """
+    __slots__ = ("title", "authors", "institutes", "publication", "publish_time", "keywords", "abstract", "introduction", "sections")
+    title: str
+    authors: str
+    institutes: str
+    publication: str
+    publish_time: str
+    keywords: str
+    abstract: str
+    introduction: str
+    sections: List[Section]
+
+    def __init__(self, title="", authors="", institutes="", publication="", publish_time="", keywords="", abstract="", introduction="",
+                 sections=None):
+        self.title = title
+        self.authors = authors
+        self.institutes = institutes
+        self.publication = publication
+        self.publish_time = publish_time
+        self.keywords = keywords
+        self.abstract = abstract
+        self.introduction = introduction
+        self.sections = [] if sections is None else sections
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        :param state: 论文数据所在的状态字典，键与st.session_state一致
+        """
+        return cls(
+            title=state.get("title-area", ""),
+            authors=state.get("authors-area", ""),
+            institutes=state.get("institutes-area", ""),
+            publication=state.get("publication", ""),
+            publish_time=state.get("publish_time", ""),
+            keywords=state.get("keywords-area", ""),
+            abstract=state.get("abstract-area", ""),
+            introduction=state.get("introduction-area", ""),
+            sections=sections_from_dicts(state.get("sections", [])),
+        )
+
+
+class FormatResult:
+    """
+    格式处理（及翻译）阶段的结果。未翻译时中文字段保持为空
+    """
+    __slots__ = ("abstract", "introduction", "sections", "fingerprints",
+                 "zh_title", "zh_institutes", "zh_keywords", "zh_abstract", "zh_introduction", "zh_sections")
+    abstract: str
+    introduction: str
+    sections: List[Section]
+    # 章节ID到章节指纹的字典，只包含处理成功的章节
+    fingerprints: Dict[str, str]
+    zh_title: str
+    zh_institutes: str
+    zh_keywords: str
+    zh_abstract: str
+    zh_introduction: str
+    zh_sections: List[Section]
+    # 字段与st.session_state键的对应关系，章节树单独转换
+    state_keys = {
+        "abstract": "abstract_processed",
+        "introduction": "introduction_processed",
+        "fingerprints": "sections_processed_fingerprints",
+        "zh_title": "zh_title-area",
+        "zh_institutes": "zh_institutes-area",
+        "zh_keywords": "zh_keywords-area",
+        "zh_abstract": "zh_abstract_processed",
+        "zh_introduction": "zh_introduction_processed",
+    }
+
+    def __init__(self, abstract="", introduction="", sections=None, fingerprints=None, zh_title="", zh_institutes="", zh_keywords="",
+                 zh_abstract="", zh_introduction="", zh_sections=None):
+        self.abstract = abstract
+        self.introduction = introduction
+        self.sections = [] if sections is None else sections
+        self.fingerprints = {} if fingerprints is None else fingerprints
+        self.zh_title = zh_title
+        self.zh_institutes = zh_institutes
+        self.zh_keywords = zh_keywords
+        self.zh_abstract = zh_abstract
+        self.zh_introduction = zh_introduction
+        self.zh_sections = [] if zh_sections is None else zh_sections
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        读取上次的处理结果，用于复用未修改章节的处理结果
+        """
+        result = cls(sections=sections_from_dicts(state.get("sections_processed") or []),
+                     zh_sections=sections_from_dicts(state.get("zh_sections_processed") or []))
+        for field, key in cls.state_keys.items():
+            if state.get(key):
+                setattr(result, field, state[key])
+        return result
+
+    def to_state(self, translate_flag):
+        """
+        转换为st.session_state键值，未翻译时不包含中文字段（保留上次的翻译结果）
+        """
+        values = {"abstract_processed": self.abstract, "introduction_processed": self.introduction,
+                  "sections_processed": sections_to_dicts(self.sections), "sections_processed_fingerprints": self.fingerprints}
+        if translate_flag:
+            values.update({key: getattr(self, field) for field, key in self.state_keys.items() if field.startswith("zh_")})
+            values["zh_sections_processed"] = sections_to_dicts(self.zh_sections)
+        return values
+
+
+class AnalysisResult:
+    """
+    总结评审阶段的结果
+    """
+    __slots__ = ("summary_result", "summary", "section_summaries", "overall_assessment")
+    # 总结API返回的完整结果，调用失败时为{"flag": "调用失败"}
+    summary_result: Dict[str, Any]
+    summary: str
+    # 章节号到章节总结的字典，参见utils.get_section_summary
+    section_summaries: Dict[str, str]
+    overall_assessment: List[Any]
+
+    def __init__(self, summary_result=None, summary="", section_summaries=None, overall_assessment=None):
+        self.summary_result = {} if summary_result is None else summary_result
+        self.summary = summary
+        self.section_summaries = {} if section_summaries is None else section_summaries
+        self.overall_assessment = [] if overall_assessment is None else overall_assessment
+
+    def to_state(self):
+        """
+        转换为st.session_state键值，总结结果中缺少的部分不包含在内（保留原值）
+        """
+        values = {"summary_result": self.summary_result}
+        for key in ["summary", "section_summaries", "overall_assessment"]:
+            if key in self.summary_result:
+                values[key] = getattr(self, key)
+        return values
+
+
+class PolishResult:
+    """
+    润色阶段的结果
+    """
+    __slots__ = ("title", "introduction", "abstract", "sections", "fingerprints")
+    title: str
+    introduction: str
+    abstract: str
+    sections: List[Section]
+    fingerprints: Dict[str, str]
+
+    def __init__(self, title="", introduction="", abstract="", sections=None, fingerprints=None):
+        self.title = title
+        self.introduction = introduction
+        self.abstract = abstract
+        self.sections = [] if sections is None else sections
+        self.fingerprints = {} if fingerprints is None else fingerprints
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(
+            title=state.get("polished_title", ""),
+            introduction=state.get("polished_introduction", ""),
+            abstract=state.get("polished_abstract", ""),
+            sections=sections_from_dicts(state.get("polished_sections") or []),
+            fingerprints=state.get("polished_sections_fingerprints") or {},
+        )
+
+    def to_state(self):
+        return {
+            "polished_title": self.title,
+            "polished_introduction": self.introduction,
+            "polished_abstract": self.abstract,
+            "polished_sections": sections_to_dicts(self.sections),
+            "polished_sections_fingerprints": self.fingerprints,
+        }
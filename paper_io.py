@@ -0,0 +1,171 @@
+import gzip
+import io
+import json
+import os
+import time
+import zipfile
+from paper_pack import is_packed, unpack_paper, PackFormatError
+from utils import saved_session_state_keys
+
+try:
+    # orjson解析速度约为标准库json的3~5倍，未安装时使用标准库
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class PaperFormatError(ValueError):
+    """
+    论文文件无法解析或不符合论文数据格式
+    """
+
+
+# 论文文件（utils.save_session_state写入的键）的数据格式：键 -> 允许的类型
+section_tree_keys = ["sections", "sections_processed", "zh_sections_processed", "polished_sections"]
+paper_schema = {key: (str,) for key in saved_session_state_keys}
+paper_schema.update({key: (list,) for key in section_tree_keys})
+paper_schema.update({
+    # 总结结果在不同版本中为字典或列表
+    "section_summaries": (dict, list),
+    "overall_assessment": (dict, list),
+    "sections_processed_fingerprints": (dict,),
+    "polished_sections_fingerprints": (dict,),
+    "polish_language_is_english": (bool,),
+})
+
+
+def loads(content):
+    """
+    解析JSON，已安装orjson时使用orjson
+    :param content: JSON文本(bytes或str)
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError as e:
+            raise PaperFormatError(f"JSON解析失败: {e}") from None
+    try:
+        return json.loads(content)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise PaperFormatError(f"JSON解析失败: {e}") from None
+
+
+def validate_section_tree(sections, key):
+    """
+    检查章节树的结构，每个章节须包含字符串类型的title、texts，子章节位于sections列表中。以栈遍历，不受章节嵌套深度的限制
+    """
+    stack = [(sections, key)]
+    while stack:
+        items, path = stack.pop()
+        if not isinstance(items, list):
+            raise PaperFormatError(f"{path}应为列表")
+        for index, section in enumerate(items):
+            section_path = f"{path}[{index}]"
+            if not isinstance(section, dict):
+                raise PaperFormatError(f"{section_path}应为字典")
+            for field in ["title", "texts"]:
+                if not isinstance(section.get(field), str):
+                    raise PaperFormatError(f"{section_path}.{field}缺失或不是字符串")
+            stack.append((section.get("sections", []), f"{section_path}.sections"))
+
+
+def validate_paper_data(data):
+    """
+    按paper_schema检查论文数据，忽略未知的键
+    :param data: 解析后的论文文件内容
+    :return: 仅包含已知键的论文数据字典
+    :raises PaperFormatError: 格式不符时抛出，消息中包含出错的键
+    """
+    if not isinstance(data, dict):
+        raise PaperFormatError("论文文件的内容应为JSON对象")
+    paper = {key: value for key, value in data.items() if key in paper_schema}
+    if not paper:
+        raise PaperFormatError("文件中没有论文数据")
+    for key, value in paper.items():
+        if not isinstance(value, paper_schema[key]):
+            expected = "或".join(value_type.__name__ for value_type in paper_schema[key])
+            raise PaperFormatError(f"{key}的类型应为{expected}，实际为{type(value).__name__}")
+        if key in section_tree_keys:
+            validate_section_tree(value, key)
+    return paper
+
+
+def load_paper_file(content):
+    """
+    解析并检查上传的论文文件，支持JSON、gzip压缩的JSON及紧凑二进制格式（utils.export_formats中的全部格式）
+    :param content: 文件内容(bytes)
+    :return: 论文数据字典
+    :raises PaperFormatError: 文件无法解析或格式不符
+    """
+    if is_packed(content):
+        try:
+            return validate_paper_data(unpack_paper(content))
+        except (PackFormatError, KeyError, IndexError, TypeError) as e:
+            raise PaperFormatError(f"紧凑二进制文件解析失败: {e}") from None
+    if content[:2] == b"\x1f\x8b":
+        try:
+            content = gzip.decompress(content)
+        except (OSError, EOFError) as e:
+            raise PaperFormatError(f"gzip解压失败: {e}") from None
+    return validate_paper_data(loads(content))
+
+
+def is_paper_file(name):
+    return name.endswith((".json", ".json.gz", ".sapk"))
+
+
+def iter_paper_files(name, content):
+    """
+    展开待导入的文件，zip压缩包中的论文文件逐个读取
+    :param name: 文件名
+    :param content: 文件内容(bytes)
+    :return: 生成器，元素为(文件名, 文件内容)
+    """
+    if not name.endswith(".zip"):
+        yield name, content
+        return
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and is_paper_file(info.filename):
+                yield f"{name}/{info.filename}", archive.read(info)
+
+
+def import_papers(paper_library, files):
+    """
+    将多个论文文件导入文库，单个文件格式不符时跳过，不影响其余文件
+    :param paper_library: 文库(paper_library.PaperLibrary)
+    :param files: 可迭代对象，元素为(文件名, 文件内容bytes)，文件可为JSON、gzip压缩的JSON、紧凑二进制文件或包含这些文件的zip压缩包
+    :return: 导入记录列表，每条记录包含"name"、"status"（"imported"或"failed"）、"parse_seconds"、"save_seconds"，
+             成功时包含"paper_id"、"title"，失败时包含"error"
+    """
+    records = []
+    for file_name, file_content in files:
+        try:
+            paper_files = list(iter_paper_files(file_name, file_content))
+        except zipfile.BadZipFile as e:
+            records.append({"name": file_name, "status": "failed", "error": f"zip解压失败: {e}", "parse_seconds": 0.0, "save_seconds": 0.0})
+            continue
+        for name, content in paper_files:
+            start = time.perf_counter()
+            try:
+                data = load_paper_file(content)
+            except PaperFormatError as e:
+                records.append({"name": name, "status": "failed", "error": str(e), "parse_seconds": time.perf_counter() - start,
+                                "save_seconds": 0.0})
+                continue
+            parsed = time.perf_counter()
+            paper_id = paper_library.save(data)
+            records.append({"name": name, "status": "imported", "paper_id": paper_id, "title": data.get("title-area", ""),
+                            "parse_seconds": parsed - start, "save_seconds": time.perf_counter() - parsed})
+    return records
+
+
+def read_directory_files(directory):
+    """
+    逐个读取目录中的论文文件及zip压缩包
+    :return: 生成器，元素为(文件名, 文件内容bytes)
+    """
+    for file_name in sorted(os.listdir(directory)):
+        if is_paper_file(file_name) or file_name.endswith(".zip"):
+            with open(os.path.join(directory, file_name), "rb") as file:
+                yield file_name, file.read()
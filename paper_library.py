@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from paper_io import import_papers, read_directory_files
+from paper_pack import pack_paper, unpack_paper, is_packed
+from search_index import SearchIndex
+from semantic_index import SemanticIndex, load_encoder
+from paper_store import PackStore
+from config.config import (library_storage_format, library_path, search_index_path, semantic_index_dir, semantic_encoder, semantic_dim,
+                           library_mapped_reading, library_pack_dir)
+
+# 文库列表的排序方式
+library_order_options = {
+    "发表时间": "publish_time DESC",
+    "更新时间": "updated_at DESC",
+    "标题": "title COLLATE NOCASE",
+}
+
+
+class PaperLibrary:
+    """
+    基于SQLite的论文文库。论文元数据（标题、作者、发表时间、发表刊物、标星）与论文正文分表存储：
+    列表、搜索及筛选只读取元数据表，论文正文（压缩的JSON或紧凑二进制格式，参见config.library_storage_format）仅在打开论文时按需读取。
+    传入全文索引、语义向量索引、紧凑二进制文件目录时，保存及删除论文的同时增量更新。
+    """
+
+    def __init__(self, path, search_index=None, semantic_index=None, pack_store=None):
+        """
+        :param path: SQLite数据库文件路径，目录不存在时自动创建。
+        :param search_index: 可选的全文索引(search_index.SearchIndex)
+        :param semantic_index: 可选的语义向量索引(semantic_index.SemanticIndex)
+        :param pack_store: 可选的紧凑二进制文件目录(paper_store.PackStore)，用于内存映射阅读
+        """
+        self.search_index = search_index
+        self.semantic_index = semantic_index
+        self.pack_store = pack_store
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS papers ("
+                "paper_id TEXT PRIMARY KEY, title TEXT NOT NULL, authors TEXT NOT NULL, publish_time TEXT NOT NULL, "
+                "publication TEXT NOT NULL, starred INTEGER NOT NULL DEFAULT 0, body_size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS papers_publish_time ON papers (publish_time)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS papers_updated_at ON papers (updated_at)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS papers_starred ON papers (starred)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS paper_bodies (paper_id TEXT PRIMARY KEY, body BLOB NOT NULL)")
+
+    @staticmethod
+    def make_paper_id(data):
+        """
+        根据标题、作者及发表时间生成论文ID，同一论文重复保存时更新原有记录
+        :param data: 论文数据字典，键与st.session_state一致
+        """
+        payload = json.dumps([data.get("title-area", ""), data.get("authors-area", ""), data.get("publish_time", "")], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf8')).hexdigest()[:16]
+
+    def save(self, data, paper_id=None):
+        """
+        保存论文，已存在时更新元数据及正文，保留标星状态
+        :param data: 论文数据字典，键与st.session_state一致（参见utils.saved_session_state_keys）
+        :param paper_id: 论文ID，默认由make_paper_id生成
+        :return: 论文ID
+        """
+        paper_id = self.make_paper_id(data) if paper_id is None else paper_id
+        if library_storage_format == "pack":
+            body = pack_paper(data)
+        else:
+            body = zlib.compress(json.dumps(data, ensure_ascii=False).encode('utf8'))
+        now = time.time()
+        with self.lock:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO papers (paper_id, title, authors, publish_time, publication, body_size, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(paper_id) DO UPDATE SET "
+                    "title = excluded.title, authors = excluded.authors, publish_time = excluded.publish_time, "
+                    "publication = excluded.publication, body_size = excluded.body_size, updated_at = excluded.updated_at",
+                    (paper_id, data.get("title-area", ""), data.get("authors-area", ""), str(data.get("publish_time", "")),
+                     data.get("publication", ""), len(body), now, now)
+                )
+                self.connection.execute("INSERT OR REPLACE INTO paper_bodies (paper_id, body) VALUES (?, ?)", (paper_id, body))
+        for index in self.indexes():
+            index.index_paper(paper_id, data)
+        return paper_id
+
+    def load(self, paper_id):
+        """
+        读取论文正文
+        :return: 论文数据字典，论文不存在时返回None
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT body FROM paper_bodies WHERE paper_id = ?", (paper_id,)).fetchone()
+        if row is None:
+            return None
+        if is_packed(row[0]):
+            return unpack_paper(row[0])
+        return json.loads(zlib.decompress(row[0]).decode('utf8'))
+
+    @staticmethod
+    def build_filter(query, starred_only):
+        conditions = []
+        params = []
+        if query:
+            conditions.append("(title LIKE ? OR authors LIKE ? OR publication LIKE ?)")
+            params.extend([f"%{query}%"] * 3)
+        if starred_only:
+            conditions.append("starred = 1")
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def list(self, query="", starred_only=False, order="发表时间", limit=None, offset=0):
+        """
+        列出论文元数据，不读取论文正文
+        :param query: 按标题、作者、发表刊物筛选的关键字
+        :param starred_only: 是否只列出标星论文
+        :param order: 排序方式，取值见library_order_options
+        :param limit: 最多返回的条数，None为不限制
+        :param offset: 跳过的条数，用于分页
+        :return: 元数据字典列表
+        """
+        where, params = self.build_filter(query, starred_only)
+        sql = (f"SELECT paper_id, title, authors, publish_time, publication, starred, body_size, created_at, updated_at "
+               f"FROM papers{where} ORDER BY starred DESC, {library_order_options[order]} LIMIT ? OFFSET ?")
+        with self.lock:
+            rows = self.connection.execute(sql, params + [-1 if limit is None else limit, offset]).fetchall()
+        keys = ["paper_id", "title", "authors", "publish_time", "publication", "starred", "body_size", "created_at", "updated_at"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    def count(self, query="", starred_only=False):
+        """
+        符合筛选条件的论文数，参数含义同list
+        """
+        where, params = self.build_filter(query, starred_only)
+        with self.lock:
+            return self.connection.execute(f"SELECT COUNT(*) FROM papers{where}", params).fetchone()[0]
+
+    def set_starred(self, paper_id, starred):
+        """
+        标星或取消标星
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.execute("UPDATE papers SET starred = ? WHERE paper_id = ?", (int(starred), paper_id))
+
+    def delete(self, paper_id):
+        """
+        删除论文的元数据及正文
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM papers WHERE paper_id = ?", (paper_id,))
+                self.connection.execute("DELETE FROM paper_bodies WHERE paper_id = ?", (paper_id,))
+        for index in self.indexes():
+            index.remove_paper(paper_id)
+
+    def import_directory(self, directory):
+        """
+        将目录中的论文文件（"保存"页面下载的JSON、gzip压缩的JSON及其zip压缩包）导入文库，格式不符的文件被跳过
+        :param directory: 目录路径
+        :return: 导入的论文数
+        """
+        records = import_papers(self, read_directory_files(directory))
+        for record in records:
+            if record["status"] == "failed":
+                print(f'导入{record["name"]}失败: {record["error"]}')
+        return sum(record["status"] == "imported" for record in records)
+
+    def indexes(self):
+        return [index for index in (self.search_index, self.semantic_index, self.pack_store) if index is not None]
+
+    def rebuild_indexes(self):
+        """
+        为全文索引、语义向量索引及紧凑二进制文件目录中缺失的论文建立索引，并删除文库中已不存在的论文的索引。
+        论文正文逐篇读取，不会同时载入全部论文
+        :return: 新建索引的论文数
+        """
+        with self.lock:
+            paper_ids = [row[0] for row in self.connection.execute("SELECT paper_id FROM papers")]
+        missing = set()
+        for index in self.indexes():
+            indexed_paper_ids = index.indexed_paper_ids()
+            for paper_id in indexed_paper_ids - set(paper_ids):
+                index.remove_paper(paper_id)
+            missing.update(paper_id for paper_id in paper_ids if paper_id not in indexed_paper_ids)
+        for paper_id in missing:
+            data = self.load(paper_id)
+            for index in self.indexes():
+                index.index_paper(paper_id, data)
+        return len(missing)
+
+
+# 进程内共享的文库实例，首次使用时创建
+paper_library = None
+paper_library_lock = threading.Lock()
+
+
+def get_paper_library():
+    """
+    获取进程内共享的论文文库
+    """
+    global paper_library
+    with paper_library_lock:
+        if paper_library is None:
+            paper_library = PaperLibrary(
+                path=library_path,
+                search_index=SearchIndex(path=search_index_path),
+                semantic_index=SemanticIndex(directory=semantic_index_dir, encoder=load_encoder(semantic_encoder, semantic_dim)),
+                pack_store=PackStore(directory=library_pack_dir) if library_mapped_reading else None,
+            )
+    return paper_library
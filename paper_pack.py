@@ -0,0 +1,296 @@
+import argparse
+import json
+import struct
+import zlib
+from config.config import paper_pack_codec, paper_pack_level
+
+try:
+    # zstd的解压速度明显快于zlib，未安装zstandard时使用zlib
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 文件格式：魔数(5字节) + 头部长度(uint32) + 头部（zlib压缩的JSON） + 各数据帧
+pack_magic = b"SAPK\x01"
+header_length_format = "<I"
+data_start = len(pack_magic) + struct.calcsize(header_length_format)
+# 章节的标准字段，其余字段或缺失的字段记录在章节记录的附加信息中
+section_fields = ["flag", "id", "title", "texts", "sections"]
+
+
+class PackFormatError(ValueError):
+    """
+    紧凑二进制文件无法解析
+    """
+
+
+def is_packed(content):
+    return bytes(content[:len(pack_magic)]) == pack_magic
+
+
+def compress_frame(payload, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=paper_pack_level).compress(payload)
+    return zlib.compress(payload, paper_pack_level)
+
+
+def decompress_frame(frame, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise PackFormatError("该文件以zstd压缩，需安装zstandard")
+        return zstandard.ZstdDecompressor().decompress(frame)
+    return zlib.decompress(frame)
+
+
+def is_section_tree(value):
+    """
+    判断值是否为章节树（章节字典列表，每个章节包含字符串类型的title、texts及列表类型的sections）
+    """
+    stack = [value]
+    while stack:
+        items = stack.pop()
+        if not isinstance(items, list):
+            return False
+        for section in items:
+            if not isinstance(section, dict) or not isinstance(section.get("title"), str) or not isinstance(section.get("texts"), str):
+                return False
+            stack.append(section.get("sections", []))
+    return True
+
+
+def walk_tree(sections):
+    """
+    按文档顺序（先序遍历）展开章节树
+    :return: 列表，每个元素为(章节字典, 子章节数)
+    """
+    nodes = []
+    stack = list(reversed(sections))
+    while stack:
+        section = stack.pop()
+        children = section.get("sections", [])
+        nodes.append((section, len(children)))
+        stack.extend(reversed(children))
+    return nodes
+
+
+def subtree_ranges(children):
+    """
+    由先序遍历的子章节数计算各顶级章节子树在遍历序列中的范围
+    :return: [(开始位置, 结束位置)]
+    """
+    ranges = []
+    position = 0
+    while position < len(children):
+        start = position
+        pending = 1
+        while pending:
+            pending += children[position] - 1
+            position += 1
+        ranges.append((start, position))
+    return ranges
+
+
+class StringTable:
+    """
+    数据帧内的字符串表，相同的字符串（如未修改的原文与格式处理结果）只存储一次
+    """
+
+    def __init__(self):
+        self.strings = []
+        self.positions = {}
+
+    def add(self, text):
+        position = self.positions.get(text)
+        if position is None:
+            position = self.positions[text] = len(self.strings)
+            self.strings.append(text)
+        return position
+
+
+def encode_section(section, table):
+    """
+    章节记录：[flag, title, texts]，title、texts为字符串表中的位置；含非标准字段或缺少标准字段时追加附加信息
+    """
+    record = [section.get("flag", True), table.add(section["title"]), table.add(section["texts"])]
+    extra = {key: value for key, value in section.items() if key not in section_fields}
+    missing = [key for key in section_fields if key not in section]
+    if extra or missing:
+        record.append({"extra": extra, "missing": missing})
+    return record
+
+
+def pack_paper(data, codec=None):
+    """
+    将论文数据转换为紧凑二进制格式。
+    各章节树（原文、格式处理结果、译文、润色结果）的结构（章节ID及层级）只存储一次，文本按树分列存储；
+    每个顶级章节（包含其子章节在各树中的文本）单独压缩为一个数据帧，读取单个章节时无需解压整篇论文。
+    :param data: 论文数据字典，键与st.session_state一致
+    :param codec: 压缩方式，"zstd"或"zlib"，默认为config.paper_pack_codec，未安装zstandard时使用zlib
+    :return: 文件内容(bytes)
+    """
+    codec = codec or paper_pack_codec
+    if codec == "zstd" and zstandard is None:
+        codec = "zlib"
+    trees = {key: value for key, value in data.items() if value and is_section_tree(value)}
+    meta = {key: value for key, value in data.items() if key not in trees}
+    # 结构与已存储的树相同的树只记录引用
+    shapes = {}
+    tree_nodes = {}
+    # 各章节的标题及正文长度存储在头部，生成目录、判断是否分页时无需解压数据帧
+    outlines = {}
+    for key, sections in trees.items():
+        nodes = walk_tree(sections)
+        tree_nodes[key] = nodes
+        outlines[key] = {"titles": [section["title"] for section, _ in nodes], "text_sizes": [len(section["texts"]) for section, _ in nodes]}
+        shape = {"ids": [section.get("id") for section, _ in nodes], "children": [children for _, children in nodes]}
+        same_as = next((other for other, other_shape in shapes.items() if "same_as" not in other_shape and other_shape == shape), None)
+        shapes[key] = {"same_as": same_as} if same_as else shape
+
+    frames = [compress_frame(json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode('utf8'), codec)]
+    ranges = {key: subtree_ranges([children for _, children in nodes]) for key, nodes in tree_nodes.items()}
+    for chapter in range(max((len(value) for value in ranges.values()), default=0)):
+        table = StringTable()
+        columns = {}
+        for key, nodes in tree_nodes.items():
+            if chapter < len(ranges[key]):
+                start, end = ranges[key][chapter]
+                columns[key] = [encode_section(section, table) for section, _ in nodes[start:end]]
+        payload = {"strings": table.strings, "trees": columns}
+        frames.append(compress_frame(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode('utf8'), codec))
+
+    offsets = []
+    position = 0
+    for frame in frames:
+        offsets.append([position, len(frame)])
+        position += len(frame)
+    header = {"codec": codec, "keys": list(data), "trees": shapes, "outlines": outlines, "frames": offsets}
+    header_bytes = zlib.compress(json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode('utf8'))
+    return b"".join([pack_magic, struct.pack(header_length_format, len(header_bytes)), header_bytes] + frames)
+
+
+class PackedPaper:
+    """
+    紧凑二进制格式的论文，按需解压：元数据（标题、摘要、总结等）与各顶级章节分别解压
+    """
+
+    def __init__(self, buffer):
+        """
+        :param buffer: 文件内容，bytes或支持切片的缓冲区（如mmap）
+        """
+        if not is_packed(buffer):
+            raise PackFormatError("不是紧凑二进制格式的论文文件")
+        try:
+            header_length = struct.unpack_from(header_length_format, buffer, len(pack_magic))[0]
+            self.header = json.loads(zlib.decompress(buffer[data_start:data_start + header_length]))
+        except (struct.error, zlib.error, ValueError) as e:
+            raise PackFormatError(f"文件头部损坏: {e}") from None
+        self.buffer = buffer
+        self.frames_start = data_start + header_length
+        self.codec = self.header["codec"]
+        self.shapes = {}
+        for key, shape in self.header["trees"].items():
+            self.shapes[key] = self.header["trees"][shape["same_as"]] if "same_as" in shape else shape
+        self.ranges = {key: subtree_ranges(shape["children"]) for key, shape in self.shapes.items()}
+
+    def read_frame(self, index):
+        offset, length = self.header["frames"][index]
+        start = self.frames_start + offset
+        try:
+            return json.loads(decompress_frame(self.buffer[start:start + length], self.codec))
+        except (zlib.error, ValueError) as e:
+            raise PackFormatError(f"第{index}个数据帧损坏: {e}") from None
+
+    def tree_keys(self):
+        return list(self.shapes)
+
+    def meta(self):
+        """
+        章节树以外的论文数据（标题、作者、摘要、引言、总结等）
+        """
+        return self.read_frame(0)
+
+    def chapter_count(self, key):
+        """
+        章节树的顶级章节数
+        """
+        return len(self.ranges.get(key, []))
+
+    def chapter(self, key, index, frame=None):
+        """
+        解压单个顶级章节（含子章节）
+        :param key: 章节树的键，如"sections_processed"
+        :param index: 顶级章节序号，从0开始
+        :param frame: 已解压的数据帧，同一章节读取多棵树时可复用
+        :return: 章节字典，结构与论文JSON中的一致
+        """
+        frame = self.read_frame(index + 1) if frame is None else frame
+        start, end = self.ranges[key][index]
+        shape = self.shapes[key]
+        strings = frame["strings"]
+        nodes = []
+        for position, record in zip(range(start, end), frame["trees"][key]):
+            section = {"flag": record[0], "id": shape["ids"][position], "title": strings[record[1]], "texts": strings[record[2]], "sections": []}
+            if len(record) > 3:
+                for field in record[3]["missing"]:
+                    section.pop(field, None)
+                section.update(record[3]["extra"])
+            nodes.append((section, shape["children"][position]))
+        # 按先序遍历的子章节数还原层级
+        root = nodes[0][0]
+        stack = [[root, nodes[0][1]]]
+        for section, children in nodes[1:]:
+            while not stack[-1][1]:
+                stack.pop()
+            parent = stack[-1]
+            parent[0]["sections"].append(section)
+            parent[1] -= 1
+            stack.append([section, children])
+        return root
+
+    def tree(self, key):
+        return [self.chapter(key, index) for index in range(self.chapter_count(key))]
+
+    def to_dict(self):
+        """
+        还原为论文数据字典，与打包前的数据一致（含键的顺序）
+        """
+        values = self.meta()
+        trees = {key: [] for key in self.shapes}
+        for index in range(max((len(ranges) for ranges in self.ranges.values()), default=0)):
+            frame = self.read_frame(index + 1)
+            for key in self.shapes:
+                if index < len(self.ranges[key]):
+                    trees[key].append(self.chapter(key, index, frame=frame))
+        values.update(trees)
+        return {key: values[key] for key in self.header["keys"]}
+
+
+def unpack_paper(content):
+    """
+    将紧凑二进制格式还原为论文数据字典
+    """
+    return PackedPaper(content).to_dict()
+
+
+def main(argv=None):
+    """
+    论文JSON文件与紧凑二进制文件(.sapk)互相转换，按输入文件的内容判断转换方向
+    """
+    parser = argparse.ArgumentParser(description="论文JSON文件与紧凑二进制文件(.sapk)互相转换")
+    parser.add_argument("input", help="输入文件")
+    parser.add_argument("output", help="输出文件")
+    parser.add_argument("--codec", choices=["zstd", "zlib"], default=None, help="压缩方式，默认为config.paper_pack_codec")
+    args = parser.parse_args(argv)
+    with open(args.input, "rb") as file:
+        content = file.read()
+    if is_packed(content):
+        output = json.dumps(unpack_paper(content), indent=4, ensure_ascii=False).encode('utf8')
+    else:
+        output = pack_paper(json.loads(content), codec=args.codec)
+    with open(args.output, "wb") as file:
+        file.write(output)
+    print(f"{args.input}（{len(content)}字节） -> {args.output}（{len(output)}字节）")
+
+
+if __name__ == '__main__':
+    main()
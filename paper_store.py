@@ -0,0 +1,241 @@
+import bisect
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from paper_pack import PackedPaper, pack_paper
+from config.config import mapped_paper_cache_size, mapped_frame_cache_size
+
+
+class MappedPaper(PackedPaper):
+    """
+    以内存映射方式打开的紧凑二进制论文文件（参见paper_pack.py）。文件内容由操作系统按页载入并在进程间共享，
+    只有头部（章节结构、标题）常驻内存；章节正文在访问时按一级章节解压，最近解压的数据帧按LRU缓存。
+    同一文件的实例在进程内共享（参见open_mapped_paper），打开同一论文的多个会话不重复占用内存。
+    """
+
+    def __init__(self, path):
+        """
+        :param path: 紧凑二进制文件路径
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            # 文件描述符关闭后映射仍然有效；文件被替换（os.replace）时，已打开的映射仍指向原文件内容
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        super().__init__(buffer)
+        self.frame_cache = OrderedDict()
+        self.frame_lock = threading.Lock()
+        self.outlines = self.header.get("outlines", {})
+        self.range_starts = {key: [start for start, _ in ranges] for key, ranges in self.ranges.items()}
+
+    def meta(self):
+        # 元数据直接写入各会话的st.session_state，每次解压得到独立的副本，不经过共享的数据帧缓存
+        return PackedPaper.read_frame(self, 0)
+
+    def read_frame(self, index):
+        with self.frame_lock:
+            frame = self.frame_cache.get(index)
+            if frame is not None:
+                self.frame_cache.move_to_end(index)
+                return frame
+        frame = super().read_frame(index)
+        with self.frame_lock:
+            self.frame_cache[index] = frame
+            while len(self.frame_cache) > mapped_frame_cache_size:
+                self.frame_cache.popitem(last=False)
+        return frame
+
+    def section_record(self, key, position):
+        """
+        读取章节记录
+        :param key: 章节树的键
+        :param position: 章节在先序遍历中的位置
+        :return: (章节记录, 数据帧的字符串表)，章节记录格式见paper_pack.encode_section
+        """
+        chapter = bisect.bisect_right(self.range_starts[key], position) - 1
+        frame = self.read_frame(chapter + 1)
+        return frame["trees"][key][position - self.ranges[key][chapter][0]], frame["strings"]
+
+    def title(self, key, position):
+        if key in self.outlines:
+            return self.outlines[key]["titles"][position]
+        record, strings = self.section_record(key, position)
+        return strings[record[1]]
+
+    def text_size(self, key, position):
+        if key in self.outlines:
+            return self.outlines[key]["text_sizes"][position]
+        record, strings = self.section_record(key, position)
+        return len(strings[record[2]])
+
+    def tree_view(self, key):
+        """
+        章节树的延迟视图
+        """
+        return MappedTree(self, key)
+
+
+class SectionView(Mapping):
+    """
+    章节的只读延迟视图，可像章节字典一样以section["title"]、section.get("texts")、section["sections"]访问。
+    标题及子章节结构来自文件头部，正文在首次访问时才解压所在的一级章节
+    """
+    __slots__ = ("paper", "key", "position")
+
+    def __init__(self, paper, key, position):
+        """
+        :param paper: MappedPaper
+        :param key: 章节树的键
+        :param position: 章节在先序遍历中的位置
+        """
+        self.paper = paper
+        self.key = key
+        self.position = position
+
+    def children(self):
+        shape = self.paper.shapes[self.key]
+        children = []
+        position = self.position + 1
+        for _ in range(shape["children"][self.position]):
+            children.append(SectionView(self.paper, self.key, position))
+            # 跳过该子章节的整棵子树
+            pending = 1
+            while pending:
+                pending += shape["children"][position] - 1
+                position += 1
+        return children
+
+    def __getitem__(self, field):
+        if field == "title":
+            return self.paper.title(self.key, self.position)
+        if field == "texts":
+            record, strings = self.paper.section_record(self.key, self.position)
+            return strings[record[2]]
+        if field == "sections":
+            return self.children()
+        if field == "id":
+            return self.paper.shapes[self.key]["ids"][self.position]
+        if field == "flag":
+            return self.paper.section_record(self.key, self.position)[0][0]
+        raise KeyError(field)
+
+    def __iter__(self):
+        return iter(["flag", "id", "title", "texts", "sections"])
+
+    def __len__(self):
+        return 5
+
+    def text_size(self):
+        return self.paper.text_size(self.key, self.position)
+
+
+class MappedTree(list):
+    """
+    章节树的延迟视图：元素为一级章节的SectionView，可与章节字典列表一样拼接、切片及遍历
+    """
+
+    def __init__(self, paper, key):
+        super().__init__(SectionView(paper, key, start) for start, _ in paper.ranges[key])
+        self.paper = paper
+        self.key = key
+
+    def text_chars(self):
+        """
+        全部章节的正文字符数，由文件头部计算，不解压正文
+        """
+        if self.key in self.paper.outlines:
+            return sum(self.paper.outlines[self.key]["text_sizes"])
+        return sum(self.paper.text_size(self.key, position) for position in range(len(self.paper.shapes[self.key]["ids"])))
+
+    def to_list(self):
+        """
+        解压为章节字典列表
+        """
+        return self.paper.tree(self.key)
+
+
+def materialize_section_trees(state):
+    """
+    将状态字典中的延迟视图解压为章节字典列表。编辑、处理及保存论文前调用，延迟视图是只读的
+    :param state: 状态字典，如st.session_state
+    """
+    for key in [key for key, value in state.items() if isinstance(value, MappedTree)]:
+        state[key] = state[key].to_list()
+
+
+def text_chars(sections):
+    """
+    章节树的正文字符数，延迟视图不解压正文
+    """
+    if isinstance(sections, MappedTree):
+        return sections.text_chars()
+    total = 0
+    stack = list(sections)
+    while stack:
+        section = stack.pop()
+        total += len(section.get("texts", ""))
+        stack.extend(section.get("sections", []))
+    return total
+
+
+# 进程内共享的内存映射论文，以(路径, 修改时间, 文件大小)为键，按LRU保留最近使用的mapped_paper_cache_size篇
+mapped_papers = OrderedDict()
+mapped_papers_lock = threading.Lock()
+
+
+def open_mapped_paper(path):
+    """
+    打开进程内共享的内存映射论文，文件更新后重新打开
+    :param path: 紧凑二进制文件路径
+    :return: MappedPaper
+    """
+    stat = os.stat(path)
+    cache_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with mapped_papers_lock:
+        paper = mapped_papers.get(cache_key)
+        if paper is not None:
+            mapped_papers.move_to_end(cache_key)
+            return paper
+    paper = MappedPaper(path)
+    with mapped_papers_lock:
+        mapped_papers[cache_key] = paper
+        # 淘汰的实例不主动关闭映射，仍在使用的会话可继续读取，不再引用后由垃圾回收释放
+        while len(mapped_papers) > mapped_paper_cache_size:
+            mapped_papers.popitem(last=False)
+    return paper
+
+
+class PackStore:
+    """
+    文库论文的紧凑二进制文件目录，每篇论文一个文件(<论文ID>.sapk)，供阅读时内存映射。
+    接口与全文索引一致（index_paper、remove_paper、indexed_paper_ids），由文库在保存及删除论文时同步更新
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, paper_id):
+        return os.path.join(self.directory, f"{paper_id}.sapk")
+
+    def index_paper(self, paper_id, data):
+        path = self.path(paper_id)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(pack_paper(data))
+        os.replace(temp_path, path)
+
+    def remove_paper(self, paper_id):
+        if os.path.exists(self.path(paper_id)):
+            os.remove(self.path(paper_id))
+
+    def indexed_paper_ids(self):
+        return {file_name[:-len(".sapk")] for file_name in os.listdir(self.directory) if file_name.endswith(".sapk")}
+
+    def open(self, paper_id):
+        """
+        :return: MappedPaper，文件不存在时返回None
+        """
+        path = self.path(paper_id)
+        return open_mapped_paper(path) if os.path.exists(path) else None
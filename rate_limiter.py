@@ -0,0 +1,261 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import openai
+from config.config import rate_limit_rpm, rate_limit_tpm, rate_limit_max_retries, rate_limit_backoff_base, \
+    rate_limit_backoff_max, rate_limit_min_concurrency, max_workers
+
+
+class TokenBucket:
+    """
+    令牌桶，容量为每分钟的限额，按限额/60的速度匀速补充。
+    校正实际用量时余额可以为负，此后的请求需等待余额补足。
+    """
+
+    def __init__(self, per_minute):
+        """
+        :param per_minute: 每分钟限额，同时作为桶的容量
+        """
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount, now):
+        """
+        余额足够支付amount所需等待的秒数，超过容量的请求在桶满时放行
+        """
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        return 0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        """
+        扣除余额，amount为负时退还（不超过容量）
+        """
+        self.tokens = min(self.capacity, self.tokens - min(amount, self.capacity))
+
+
+class AdaptiveRateLimiter:
+    """
+    所有API调用共享的限流器：
+
+    - RPM/TPM：分别以令牌桶限制每分钟请求数及token数，超出限额的请求排队等待。
+    - 重试：遇到429、5xx及连接错误时按指数退避（含随机抖动）重试，响应包含Retry-After时按其等待；
+      429时所有请求暂停至等待结束。
+    - 自适应并发：并发数按加性增、乘性减(AIMD)调整，429时减半，连续成功时逐步恢复至上限。
+    """
+
+    def __init__(self, rpm, tpm, max_concurrency, min_concurrency=1, max_retries=6, backoff_base=1.0, backoff_max=60.0):
+        """
+        :param rpm: 每分钟最大请求数，None为不限制
+        :param tpm: 每分钟最大token数，None为不限制
+        :param max_concurrency: 并发请求数上限
+        :param min_concurrency: 自适应调整的并发请求数下限
+        :param max_retries: 可重试错误的最大重试次数
+        :param backoff_base: 退避初始等待时间（秒）
+        :param backoff_max: 退避最大等待时间（秒）
+        """
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.concurrency_limit = self.max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.active = 0
+        self.successes = 0
+        self.blocked_until = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.requests = 0
+        self.used_tokens = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, tokens):
+        """
+        等待直至并发数、RPM及TPM额度均允许发出请求，并扣除额度
+        :param tokens: 预估的请求token数
+        """
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                wait = self.blocked_until - now
+                if wait <= 0 and self.active < self.concurrency_limit:
+                    wait = max(
+                        self.request_bucket.wait_time(1, now) if self.request_bucket else 0,
+                        self.token_bucket.wait_time(tokens, now) if self.token_bucket else 0,
+                    )
+                    if wait <= 0:
+                        if self.request_bucket:
+                            self.request_bucket.consume(1)
+                        if self.token_bucket:
+                            self.token_bucket.consume(tokens)
+                        self.active += 1
+                        return
+                # 并发数已满时等待release通知，否则等待额度恢复
+                self.condition.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, rate_limited=False):
+        """
+        请求结束，按结果调整并发数上限
+        :param rate_limited: 是否因429失败
+        """
+        with self.condition:
+            self.active -= 1
+            if rate_limited:
+                self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit // 2)
+                self.successes = 0
+            else:
+                self.successes += 1
+                if self.successes >= self.concurrency_limit and self.concurrency_limit < self.max_concurrency:
+                    self.concurrency_limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """
+        按实际token用量校正TPM余额，并累计请求数及token用量
+        """
+        with self.condition:
+            self.requests += 1
+            self.used_tokens += actual_tokens
+            if self.token_bucket is not None:
+                self.token_bucket.consume(actual_tokens - estimated_tokens)
+                self.condition.notify_all()
+
+    def pause(self, delay):
+        """
+        暂停所有请求delay秒
+        """
+        with self.condition:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+    def retry_delay(self, error, attempt):
+        """
+        计算重试前的等待时间，错误不可重试时返回None
+        :param error: API调用抛出的异常
+        :param attempt: 已重试次数，从0开始
+        """
+        if isinstance(error, openai.APIStatusError):
+            if error.status_code != 429 and error.status_code < 500:
+                return None
+        elif not isinstance(error, openai.APIConnectionError):
+            return None
+        retry_after = parse_retry_after(getattr(error, "response", None))
+        if retry_after is not None:
+            # 附加少量抖动，避免各线程在同一时刻重试
+            return retry_after + random.uniform(0, min(1.0, retry_after / 2))
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def call(self, func, tokens):
+        """
+        在限流下执行API调用，可重试的错误按退避时间重试
+        :param func: 无参数的API调用函数
+        :param tokens: 预估的请求token数
+        :return: func的返回值
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire(tokens)
+            try:
+                result = func()
+            except Exception as e:
+                rate_limited = isinstance(e, openai.APIStatusError) and e.status_code == 429
+                self.release(rate_limited=rate_limited)
+                delay = self.retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries:
+                    raise
+                with self.condition:
+                    self.retries += 1
+                    self.rate_limited += rate_limited
+                print(f"API调用失败({type(e).__name__})，{delay:.1f}秒后重试，当前并发数上限：{self.concurrency_limit}")
+                if rate_limited:
+                    self.pause(delay)
+                time.sleep(delay)
+                continue
+            self.release()
+            return result
+
+    def stats(self):
+        """
+        返回限流统计信息
+        """
+        with self.condition:
+            return {
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "concurrency_limit": self.concurrency_limit,
+                "requests": self.requests,
+                "used_tokens": self.used_tokens,
+            }
+
+
+def parse_retry_after(response):
+    """
+    解析响应头中的等待时间（秒），支持retry-after-ms及retry-after（秒数或HTTP日期）
+    :param response: httpx.Response，可为None
+    :return: 等待秒数，响应头不存在或无法解析时返回None
+    """
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# 进程内共享的限流器，首次使用时创建
+rate_limiter = None
+rate_limiter_lock = threading.Lock()
+
+
+def init_rate_limiter(share=1):
+    """
+    按配置创建进程内共享的限流器
+    :param share: 本进程可使用的RPM/TPM限额比例，多进程处理时按进程数均分（如1/4），使各进程的总用量不超过限额
+    """
+    with rate_limiter_lock:
+        return init_rate_limiter_locked(share)
+
+
+def init_rate_limiter_locked(share=1):
+    """
+    同init_rate_limiter，调用方需已持有rate_limiter_lock
+    """
+    global rate_limiter
+    rate_limiter = AdaptiveRateLimiter(
+        rpm=max(1, int(rate_limit_rpm * share)) if rate_limit_rpm else None,
+        tpm=max(1, int(rate_limit_tpm * share)) if rate_limit_tpm else None,
+        max_concurrency=max_workers,
+        min_concurrency=rate_limit_min_concurrency,
+        max_retries=rate_limit_max_retries,
+        backoff_base=rate_limit_backoff_base,
+        backoff_max=rate_limit_backoff_max,
+    )
+    return rate_limiter
+
+
+def get_rate_limiter():
+    """
+    获取进程内共享的限流器，首次使用时按配置创建。检查与创建在同一次加锁中完成，并发的首次调用只创建一个限流器
+    """
+    with rate_limiter_lock:
+        if rate_limiter is not None:
+            return rate_limiter
+        return init_rate_limiter_locked()
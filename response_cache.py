@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config.config import response_cache_enabled, response_cache_path, response_cache_max_bytes, response_cache_ttl, response_cache_busy_timeout
+
+
+class ResponseCache:
+    """
+    基于SQLite的LLM响应缓存，以(模型, 系统提示词, 请求文本, temperature)的哈希值为键。
+
+    - 容量：所有响应的总字节数超过max_bytes时，按最近访问时间淘汰最久未使用的条目（LRU）。
+    - 有效期：写入时间超过ttl秒的条目视为失效，ttl为None时永不过期。
+    - 统计：记录命中、未命中及写入次数，可通过stats()查看。
+    - 并发：数据库使用WAL模式，读取不会被其他进程的写入阻塞；写入冲突时最多等待busy_timeout秒，多个进程可共用同一数据库文件。
+    """
+
+    def __init__(self, path, max_bytes, ttl, busy_timeout=response_cache_busy_timeout):
+        """
+        :param path: SQLite数据库文件路径，目录不存在时自动创建。
+        :param max_bytes: 缓存响应的最大总字节数。
+        :param ttl: 缓存有效期（秒），None表示永不过期。
+        :param busy_timeout: 数据库被其他连接锁定时的最长等待时间（秒）。
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        # WAL模式需在事务外设置，设置结果保存在数据库文件中
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    @staticmethod
+    def make_key(model, system_prompt, request_prompt, temperature):
+        """
+        计算请求内容的哈希键
+        """
+        payload = json.dumps([model, system_prompt, request_prompt, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf8')).hexdigest()
+
+    def get(self, key):
+        """
+        读取缓存的响应，未命中或已过期时返回None
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                with self.connection:
+                    self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            with self.connection:
+                self.connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def contains(self, key):
+        """
+        判断缓存中是否存在未过期的条目，不计入命中统计，也不更新访问时间
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None and (self.ttl is None or time.time() - row[0] <= self.ttl)
+
+    def set(self, key, response):
+        """
+        写入响应，并在超出容量时淘汰最久未使用的条目
+        """
+        now = time.time()
+        size = len(response.encode('utf8'))
+        with self.lock:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, response, size, now, now)
+                )
+            self.writes += 1
+            self.evict()
+
+    def set_many(self, items):
+        """
+        在同一事务中写入多条响应，用于批量导入（如Batch API的结果）
+        :param items: (key, response)列表
+        """
+        now = time.time()
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    [(key, response, len(response.encode('utf8')), now, now) for key, response in items]
+                )
+            self.writes += len(items)
+            self.evict()
+
+    def delete(self, key):
+        """
+        删除指定条目，用于丢弃无法解析的响应
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def evict(self):
+        """
+        删除过期条目，并按LRU顺序淘汰条目直至总字节数不超过max_bytes。调用方需持有self.lock
+        """
+        with self.connection:
+            if self.ttl is not None:
+                self.connection.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+            total_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_size <= self.max_bytes:
+                return
+            rows = self.connection.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+            evicted_keys = []
+            for key, size in rows:
+                if total_size <= self.max_bytes:
+                    break
+                evicted_keys.append((key,))
+                total_size -= size
+            self.connection.executemany("DELETE FROM responses WHERE key = ?", evicted_keys)
+
+    def stats(self):
+        """
+        返回缓存统计信息
+        """
+        with self.lock:
+            entries, total_size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "size_bytes": total_size,
+            }
+
+
+# 进程内共享的缓存实例，首次使用时创建
+response_cache = None
+response_cache_lock = threading.Lock()
+
+
+def init_response_cache():
+    """
+    为当前进程创建独立的缓存实例（数据库连接）。多进程处理时在子进程初始化时调用，
+    避免子进程沿用父进程创建的SQLite连接；config.response_cache_enabled为False时不创建
+    """
+    global response_cache
+    with response_cache_lock:
+        response_cache = None
+        if response_cache_enabled:
+            response_cache = ResponseCache(path=response_cache_path, max_bytes=response_cache_max_bytes, ttl=response_cache_ttl)
+        return response_cache
+
+
+def get_response_cache():
+    """
+    获取进程内共享的响应缓存，config.response_cache_enabled为False时返回None
+    """
+    global response_cache
+    if not response_cache_enabled:
+        return None
+    with response_cache_lock:
+        if response_cache is None:
+            response_cache = ResponseCache(path=response_cache_path, max_bytes=response_cache_max_bytes, ttl=response_cache_ttl)
+    return response_cache
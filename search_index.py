@@ -0,0 +1,228 @@
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+# 英文单词/数字，及连续的中日韩文字
+token_pattern = re.compile(r'[a-z0-9]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+english_stopwords = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or", "that", "the", "this",
+    "to", "was", "we", "were", "which", "with",
+}
+# 搜索结果中各来源的显示名称
+search_source_names = {
+    "en": "英文正文",
+    "zh": "中文正文",
+    "summary": "论文概述",
+    "section_summary": "章节概述",
+    "semantic": "语义相似",
+}
+
+
+def tokenize(text):
+    """
+    中英文分词：英文按单词切分（小写，去除常见停用词），中文按相邻两字切分（bigram），单字的中文片段保留单字
+    :param text: 文本
+    :return: 词项列表
+    """
+    tokens = []
+    for match in token_pattern.findall(text.lower()):
+        if match[0] < '\u3400':
+            if match not in english_stopwords:
+                tokens.append(match)
+        elif len(match) == 1:
+            tokens.append(match)
+        else:
+            tokens.extend(match[i:i + 2] for i in range(len(match) - 1))
+    return tokens
+
+
+def numbered_sections(sections, first_number=2):
+    """
+    按阅读页面的编号规则（引言为第1节，正文从第2节开始）展开章节树
+    :param sections: 章节树
+    :param first_number: 第一个一级章节的编号
+    :return: 列表，每个元素为(章节编号, 章节字典)，编号形如"3.2"
+    """
+    result = []
+
+    def walk(items, prefix, first):
+        counter = first
+        for item in items:
+            number = f"{prefix}{counter}"
+            counter += 1
+            result.append((number, item))
+            walk(item.get('sections', []), f"{number}.", 1)
+
+    walk(sections, "", first_number)
+    return result
+
+
+def paper_documents(data):
+    """
+    将论文拆分为章节级的索引文档
+    :param data: 论文数据字典，键与st.session_state一致
+    :return: 列表，每个元素为(章节编号, 来源, 章节标题, 文本)。章节编号""表示整篇论文，"0"为摘要，"1"为引言
+    """
+    documents = []
+    title = data.get("title-area", "")
+    if data.get("summary") or title:
+        documents.append(("", "summary", title, f'{title}\n{data.get("zh_title-area", "")}\n{data.get("summary", "")}'))
+    for source, prefix in [("en", ""), ("zh", "zh_")]:
+        abstract = data.get(f"{prefix}abstract_processed") or ("" if prefix else data.get("abstract-area", ""))
+        introduction = data.get(f"{prefix}introduction_processed") or ("" if prefix else data.get("introduction-area", ""))
+        if abstract:
+            documents.append(("0", source, "Abstract" if source == "en" else "摘要", abstract))
+        if introduction:
+            documents.append(("1", source, "Introduction" if source == "en" else "引言", introduction))
+        sections = data.get(f"{prefix}sections_processed") or ([] if prefix else data.get("sections", []))
+        for number, section in numbered_sections(sections):
+            documents.append((number, source, section.get("title", ""), f'{section.get("title", "")}\n{section.get("texts", "")}'))
+    section_summaries = data.get("section_summaries") or {}
+    if isinstance(section_summaries, dict):
+        for number, summary in section_summaries.items():
+            documents.append((str(number), "section_summary", "", str(summary)))
+    return documents
+
+
+class SearchIndex:
+    """
+    基于SQLite的章节级全文倒排索引，使用BM25排序。
+    每篇论文按章节拆分为若干文档（英文正文、中文正文、论文概述、章节概述），保存论文时仅更新内容发生变化的文档。
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        """
+        :param path: SQLite数据库文件路径，目录不存在时自动创建。
+        :param k1: BM25词频饱和参数
+        :param b: BM25文档长度归一化参数
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS search_docs ("
+                "doc_id INTEGER PRIMARY KEY, paper_id TEXT NOT NULL, section_number TEXT NOT NULL, source TEXT NOT NULL, "
+                "title TEXT NOT NULL, fingerprint TEXT NOT NULL, length INTEGER NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS search_docs_paper_id ON search_docs (paper_id)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS search_postings (term TEXT NOT NULL, doc_id INTEGER NOT NULL, tf INTEGER NOT NULL, "
+                "PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS search_postings_doc_id ON search_postings (doc_id)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS search_papers (paper_id TEXT PRIMARY KEY, title TEXT NOT NULL)")
+
+    def index_paper(self, paper_id, data):
+        """
+        增量更新论文的索引：未变化的文档保持不变，新增或修改的文档重新建立倒排表，已不存在的文档被删除
+        :param paper_id: 论文ID
+        :param data: 论文数据字典
+        :return: 重新索引的文档数
+        """
+        documents = {}
+        for number, source, title, text in paper_documents(data):
+            fingerprint = hashlib.sha256(f"{title}\n{text}".encode('utf8')).hexdigest()
+            documents[(number, source)] = (title, text, fingerprint)
+        with self.lock:
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO search_papers (paper_id, title) VALUES (?, ?)", (paper_id, data.get("title-area", "")))
+                existing = {
+                    (number, source): (doc_id, fingerprint)
+                    for doc_id, number, source, fingerprint in self.connection.execute(
+                        "SELECT doc_id, section_number, source, fingerprint FROM search_docs WHERE paper_id = ?", (paper_id,))
+                }
+                stale_doc_ids = [(doc_id,) for key, (doc_id, fingerprint) in existing.items()
+                                 if key not in documents or documents[key][2] != fingerprint]
+                self.connection.executemany("DELETE FROM search_postings WHERE doc_id = ?", stale_doc_ids)
+                self.connection.executemany("DELETE FROM search_docs WHERE doc_id = ?", stale_doc_ids)
+                indexed = 0
+                for (number, source), (title, text, fingerprint) in documents.items():
+                    if (number, source) in existing and existing[(number, source)][1] == fingerprint:
+                        continue
+                    term_counts = Counter(tokenize(text))
+                    cursor = self.connection.execute(
+                        "INSERT INTO search_docs (paper_id, section_number, source, title, fingerprint, length) VALUES (?, ?, ?, ?, ?, ?)",
+                        (paper_id, number, source, title, fingerprint, sum(term_counts.values()))
+                    )
+                    self.connection.executemany(
+                        "INSERT INTO search_postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                        [(term, cursor.lastrowid, tf) for term, tf in term_counts.items()]
+                    )
+                    indexed += 1
+        return indexed
+
+    def remove_paper(self, paper_id):
+        """
+        删除论文的全部索引
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM search_postings WHERE doc_id IN (SELECT doc_id FROM search_docs WHERE paper_id = ?)", (paper_id,))
+                self.connection.execute("DELETE FROM search_docs WHERE paper_id = ?", (paper_id,))
+                self.connection.execute("DELETE FROM search_papers WHERE paper_id = ?", (paper_id,))
+
+    def indexed_paper_ids(self):
+        with self.lock:
+            return {row[0] for row in self.connection.execute("SELECT paper_id FROM search_papers")}
+
+    def search(self, query, limit=20):
+        """
+        BM25全文搜索，结果按章节聚合（同一章节的各来源取最高分）
+        :param query: 搜索内容
+        :param limit: 最多返回的章节数
+        :return: 列表，每个元素为{"paper_id", "paper_title", "section_number", "title", "sources", "score"}，按得分从高到低排列
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self.lock:
+            doc_count, average_length = self.connection.execute("SELECT COUNT(*), AVG(length) FROM search_docs").fetchone()
+            if not doc_count:
+                return []
+            postings = {
+                term: self.connection.execute("SELECT doc_id, tf FROM search_postings WHERE term = ?", (term,)).fetchall()
+                for term in terms
+            }
+            doc_ids = sorted({doc_id for rows in postings.values() for doc_id, _ in rows})
+            docs = {}
+            for start in range(0, len(doc_ids), 500):
+                batch = doc_ids[start:start + 500]
+                docs.update({
+                    row[0]: row[1:] for row in self.connection.execute(
+                        f"SELECT doc_id, paper_id, section_number, source, title, length FROM search_docs "
+                        f"WHERE doc_id IN ({','.join('?' * len(batch))})", batch)
+                })
+            paper_titles = dict(self.connection.execute("SELECT paper_id, title FROM search_papers"))
+
+        scores = Counter()
+        for rows in postings.values():
+            idf = math.log(1 + (doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+            for doc_id, tf in rows:
+                length = docs[doc_id][4]
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average_length))
+
+        hits = {}
+        for doc_id, score in scores.items():
+            paper_id, number, source, title, _ = docs[doc_id]
+            hit = hits.setdefault((paper_id, number), {
+                "paper_id": paper_id,
+                "paper_title": paper_titles.get(paper_id, ""),
+                "section_number": number,
+                "title": "",
+                "sources": [],
+                "score": 0.0,
+            })
+            hit["sources"].append(source)
+            hit["score"] = max(hit["score"], score)
+            if title and (not hit["title"] or source == "en"):
+                hit["title"] = title
+        return sorted(hits.values(), key=lambda hit: hit["score"], reverse=True)[:limit]
@@ -0,0 +1,329 @@
+import hashlib
+import importlib
+import os
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+import numpy as np
+from search_index import tokenize, paper_documents
+
+# 向量矩阵每次扩容的最小行数
+vector_growth_rows = 1024
+# 相似度计算时每批读取的向量行数，限制查询时的内存占用
+vector_query_chunk_rows = 16384
+# 向量矩阵中各行的类型：空闲行、章节向量、论文向量
+free_row = 0
+section_row = 1
+paper_row = 2
+
+
+def normalize_rows(vectors):
+    """
+    按行L2归一化，全零行保持不变
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+
+class HashingEncoder:
+    """
+    无需联网及模型文件的特征哈希编码器：文本按search_index.tokenize分词，词项按CRC32哈希到固定维度并附带正负号
+    （减小哈希冲突的影响），词频取对数后累加，向量按L2归一化，向量内积即为余弦相似度。
+    """
+
+    def __init__(self, dim=512):
+        """
+        :param dim: 向量维度
+        """
+        self.dim = dim
+        self.name = "hashing"
+
+    def encode(self, texts):
+        """
+        :param texts: 文本列表
+        :return: 形状为(len(texts), dim)的float32矩阵
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            term_counts = Counter(tokenize(text))
+            if not term_counts:
+                continue
+            hashes = np.fromiter((zlib.crc32(term.encode('utf8')) for term in term_counts), dtype=np.uint64, count=len(term_counts))
+            weights = 1 + np.log(np.fromiter(term_counts.values(), dtype=np.float32, count=len(term_counts)))
+            signs = np.where(hashes >> 31 & 1, -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[i], (hashes % self.dim).astype(np.int64), weights * signs)
+        return normalize_rows(vectors)
+
+
+def load_encoder(spec, dim):
+    """
+    加载语义向量编码器
+    :param spec: "hashing"为特征哈希编码器；其他取值形如"模块名:工厂函数名"，工厂函数无参数，返回具有name、dim属性及
+                 encode(texts)方法（返回形状为(len(texts), dim)的矩阵）的编码器，可用于接入本地的句向量模型
+    :param dim: 特征哈希编码器的向量维度
+    :return: 编码器，加载失败时返回特征哈希编码器
+    """
+    if spec != "hashing":
+        module_name, _, factory_name = spec.partition(":")
+        try:
+            return getattr(importlib.import_module(module_name), factory_name)()
+        except Exception as e:
+            print(f"加载语义编码器{spec}失败，使用特征哈希编码器: {e}")
+    return HashingEncoder(dim=dim)
+
+
+class SemanticIndex:
+    """
+    章节级的本地语义向量索引，用于查找相关论文及相关章节。
+
+    - 每篇论文的每个章节（合并英文正文、中文正文及章节概述）编码为一个向量，论文向量为各章节向量之和（归一化）。
+    - 向量保存在内存映射的float32矩阵文件(vectors.f32)中，查询时按批读取并以矩阵乘法计算余弦相似度，
+      不需要将论文正文或全部向量读入内存；行号与论文、章节的对应关系保存在SQLite数据库中。
+    - 保存论文时仅重新编码内容发生变化的章节，删除论文时其所在行被清零并留作复用。
+    - 编码器或向量维度变化时清空索引，可通过文库的重建索引重新编码。
+    """
+
+    def __init__(self, directory, encoder):
+        """
+        :param directory: 索引目录，不存在时自动创建
+        :param encoder: 语义向量编码器，参见load_encoder
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.encoder = encoder
+        self.dim = encoder.dim
+        self.lock = threading.Lock()
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.connection = sqlite3.connect(os.path.join(directory, "semantic.sqlite3"), check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS semantic_rows ("
+                "row INTEGER PRIMARY KEY, paper_id TEXT NOT NULL, level INTEGER NOT NULL, section_number TEXT NOT NULL, "
+                "title TEXT NOT NULL, fingerprint TEXT NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS semantic_rows_paper_id ON semantic_rows (paper_id)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS semantic_papers (paper_id TEXT PRIMARY KEY, title TEXT NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS semantic_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            encoder_id = f"{encoder.name}:{self.dim}"
+            row = self.connection.execute("SELECT value FROM semantic_meta WHERE key = 'encoder'").fetchone()
+            if row is None or row[0] != encoder_id:
+                self.connection.execute("DELETE FROM semantic_rows")
+                self.connection.execute("DELETE FROM semantic_papers")
+                self.connection.execute("INSERT OR REPLACE INTO semantic_meta (key, value) VALUES ('encoder', ?)", (encoder_id,))
+                if os.path.exists(self.vectors_path):
+                    os.remove(self.vectors_path)
+
+        self.vectors = None
+        self.capacity = 0
+        if os.path.exists(self.vectors_path):
+            self.open_vectors(os.path.getsize(self.vectors_path) // (self.dim * 4))
+        # 各行的类型，常驻内存，查询时用于筛选章节行或论文行
+        self.levels = np.zeros(self.capacity, dtype=np.int8)
+        for row, level in self.connection.execute("SELECT row, level FROM semantic_rows"):
+            if row < self.capacity:
+                self.levels[row] = level
+
+    def open_vectors(self, capacity):
+        """
+        扩展向量矩阵文件至capacity行（新增部分为零）并重新映射
+        """
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        if not os.path.exists(self.vectors_path):
+            open(self.vectors_path, "wb").close()
+        with open(self.vectors_path, "r+b") as file:
+            file.truncate(capacity * self.dim * 4)
+        self.capacity = capacity
+        if capacity:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def allocate_rows(self, count):
+        """
+        分配count个空闲行，空闲行不足时扩容
+        """
+        free_rows = np.flatnonzero(self.levels == free_row)
+        if len(free_rows) < count:
+            old_capacity = self.capacity
+            self.open_vectors(old_capacity + max(vector_growth_rows, old_capacity // 2, count - len(free_rows)))
+            self.levels = np.concatenate([self.levels, np.zeros(self.capacity - old_capacity, dtype=np.int8)])
+            free_rows = np.flatnonzero(self.levels == free_row)
+        return [int(row) for row in free_rows[:count]]
+
+    def release_rows(self, rows):
+        if rows:
+            self.vectors[rows] = 0
+            self.levels[rows] = free_row
+            self.connection.executemany("DELETE FROM semantic_rows WHERE row = ?", [(row,) for row in rows])
+
+    def write_rows(self, paper_id, level, entries, vectors):
+        """
+        写入向量及行信息
+        :param entries: (章节编号, 章节标题, 指纹)列表，与vectors逐行对应
+        """
+        rows = self.allocate_rows(len(entries))
+        self.vectors[rows] = vectors
+        self.levels[rows] = level
+        self.connection.executemany(
+            "INSERT INTO semantic_rows (row, paper_id, level, section_number, title, fingerprint) VALUES (?, ?, ?, ?, ?, ?)",
+            [(row, paper_id, level, number, title, fingerprint) for row, (number, title, fingerprint) in zip(rows, entries)]
+        )
+
+    def index_paper(self, paper_id, data):
+        """
+        增量更新论文的向量：未变化的章节保持不变，新增或修改的章节重新编码，已不存在的章节被删除
+        :param paper_id: 论文ID
+        :param data: 论文数据字典
+        :return: 重新编码的章节数
+        """
+        # 同一章节的各来源合并为一个文档，标题优先使用英文标题
+        sections = {}
+        for number, source, title, text in paper_documents(data):
+            section = sections.setdefault(number, {"title": "", "texts": []})
+            if title and (not section["title"] or source == "en"):
+                section["title"] = title
+            section["texts"].append(text)
+        documents = {}
+        for number, section in sections.items():
+            text = "\n".join(section["texts"])
+            documents[number] = (section["title"], text, hashlib.sha256(f'{section["title"]}\n{text}'.encode('utf8')).hexdigest())
+        paper_fingerprint = hashlib.sha256("\n".join(sorted(document[2] for document in documents.values())).encode('utf8')).hexdigest()
+
+        with self.lock:
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO semantic_papers (paper_id, title) VALUES (?, ?)", (paper_id, data.get("title-area", "")))
+                existing = {
+                    (level, number): (row, fingerprint)
+                    for row, level, number, fingerprint in self.connection.execute(
+                        "SELECT row, level, section_number, fingerprint FROM semantic_rows WHERE paper_id = ?", (paper_id,))
+                }
+                if existing.get((paper_row, "")) and existing[(paper_row, "")][1] == paper_fingerprint:
+                    return 0
+                stale_rows = [row for (level, number), (row, fingerprint) in existing.items()
+                              if level == paper_row or number not in documents or documents[number][2] != fingerprint]
+                self.release_rows(stale_rows)
+                changed = [number for number, document in documents.items()
+                           if existing.get((section_row, number), (None, None))[1] != document[2]]
+                if changed:
+                    vectors = normalize_rows(np.asarray(self.encoder.encode([documents[number][1] for number in changed]), dtype=np.float32))
+                    self.write_rows(paper_id, section_row, [(number, documents[number][0], documents[number][2]) for number in changed], vectors)
+                section_rows = [row for row, in self.connection.execute(
+                    "SELECT row FROM semantic_rows WHERE paper_id = ? AND level = ?", (paper_id, section_row))]
+                if section_rows:
+                    paper_vector = normalize_rows(self.vectors[section_rows].sum(axis=0, keepdims=True))
+                    self.write_rows(paper_id, paper_row, [("", data.get("title-area", ""), paper_fingerprint)], paper_vector)
+                if self.vectors is not None:
+                    self.vectors.flush()
+        return len(changed)
+
+    def remove_paper(self, paper_id):
+        """
+        删除论文的全部向量
+        """
+        with self.lock:
+            with self.connection:
+                rows = [row for row, in self.connection.execute("SELECT row FROM semantic_rows WHERE paper_id = ?", (paper_id,))]
+                self.release_rows(rows)
+                self.connection.execute("DELETE FROM semantic_papers WHERE paper_id = ?", (paper_id,))
+            if self.vectors is not None:
+                self.vectors.flush()
+
+    def indexed_paper_ids(self):
+        with self.lock:
+            return {row[0] for row in self.connection.execute("SELECT paper_id FROM semantic_papers")}
+
+    def stored_vector(self, paper_id, level, section_number=""):
+        """
+        读取已保存的向量，不存在时返回None
+        """
+        row = self.connection.execute(
+            "SELECT row FROM semantic_rows WHERE paper_id = ? AND level = ? AND section_number = ?", (paper_id, level, section_number)
+        ).fetchone()
+        return None if row is None else np.array(self.vectors[row[0]])
+
+    def top_rows(self, query_vector, level, limit, exclude_paper_id=None):
+        """
+        按余弦相似度查找最相似的limit行：分批计算矩阵与查询向量的内积，以argpartition选出前limit个
+        :return: 列表，每个元素为(行号, 得分)，按得分从高到低排列
+        """
+        used = np.flatnonzero(self.levels)
+        if not len(used):
+            return []
+        size = int(used[-1]) + 1
+        scores = np.empty(size, dtype=np.float32)
+        for start in range(0, size, vector_query_chunk_rows):
+            end = min(size, start + vector_query_chunk_rows)
+            scores[start:end] = self.vectors[start:end] @ query_vector
+        scores[self.levels[:size] != level] = -np.inf
+        if exclude_paper_id is not None:
+            excluded = [row for row, in self.connection.execute("SELECT row FROM semantic_rows WHERE paper_id = ?", (exclude_paper_id,))]
+            scores[[row for row in excluded if row < size]] = -np.inf
+        limit = min(limit, int(np.isfinite(scores).sum()))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def describe_rows(self, hits):
+        """
+        将(行号, 得分)列表转换为与SearchIndex.search相同格式的结果
+        """
+        if not hits:
+            return []
+        rows = {
+            row[0]: row[1:] for row in self.connection.execute(
+                f"SELECT row, paper_id, section_number, title FROM semantic_rows WHERE row IN ({','.join('?' * len(hits))})",
+                [row for row, _ in hits])
+        }
+        paper_titles = dict(self.connection.execute(
+            f"SELECT paper_id, title FROM semantic_papers WHERE paper_id IN ({','.join('?' * len(rows))})",
+            sorted({paper_id for paper_id, _, _ in rows.values()})))
+        return [{
+            "paper_id": rows[row][0],
+            "paper_title": paper_titles.get(rows[row][0], ""),
+            "section_number": rows[row][1],
+            "title": rows[row][2],
+            "sources": ["semantic"],
+            "score": score,
+        } for row, score in hits]
+
+    def search(self, query, limit=20):
+        """
+        语义搜索：查找与文本最相似的章节
+        :param query: 搜索内容
+        :param limit: 最多返回的章节数
+        :return: 列表，格式同SearchIndex.search
+        """
+        query_vector = normalize_rows(np.asarray(self.encoder.encode([query]), dtype=np.float32))[0]
+        if not query_vector.any():
+            return []
+        with self.lock:
+            return self.describe_rows(self.top_rows(query_vector, section_row, limit))
+
+    def related_sections(self, paper_id, section_number, limit=10):
+        """
+        查找与指定章节最相似的其他论文的章节
+        :param paper_id: 论文ID
+        :param section_number: 章节编号，""为整篇论文的概述
+        :return: 列表，格式同SearchIndex.search，章节不在索引中时返回空列表
+        """
+        with self.lock:
+            query_vector = self.stored_vector(paper_id, section_row, section_number)
+            if query_vector is None:
+                return []
+            return self.describe_rows(self.top_rows(query_vector, section_row, limit, exclude_paper_id=paper_id))
+
+    def related_papers(self, paper_id, limit=10):
+        """
+        查找与指定论文最相似的其他论文
+        :param paper_id: 论文ID
+        :return: 列表，每个元素为{"paper_id", "paper_title", "score"}，按得分从高到低排列
+        """
+        with self.lock:
+            query_vector = self.stored_vector(paper_id, paper_row)
+            if query_vector is None:
+                return []
+            hits = self.describe_rows(self.top_rows(query_vector, paper_row, limit, exclude_paper_id=paper_id))
+        return [{"paper_id": hit["paper_id"], "paper_title": hit["paper_title"], "score": hit["score"]} for hit in hits]
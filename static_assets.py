@@ -0,0 +1,31 @@
+import json
+import os
+import threading
+
+# 进程内共享的配置及静态文件缓存：(路径, 解析方式) -> (修改时间, 文件大小, 解析结果)。
+# 所有会话共用同一份内容，文件修改后下次读取时重新载入；解析结果为共享对象，使用方不应修改
+asset_cache = {}
+asset_cache_lock = threading.Lock()
+asset_parsers = {
+    "text": lambda content: content,
+    "json": json.loads,
+}
+
+
+def load_asset(path, kind="text"):
+    """
+    读取配置或静态文件，未修改时返回缓存的内容
+    :param path: 文件路径
+    :param kind: 解析方式，"text"为文本，"json"为JSON
+    """
+    stat = os.stat(path)
+    cache_key = (path, kind)
+    with asset_cache_lock:
+        cached = asset_cache.get(cache_key)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    with open(path, "r", encoding='utf8') as file:
+        value = asset_parsers[kind](file.read())
+    with asset_cache_lock:
+        asset_cache[cache_key] = (stat.st_mtime_ns, stat.st_size, value)
+    return value
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 测试以仓库根目录为工作目录运行，与streamlit run page.py一致（配置文件及图标以相对路径读取）
+repository_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repository_root)
+os.chdir(repository_root)
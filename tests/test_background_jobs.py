@@ -0,0 +1,42 @@
+import background_jobs
+from background_jobs import AnalysisJob, list_jobs, session_owner_id
+
+
+def test_list_jobs_only_shows_own_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(background_jobs, "jobs_dir", str(tmp_path))
+    monkeypatch.setattr(background_jobs, "jobs", {})
+    first_session = {}
+    second_session = {}
+    first_owner = session_owner_id(first_session)
+    second_owner = session_owner_id(second_session)
+    assert first_owner != second_owner
+    assert session_owner_id(first_session) == first_owner
+
+    steps = {"paper_polishing": {"done": 0, "total": 0, "finished": False}}
+    saved_job = AnalysisJob("saved", state={"title-area": "A"}, steps=steps, directory=str(tmp_path), owner=first_owner)
+    saved_job.save(save_state=True)
+    background_jobs.jobs["running"] = AnalysisJob("running", state={"title-area": "B"}, steps=steps, directory=str(tmp_path), owner=second_owner)
+
+    assert [record["job_id"] for record in list_jobs(owner=first_owner)] == ["saved"]
+    assert [record["job_id"] for record in list_jobs(owner=second_owner)] == ["running"]
+    assert AnalysisJob.load("saved", directory=str(tmp_path)).owner == first_owner
+
+
+def test_new_session_with_persisted_owner_sees_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(background_jobs, "jobs_dir", str(tmp_path))
+    monkeypatch.setattr(background_jobs, "jobs", {})
+    first_session = {}
+    owner = session_owner_id(first_session)
+    steps = {"paper_polishing": {"done": 0, "total": 0, "finished": False}}
+    AnalysisJob("0123456789ab", state={"title-area": "A"}, steps=steps, directory=str(tmp_path), owner=owner).save(save_state=True)
+
+    # 刷新页面后的新会话：所有者ID来自页面地址的查询参数
+    refreshed_session = {}
+    assert session_owner_id(refreshed_session, persisted_owner=owner) == owner
+    assert [record["job_id"] for record in list_jobs(owner=session_owner_id(refreshed_session))] == ["0123456789ab"]
+    # 进程重启后任务从任务文件加载
+    assert background_jobs.get_job("0123456789ab").owner == owner
+
+    # 格式不符的ID被忽略，生成新ID
+    assert session_owner_id({}, persisted_owner="../etc") != "../etc"
+    assert background_jobs.get_job("../0123456789ab") is None
@@ -0,0 +1,75 @@
+import json
+import httpx
+import pytest
+import response_cache
+from batch_api import BatchClient, BatchRunner
+from response_cache import ResponseCache
+from config.config import chatgpt_model, chatgpt_temperature
+
+
+class FakeBatchService:
+    """
+    模拟Batch API：第一个批处理任务过期且没有结果文件，之后的任务正常完成
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.batches = {}
+
+    def handle(self, request):
+        path = request.url.path
+        if request.method == "POST" and path.endswith("/files"):
+            file_id = f"file-{len(self.files)}"
+            body = request.content.decode('utf8')
+            self.files[file_id] = body[body.index('{"custom_id"'):body.rindex("}") + 1]
+            return httpx.Response(200, json={"id": file_id})
+        if request.method == "POST" and path.endswith("/batches"):
+            batch_id = f"batch-{len(self.batches)}"
+            self.batches[batch_id] = json.loads(request.content)["input_file_id"]
+            return httpx.Response(200, json={"id": batch_id, "status": "validating"})
+        if request.method == "GET" and "/batches/" in path:
+            batch_id = path.rsplit("/", 1)[1]
+            if batch_id == "batch-0":
+                return httpx.Response(200, json={"id": batch_id, "status": "expired", "output_file_id": None})
+            return httpx.Response(200, json={"id": batch_id, "status": "completed", "output_file_id": f"output-{batch_id}"})
+        if request.method == "GET" and path.endswith("/content"):
+            input_file = self.files[self.batches[path.split("/")[-2][len("output-"):]]]
+            lines = []
+            for line in input_file.splitlines():
+                custom_id = json.loads(line)["custom_id"]
+                body = {"choices": [{"message": {"content": f"response {custom_id}"}}]}
+                lines.append(json.dumps({"custom_id": custom_id, "response": {"status_code": 200, "body": body}}))
+            return httpx.Response(200, text="\n".join(lines))
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite3"), max_bytes=1024 * 1024, ttl=None)
+    monkeypatch.setattr(response_cache, "response_cache", cache)
+    return cache
+
+
+def test_expired_batch_is_resubmitted(tmp_path, cache):
+    service = FakeBatchService()
+    client = BatchClient("sk-test", "https://batch.test/v1", transport=httpx.MockTransport(service.handle))
+    requests = [("system prompt", "request 1"), ("system prompt", "request 2")]
+
+    runner = BatchRunner(client, str(tmp_path / "batch"))
+    runner.run_round(requests)
+    assert list(service.batches) == ["batch-0"]
+    record = next(iter(runner.records.values()))
+    assert record["status"] == "expired"
+
+    # 重新运行时过期的任务重新提交，而不是返回已过期的任务
+    runner = BatchRunner(client, str(tmp_path / "batch"))
+    runner.run_round(requests)
+    assert list(service.batches) == ["batch-0", "batch-1"]
+    assert [record["id"] for record in runner.records.values()] == ["batch-1"]
+    key = ResponseCache.make_key(chatgpt_model, "system prompt", "request 1", chatgpt_temperature)
+    assert cache.get(key) == f"response {key}"
+
+    # 已完成的任务不重复提交
+    runner.run_round(requests)
+    assert list(service.batches) == ["batch-0", "batch-1"]
+
@@ -0,0 +1,79 @@
+import argparse
+import gzip
+import json
+import os
+import zipfile
+import chatgpt_api
+from batch_cli import process_paper, read_papers, failed_outputs
+from paper_pack import pack_paper
+
+paper = {
+    "title-area": "Paper",
+    "abstract-area": "abstract text",
+    "introduction-area": "introduction text",
+    "sections": [
+        {"flag": True, "id": "1", "title": "Method", "texts": "method text", "sections": []},
+        {"flag": True, "id": "2", "title": "Results", "texts": "results text", "sections": []},
+    ],
+}
+
+
+def make_args(output_dir):
+    return argparse.Namespace(output_dir=str(output_dir), force=False, mode="polish", translate=False, english_polish=True, api_key="sk-test",
+                              openai_service=False, processes=1)
+
+
+def test_failed_paper_keeps_checkpoint_and_retries_failed_sections(tmp_path, monkeypatch):
+    calls = []
+    failing_texts = {"results text"}
+
+    def call_openai_api(system_prompt, request_prompt, use_cache=True, on_delta=None, state=None):
+        calls.append(request_prompt)
+        if request_prompt in failing_texts:
+            raise RuntimeError("API调用失败")
+        return json.dumps({"polished_text": f"polished {request_prompt}"})
+
+    monkeypatch.setattr(chatgpt_api, "call_openai_api", call_openai_api)
+    args = make_args(tmp_path)
+    record = process_paper("paper", paper, args)
+    assert record["status"] == "failed"
+    assert "Results" in record["error"]
+    assert not os.path.exists(tmp_path / "paper.json")
+    assert os.listdir(tmp_path / ".checkpoints")
+
+    calls.clear()
+    failing_texts.clear()
+    record = process_paper("paper", paper, args)
+    assert record["status"] == "finished"
+    # 已成功的章节按指纹复用，只重新调用失败的章节
+    assert "results text" in calls
+    assert "method text" not in calls
+    with open(tmp_path / "paper.json", "r", encoding='utf8') as file:
+        result = json.load(file)
+    assert [section["texts"] for section in result["polished_sections"]] == ["polished method text", "polished results text"]
+    assert not os.listdir(tmp_path / ".checkpoints")
+
+
+def test_failed_outputs_uses_failure_markers():
+    state = {"polish_flag": False, "translate_flag": True, "zh_title-area": "<翻译失败>Paper", "abstract_processed": "abstract text",
+             "zh_abstract_processed": "abstract text",
+             "zh_sections_processed": [{"id": "1", "title": "方法", "texts": "<处理失败>method text", "sections": []}]}
+    # 结果与原文相同不视为失败，只按失败标记判断
+    assert failed_outputs(state) == ["zh_title-area", "方法"]
+
+
+def test_read_papers_accepts_all_export_formats(tmp_path):
+    content = json.dumps(paper).encode('utf8')
+    (tmp_path / "a.json").write_bytes(content)
+    (tmp_path / "b.json.gz").write_bytes(gzip.compress(content))
+    (tmp_path / "c.sapk").write_bytes(pack_paper(paper))
+    (tmp_path / "invalid.json").write_bytes(b'{"sections": "not a list"}')
+    with zipfile.ZipFile(tmp_path / "d.zip", "w") as archive:
+        archive.writestr("e.json", content)
+    papers = read_papers(str(tmp_path))
+    assert [name for name, _ in papers] == ["a", "b", "c", "d-e"]
+    assert all(data == paper for _, data in papers)
+
+    jsonl_path = tmp_path / "papers.jsonl"
+    jsonl_path.write_text(json.dumps(paper) + "\n\nnot json\n", encoding='utf8')
+    assert [data for _, data in read_papers(str(jsonl_path))] == [paper]
@@ -0,0 +1,20 @@
+import gzip
+from utils import export_formats, export_session_state
+from paper_io import load_paper_file
+
+
+def test_export_format_entries_unpack_like_page():
+    for export_format in export_formats:
+        # 与page.py中下载按钮的解包方式一致
+        extension, mime, _ = export_formats[export_format]
+        assert extension.startswith(".")
+        assert "/" in mime
+
+
+def test_export_formats_round_trip():
+    state = {"title-area": "标题", "sections": [{"flag": True, "id": "1", "title": "引言", "texts": "正文 $\\frac{a}{b}$", "sections": []}]}
+    for export_format in export_formats:
+        content = export_session_state(export_format, state=state)
+        if export_formats[export_format][2] == "gzip":
+            assert gzip.decompress(content)
+        assert load_paper_file(content) == state
@@ -0,0 +1,119 @@
+import json
+import chatgpt_api
+from chatgpt_api import run_format_stage, run_polish_stage
+from paper_document import PaperDocument, FormatResult, PolishResult, sections_from_dicts
+
+
+def make_paper():
+    paper = PaperDocument()
+    paper.sections = sections_from_dicts([
+        {"id": "1", "title": "Method", "texts": "method text", "sections": []},
+        {"id": "2", "title": "Results", "texts": "results text", "sections": []},
+    ])
+    return paper
+
+
+def fake_api(calls, failing_texts, field):
+    def call_openai_api(system_prompt, request_prompt, use_cache=True, on_delta=None, state=None):
+        calls.append(request_prompt)
+        if request_prompt in failing_texts:
+            raise RuntimeError("API调用失败")
+        return json.dumps({field: f"processed {request_prompt}"})
+    return call_openai_api
+
+
+def test_failed_format_section_is_processed_again(monkeypatch):
+    calls = []
+    failing_texts = {"results text"}
+    monkeypatch.setattr(chatgpt_api, "call_openai_api", fake_api(calls, failing_texts, "context"))
+    paper = make_paper()
+    first = run_format_stage(paper, FormatResult(), translate_flag=False, max_attempts=1, settings={}, max_workers=1)
+    assert first.sections[1].texts == "<处理失败>results text"
+    assert "2" not in first.fingerprints and "1" in first.fingerprints
+
+    calls.clear()
+    failing_texts.clear()
+    second = run_format_stage(paper, first, translate_flag=False, max_attempts=1, settings={}, max_workers=1)
+    assert "results text" in calls
+    assert "method text" not in calls
+    assert second.sections[1].texts == "processed results text"
+    assert set(second.fingerprints) == {"1", "2"}
+
+
+def test_failed_polish_section_is_polished_again(monkeypatch):
+    calls = []
+    failing_texts = {"results text"}
+    monkeypatch.setattr(chatgpt_api, "call_openai_api", fake_api(calls, failing_texts, "polished_text"))
+    paper = make_paper()
+    settings = {"polish_language_is_english": True}
+    first = run_polish_stage(paper, PolishResult(), max_attempts=1, settings=settings, max_workers=1)
+    assert first.sections[1].texts.startswith("<润色失败>")
+    assert "2" not in first.fingerprints
+
+    calls.clear()
+    failing_texts.clear()
+    second = run_polish_stage(paper, first, max_attempts=1, settings=settings, max_workers=1)
+    assert "results text" in calls
+    assert "method text" not in calls
+    assert second.sections[1].texts == "processed results text"
+
+
+def test_empty_section_is_reused(monkeypatch):
+    calls = []
+    monkeypatch.setattr(chatgpt_api, "call_openai_api", fake_api(calls, set(), "context"))
+    paper = PaperDocument()
+    paper.sections = sections_from_dicts([
+        {"id": "1", "title": "Experiments", "texts": "", "sections": [{"id": "2", "title": "Setup", "texts": "setup text", "sections": []}]},
+    ])
+    first = run_format_stage(paper, FormatResult(), translate_flag=False, max_attempts=1, settings={}, max_workers=1)
+    assert set(first.fingerprints) == {"1", "2"}
+    calls.clear()
+    run_format_stage(paper, first, translate_flag=False, max_attempts=1, settings={}, max_workers=1)
+    assert calls == []
+
+
+def test_unchanged_format_result_is_reused(monkeypatch):
+    calls = []
+
+    def call_openai_api(system_prompt, request_prompt, use_cache=True, on_delta=None, state=None):
+        calls.append(request_prompt)
+        return json.dumps({"context": request_prompt})
+
+    monkeypatch.setattr(chatgpt_api, "call_openai_api", call_openai_api)
+    paper = make_paper()
+    first = run_format_stage(paper, FormatResult(), translate_flag=False, max_attempts=1, settings={}, max_workers=1)
+    # 处理成功但结果与输入相同的章节同样记录指纹
+    assert set(first.fingerprints) == {"1", "2"}
+    calls.clear()
+    run_format_stage(paper, first, translate_flag=False, max_attempts=1, settings={}, max_workers=1)
+    assert "method text" not in calls and "results text" not in calls
+
+
+def test_failed_title_translation_is_translated_again(monkeypatch):
+    calls = []
+    failing_texts = {"Results"}
+
+    def call_openai_api(system_prompt, request_prompt, use_cache=True, on_delta=None, state=None):
+        calls.append(request_prompt)
+        if request_prompt in failing_texts:
+            raise RuntimeError("API调用失败")
+        if system_prompt == chatgpt_api.translate_system_prompt:
+            return json.dumps({"zh_text": f"译 {request_prompt}"})
+        if system_prompt == chatgpt_api.batch_translate_system_prompt:
+            return json.dumps({"zh_texts": {key: f"译 {text}" for key, text in json.loads(request_prompt).items()}})
+        return json.dumps({"en_context": request_prompt, "zh_context": f"译 {request_prompt}"}, ensure_ascii=False)
+
+    monkeypatch.setattr(chatgpt_api, "call_openai_api", call_openai_api)
+    monkeypatch.setattr(chatgpt_api, "batch_translate_token_budget", 1)
+    paper = make_paper()
+    first = run_format_stage(paper, FormatResult(), translate_flag=True, max_attempts=1, settings={}, max_workers=1)
+    assert first.zh_sections[1].title == "<翻译失败>Results"
+    assert first.zh_sections[1].texts == "译 results text"
+    assert set(first.fingerprints) == {"1"}
+
+    calls.clear()
+    failing_texts.clear()
+    second = run_format_stage(paper, first, translate_flag=True, max_attempts=1, settings={}, max_workers=1)
+    assert "Results" in calls and "Method" not in calls
+    assert second.zh_sections[1].title == "译 Results"
+    assert set(second.fingerprints) == {"1", "2"}
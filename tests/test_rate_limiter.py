@@ -0,0 +1,21 @@
+import threading
+import rate_limiter
+from rate_limiter import get_rate_limiter
+
+
+def test_concurrent_first_calls_share_one_limiter(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "rate_limiter", None)
+    limiters = []
+    barrier = threading.Barrier(8)
+
+    def get():
+        barrier.wait()
+        limiters.append(get_rate_limiter())
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(limiter) for limiter in limiters}) == 1
+    assert limiters[0] is get_rate_limiter()
@@ -0,0 +1,25 @@
+import multiprocessing
+from response_cache import ResponseCache
+
+
+def write_responses(path, prefix, count):
+    cache = ResponseCache(path=path, max_bytes=1024 * 1024, ttl=None)
+    for index in range(count):
+        cache.set(f"{prefix}-{index}", f"response {index}")
+
+
+def test_cache_uses_wal_mode(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite3"), max_bytes=1024, ttl=None)
+    assert cache.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_processes_share_cache_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ResponseCache(path=path, max_bytes=1024 * 1024, ttl=None)
+    processes = [multiprocessing.Process(target=write_responses, args=(path, prefix, 50)) for prefix in ["a", "b", "c"]]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+    assert ResponseCache(path=path, max_bytes=1024 * 1024, ttl=None).stats()["entries"] == 150
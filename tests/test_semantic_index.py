@@ -0,0 +1,9 @@
+from semantic_index import SemanticIndex, HashingEncoder
+
+
+def test_index_paper_without_sections_on_empty_index(tmp_path):
+    index = SemanticIndex(str(tmp_path), HashingEncoder(dim=64))
+    assert index.index_paper("empty", {"publication": "arXiv"}) == 0
+    assert index.index_paper("paper", {"title-area": "Paper", "sections": [
+        {"flag": True, "id": "1", "title": "Method", "texts": "attention layers", "sections": []}]}) > 0
+    assert index.indexed_paper_ids() == {"empty", "paper"}
@@ -0,0 +1,36 @@
+import json
+from utils import StreamingJsonFieldExtractor, escape_backslashes_except_newlines
+
+
+def stream(content, chunk_size=1):
+    extractor = StreamingJsonFieldExtractor(["zh_context"])
+    previews = []
+    for start in range(0, len(content), chunk_size):
+        previews.append(extractor.feed(content[start:start + chunk_size]).get("zh_context", ""))
+    return previews
+
+
+def test_latex_commands_stay_literal():
+    # 模型返回的内容中LaTeX命令只有一个反斜线
+    content = '{"zh_context": "\\\\frac{a}{b} \\\\beta"}'.replace("\\\\", "\\")
+    previews = stream(content)
+    final = json.loads(escape_backslashes_except_newlines(content))["zh_context"]
+    assert final == "\\frac{a}{b} \\beta"
+    assert previews[-1] == final
+    # 流式预览始终是最终结果的前缀
+    assert all(final.startswith(preview) for preview in previews)
+
+
+def test_preview_matches_parsed_text():
+    content = '{"zh_context": "第一行\\n$\\theta + \\rho$ \\\\ 双反斜线 \\\\n 结尾"}'
+    final = json.loads(escape_backslashes_except_newlines(content))["zh_context"]
+    assert "\\theta" in final and "\\rho" in final
+    for chunk_size in [1, 2, 3, 7]:
+        previews = stream(content, chunk_size)
+        assert previews[-1] == final
+        assert all(final.startswith(preview) for preview in previews)
+
+
+def test_escaped_quote():
+    previews = stream('{"zh_context": "引号\\"内容\\"", "other": 1}')
+    assert previews[-1] == '引号"内容"'
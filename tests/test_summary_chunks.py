@@ -0,0 +1,49 @@
+import json
+import chatgpt_api
+from chatgpt_api import build_summary_chunks, build_reduce_request
+from utils import calculate_token, calculate_tokens, split_text_by_tokens
+
+budget = 200
+
+
+def make_sections():
+    paragraphs = [" ".join(f"word{paragraph}_{index}" for index in range(40)) for paragraph in range(12)]
+    return [
+        {"section_number": "1", "title": "abstract", "texts": "short abstract"},
+        {"section_number": "3", "title": "Method", "texts": "\n".join(paragraphs)},
+        {"section_number": "3.1", "title": "Details", "texts": "short details"},
+    ]
+
+
+def test_oversized_section_is_split_to_budget(monkeypatch):
+    monkeypatch.setattr(chatgpt_api, "summarize_chunk_tokens", budget)
+    flat_sections = make_sections()
+    chunks = [json.loads(chunk)["sections"] for chunk in build_summary_chunks("Paper", flat_sections)]
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert sum(calculate_tokens([json.dumps(section, ensure_ascii=False) for section in chunk])) <= budget
+    parts = [section for chunk in chunks for section in chunk if section["section_number"] == "3"]
+    assert len(parts) > 1
+    # 按段落边界拆分，各部分按顺序连接后即为原文
+    assert "\n".join(part["texts"] for part in parts) == flat_sections[1]["texts"]
+
+
+def test_split_section_summaries_are_merged():
+    flat_sections = make_sections()
+    chunk_results = [
+        {"section_summaries": [{"section_number": "1", "content_summary": "abstract summary"},
+                               {"section_number": "3", "content_summary": "first part"}]},
+        {"section_summaries": [{"section_number": "3", "content_summary": "second part"},
+                               {"section_number": "3.1", "content_summary": "details summary"}]},
+    ]
+    request, flat_summaries = build_reduce_request("Paper", flat_sections, chunk_results)
+    assert [item["section_number"] for item in flat_summaries] == ["1", "3", "3.1"]
+    assert flat_summaries[1]["content_summary"] == "first part\nsecond part"
+    assert json.loads(request)["section_summaries"][1]["title"] == "Method"
+
+
+def test_single_long_paragraph_is_split():
+    text = " ".join(f"token{index}" for index in range(500))
+    parts = split_text_by_tokens(text, 60)
+    assert all(calculate_token(part) <= 60 for part in parts)
+    assert "".join(parts) == text
@@ -0,0 +1,57 @@
+import cost_estimator
+import utils
+from cost_estimator import estimate_processing, cached_estimate
+from utils import section_token_counts
+
+
+def count_encoded_texts(monkeypatch):
+    encoded = []
+    calculate_tokens = utils.calculate_tokens
+
+    def counting_calculate_tokens(texts, model=None, num_threads=8):
+        encoded.extend(texts)
+        return calculate_tokens(texts, model=model, num_threads=num_threads)
+
+    monkeypatch.setattr(utils, "calculate_tokens", counting_calculate_tokens)
+    monkeypatch.setattr(utils, "token_count_cache", {})
+    return encoded
+
+
+def test_section_token_counts_are_memoized(monkeypatch):
+    encoded = count_encoded_texts(monkeypatch)
+    sections = [{"section_number": "3", "title": "Method", "texts": "method text"},
+                {"section_number": "4", "title": "Results", "texts": "results text"}]
+    first = section_token_counts(sections)
+    assert len(encoded) == 2
+    sections[1] = {**sections[1], "texts": "changed results text"}
+    second = section_token_counts(sections)
+    # 只重新编码修改过的章节
+    assert len(encoded) == 3
+    assert second[0] == first[0]
+
+
+def test_repeated_estimate_does_not_retokenize(monkeypatch):
+    monkeypatch.setattr(cost_estimator, "get_response_cache", lambda: None)
+    encoded = count_encoded_texts(monkeypatch)
+    state = {"title-area": "Paper", "abstract-area": "abstract text", "introduction-area": "introduction text",
+             "sections": [{"flag": True, "id": "1", "title": "Method", "texts": "method text", "sections": []}],
+             "polish_flag": False, "translate_flag": False}
+    first = estimate_processing(state)
+    encoded_once = len(encoded)
+    assert encoded_once > 0
+    assert estimate_processing(state) == first
+    assert len(encoded) == encoded_once
+
+
+def test_cached_estimate_reuses_result_until_state_changes(monkeypatch):
+    estimated = []
+    monkeypatch.setattr(cost_estimator, "estimate_processing", lambda state: estimated.append(1) or {"total": len(estimated)})
+    state = {"state_version": 1, "polish_flag": False, "translate_flag": False}
+    first = cached_estimate(state)
+    assert cached_estimate(state) is first
+    assert len(estimated) == 1
+    state["translate_flag"] = True
+    cached_estimate(state)
+    state["state_version"] = 2
+    cached_estimate(state)
+    assert len(estimated) == 3
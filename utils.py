@@ -1,9 +1,14 @@
 import streamlit as st
 import streamlit_nested_layout  # ！！注意，此代码虽然没有调用，但支持嵌套的展开器（expander），不能删除
 import uuid
+import hashlib
+import threading
 import tiktoken
 import re
 import json
+import gzip
+from paper_pack import pack_paper
+from config.config import chatgpt_model
 
 
 def escape_backslashes_except_newlines(text):
@@ -21,43 +26,165 @@ def escape_backslashes_except_newlines(text):
     return re.sub(r'\\(?!n)', r'\\\\', text)
 
 
-def save_session_state():
+class StreamingJsonFieldExtractor:
+    """
+    从流式返回的JSON文本中增量提取指定字符串字段的值。
+
+    每次调用feed传入新到达的文本片段，只解码新增部分，返回各字段截至目前已解码的内容。
+    只解码"\\n"与"\\""，其余反斜线（如LaTeX公式中的"\\frac"、"\\beta"及"\\\\"）保留原样，
+    与escape_backslashes_except_newlines后再解析的结果一致。
+    """
+    escapes = {'n': '\n', '"': '"'}
+
+    def __init__(self, fields):
+        """
+        :param fields: 需要提取的字段名列表，例如["en_context", "zh_context"]。
+        """
+        self.fields = fields
+        self.buffer = ""
+        self.values = {}  # 字段名 -> 已解码的内容
+        self.positions = {}  # 字段名 -> 下一个待解码字符在buffer中的位置
+        self.finished = set()  # 已读取到结束引号的字段
+
+    def feed(self, delta):
+        """
+        追加新到达的文本片段并增量解码。
+
+        :param delta: 新到达的文本片段。
+        :return: 字典，键为已出现的字段名，值为截至目前已解码的字段内容。
+        """
+        self.buffer += delta
+        for field in self.fields:
+            if field in self.finished:
+                continue
+            if field not in self.positions:
+                match = re.search(r'"%s"\s*:\s*"' % re.escape(field), self.buffer)
+                if match is None:
+                    continue
+                self.positions[field] = match.end()
+                self.values[field] = ""
+            self.decode(field)
+        return self.values
+
+    def decode(self, field):
+        """
+        从上次停止的位置继续解码字段内容，片段以反斜线结尾时停止，等待后续片段。
+        """
+        position = self.positions[field]
+        decoded = []
+        while position < len(self.buffer):
+            char = self.buffer[position]
+            if char == '"':
+                self.finished.add(field)
+                break
+            if char == '\\':
+                if position + 1 >= len(self.buffer):
+                    break
+                next_char = self.buffer[position + 1]
+                if next_char in self.escapes:
+                    decoded.append(self.escapes[next_char])
+                    position += 2
+                    continue
+                # 其余反斜线按原样保留，后一个字符单独处理（两个反斜线后接n时解码为反斜线加换行符，与最终解析结果一致）
+                decoded.append(char)
+                position += 1
+                continue
+            decoded.append(char)
+            position += 1
+        self.positions[field] = position
+        self.values[field] += ''.join(decoded)
+
+
+# 保存论文时写入JSON文件的st.session_state键
+saved_session_state_keys = [
+    "title-area",
+    "authors-area",
+    "institutes-area",
+    "publication",
+    "publish_time",
+    "introduction_processed",
+    "abstract_processed",
+    "keywords-area",
+    "sections",
+    "sections_processed",
+    "summary",
+    "section_summaries",
+    "overall_assessment",
+    "zh_title-area",
+    "zh_institutes-area",
+    "zh_introduction_processed",
+    "zh_abstract_processed",
+    "zh_keywords-area",
+    "zh_sections_processed",
+    "sections_processed_fingerprints",
+    "introduction-area",
+    "abstract-area",
+    "polish_language_is_english",
+    "polished_title",
+    "polished_introduction",
+    "polished_abstract",
+    "polished_sections",
+    "polished_sections_fingerprints"
+]
+
+
+# 下载文件格式：(文件扩展名, MIME类型, 编码方式)。紧凑格式不缩进，gzip压缩后体积约为原文件的1/4，
+# 紧凑二进制格式(paper_pack.py)对重复文本去重后按章节压缩，均可在"导入"页面上传
+export_formats = {
+    "JSON": (".json", "application/json", "json"),
+    "紧凑JSON": (".json", "application/json", "compact"),
+    "紧凑JSON（gzip压缩）": (".json.gz", "application/gzip", "gzip"),
+    "紧凑二进制": (".sapk", "application/octet-stream", "pack"),
+}
+
+
+def save_session_state(state=None, indent=True):
     """
     保存st.session_state到JSON文件中
+    :param state: 论文数据所在的状态字典，默认为st.session_state
+    :param indent: 是否缩进，否则输出不含空白的紧凑JSON
     """
+    state = st.session_state if state is None else state
     # 将 st.session_state 转换为标准字典
-    keys_to_save = [
-        "title-area",
-        "authors-area",
-        "institutes-area",
-        "publication",
-        "publish_time",
-        "introduction_processed",
-        "abstract_processed",
-        "keywords-area",
-        "sections",
-        "sections_processed",
-        "summary",
-        "section_summaries",
-        "overall_assessment",
-        "zh_title-area",
-        "zh_institutes-area",
-        "zh_introduction_processed",
-        "zh_abstract_processed",
-        "zh_keywords-area",
-        "zh_sections_processed",
-        "introduction-area",
-        "abstract-area",
-        "sections",
-        "polish_language_is_english",
-        "polished_title",
-        "polished_introduction",
-        "polished_abstract",
-        "polished_sections"
-    ]
-    session_state_dict = {key: st.session_state[key] for key in keys_to_save if key in st.session_state}    # 序列化转换后的字典
-    session_state_json = json.dumps(session_state_dict, indent=4, ensure_ascii=False)
-    return session_state_json
+    session_state_dict = {key: state[key] for key in saved_session_state_keys if key in state}
+    # 序列化转换后的字典
+    if indent:
+        return json.dumps(session_state_dict, indent=4, ensure_ascii=False)
+    return json.dumps(session_state_dict, separators=(",", ":"), ensure_ascii=False)
+
+
+def export_session_state(export_format="JSON", state=None):
+    """
+    按下载文件格式导出论文数据
+    :param export_format: 下载文件格式，取值见export_formats
+    :return: 文件内容(bytes)
+    """
+    _, _, encoding = export_formats[export_format]
+    if encoding == "pack":
+        state = st.session_state if state is None else state
+        return pack_paper({key: state[key] for key in saved_session_state_keys if key in state})
+    payload = save_session_state(state=state, indent=encoding == "json").encode('utf8')
+    # mtime固定为0，相同内容的压缩结果一致
+    return gzip.compress(payload, mtime=0) if encoding == "gzip" else payload
+
+
+def mark_state_changed():
+    """
+    论文数据修改后递增st.session_state['state_version']，使缓存的下载文件及处理前预估失效
+    """
+    st.session_state["state_version"] = st.session_state.get("state_version", 0) + 1
+
+
+def cached_export(export_format):
+    """
+    获取下载文件内容：按(state_version, 格式)缓存在st.session_state中，论文数据未修改时页面重运行不再重复序列化
+    """
+    cache_key = (st.session_state.get("state_version", 0), export_format)
+    cached = st.session_state.get("export_cache")
+    if cached is None or cached[0] != cache_key:
+        cached = (cache_key, export_session_state(export_format))
+        st.session_state["export_cache"] = cached
+    return cached[1]
 
 
 def run_chapter_editor():
@@ -126,6 +253,7 @@ def display_sections(sections, parent_id, chapter_number):
                 def on_texts_change():
                     st.session_state[f"{section['id']}_texts_change"] = st.session_state[f"{section['id']}_texts"]
 
+                previous_title, previous_texts = section['title'], section['texts']
                 # 创建标题输入区
                 section['title'] = st.text_area(label="xxx", label_visibility="collapsed", placeholder='请输入章节标题', value=st.session_state.get(f"{section['id']}_title_change", section['title']),
                                                 key=f"{section['id']}_title", height=55, on_change=on_title_change)
@@ -133,12 +261,15 @@ def display_sections(sections, parent_id, chapter_number):
                 # 创建正文内容输入区
                 section['texts'] = st.text_area(label="xxx", label_visibility="collapsed", placeholder='请输入章节内容', value=st.session_state.get(f"{section['id']}_texts_change", section['texts']),
                                                 key=f"{section['id']}_texts", height=150, on_change=on_texts_change)
+                if (section['title'], section['texts']) != (previous_title, previous_texts):
+                    mark_state_changed()
 
                 col1, col2, col3 = st.columns([1.45, 1.6, 0.4])
                 with col1:
                     if st.button("单击添加子章节", key=f"{section['id']}_add_child"):
                         child_id = str(uuid.uuid4())
                         section['sections'].append({"flag": True, "id": child_id, "title": "", "texts": "", "sections": []})
+                        mark_state_changed()
                 with col2:
                     if st.button("单击添加同级章节", key=f"{section['id']}_add_sibling"):
                         sibling_id = str(uuid.uuid4())
@@ -148,6 +279,7 @@ def display_sections(sections, parent_id, chapter_number):
                         else:
                             parent_section = find_section(st.session_state['sections'], parent_id)
                             parent_section['sections'].insert(index + 1, new_section)
+                        mark_state_changed()
                 with col3:
                     if st.button("双击删除本章节", key=f"{section['id']}_delete"):
                         section["flag"] = False
@@ -156,6 +288,7 @@ def display_sections(sections, parent_id, chapter_number):
                         else:
                             parent_section = find_section(st.session_state['sections'], parent_id)
                             del parent_section['sections'][index]
+                        mark_state_changed()
 
                 if section['sections']:
                     display_sections(section['sections'], section['id'], current_chapter_number)
@@ -182,60 +315,225 @@ def find_section(sections, id):
     return None
 
 
-def calculate_token(text):
+def section_fingerprint(section, *options):
+    """
+    计算章节内容指纹（标题+正文的哈希值），用于判断章节自上次处理后是否被修改。子章节不参与计算，各自拥有独立指纹。
+
+    :param section: 章节字典，包含"title"和"texts"键。
+    :param options: 影响处理结果的其他选项（如是否翻译、润色语言），选项变化时指纹随之变化。
+    :return: 十六进制哈希字符串。
+    """
+    content = json.dumps([section.get('title', ''), section.get('texts', ''), *options], ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf8')).hexdigest()
+
+
+# 按模型名缓存的tiktoken编码器，首次使用时创建
+token_encoders = {}
+token_encoders_lock = threading.Lock()
+# token数缓存，以(模型名, 文本内容哈希)为键，超出容量时清空
+token_count_cache = {}
+token_count_cache_lock = threading.Lock()
+token_count_cache_max_entries = 100000
+
+
+def get_token_encoder(model=None):
+    """
+    获取模型对应的tiktoken编码器，编码器在进程内按模型名缓存
+    :param model: 模型名称，默认为config.chatgpt_model；tiktoken不支持的模型使用cl100k_base编码
+    """
+    model = chatgpt_model if model is None else model
+    with token_encoders_lock:
+        encoder = token_encoders.get(model)
+        if encoder is None:
+            try:
+                encoder = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoder = tiktoken.get_encoding("cl100k_base")
+            token_encoders[model] = encoder
+    return encoder
+
+
+def calculate_token(text, model=None):
     """
     计算文本token
     """
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    tokens = encoding.encode(text)
-    # 统计tokens的数量
-    num_tokens = len(tokens)
+    # 按普通文本编码，文本中出现的特殊token（如<|endoftext|>）不会引发异常
+    return len(get_token_encoder(model).encode_ordinary(text))
 
-    return num_tokens
+
+def calculate_tokens(texts, model=None, num_threads=8):
+    """
+    批量计算多段文本的token数，使用tiktoken的多线程批量编码
+    :param texts: 文本列表
+    :param model: 模型名称，默认为config.chatgpt_model
+    :param num_threads: 编码线程数
+    :return: 与texts顺序一致的token数列表
+    """
+    if not texts:
+        return []
+    return [len(tokens) for tokens in get_token_encoder(model).encode_ordinary_batch(list(texts), num_threads=num_threads)]
 
 
-def add_section_numbers(body, number_prefix=None):
+def memoized_token_counts(texts, model=None):
     """
-    为论文正文的每个章节和子章节添加章节编号，并去除章节中的'id'和'flag'字段。
-    章节编号从3开始，并根据章节的层次结构递增（如3, 3.1, 3.1.1等）。
+    批量计算多段文本的token数，结果以文本内容哈希为键缓存。论文未修改时，重复预估或重复打包分块不再重新编码
+    :param texts: 文本列表
+    :param model: 模型名称，默认为config.chatgpt_model
+    :return: 与texts顺序一致的token数列表
+    """
+    model = chatgpt_model if model is None else model
+    keys = [(model, hashlib.sha256(text.encode('utf8')).hexdigest()) for text in texts]
+    with token_count_cache_lock:
+        counts = [token_count_cache.get(key) for key in keys]
+    missing = [index for index, count in enumerate(counts) if count is None]
+    if missing:
+        for index, count in zip(missing, calculate_tokens([texts[index] for index in missing], model=model)):
+            counts[index] = count
+        with token_count_cache_lock:
+            if len(token_count_cache) + len(missing) > token_count_cache_max_entries:
+                token_count_cache.clear()
+            for index in missing:
+                token_count_cache[keys[index]] = counts[index]
+    return counts
+
+
+def section_token_counts(sections, model=None):
+    """
+    计算各章节（不含子章节）序列化为JSON后的token数，即章节在分块请求中占用的token数，结果以章节内容哈希为键缓存
+    :param sections: flatten_numbered_sections展开的章节列表
+    :param model: 模型名称，默认为config.chatgpt_model
+    :return: 与sections顺序一致的token数列表
+    """
+    return memoized_token_counts([json.dumps(section, ensure_ascii=False) for section in sections], model=model)
 
-    :param body: 论文正文的结构，一个列表，其中每个元素代表一个章节，每个章节包含标题(title)、正文(texts)、
-                 可选的子章节列表(sections)、以及其他字段如id和flag。函数会移除章节中的id和flag字段。
-                 例如：
-                 [
-                     {
-                         "id": "xxx",
-                         "title": "章节标题",
-                         "texts": "章节正文内容",
-                         "flag": "important",
-                         "sections": [...]
-                     },
-                     ...
-                 ]
-    :param number_prefix: 内部使用，用于记录当前处理章节的编号前缀。调用时通常不需要传递或传递None。
+
+def split_text_by_tokens(text, token_budget, model=None):
     """
-    if number_prefix is None:
-        number_prefix = [2]  # 初始化章节编号前缀为2，使得第一个章节的编号为3
-    else:
-        number_prefix.append(0)  # 进入新的子章节层级时，添加一个新的层级编号
+    按段落边界将文本拆分为token数均不超过预算的若干部分：依次合并相邻段落（以换行符分隔），单个段落超过预算时从中间继续拆分
 
-    for section in body:
-        number_prefix[-1] += 1  # 更新当前层级的章节编号
-        section_number = '.'.join(map(str, number_prefix))  # 将编号列表转换为字符串形式
-        section['section_number'] = section_number  # 为当前章节添加章节号字段
+    :param text: 待拆分的文本。
+    :param token_budget: 每部分的token预算。
+    :param model: 模型名称，默认为config.chatgpt_model
+    :return: 按原有顺序排列的文本列表，未超过预算时只有一个元素。
+    """
+    if calculate_token(text, model=model) <= token_budget:
+        return [text]
+    lines = text.split("\n")
+    if len(lines) == 1:
+        if len(text) <= 1:
+            return [text]
+        middle = len(text) // 2
+        return split_text_by_tokens(text[:middle], token_budget, model) + split_text_by_tokens(text[middle:], token_budget, model)
+    parts = []
+    part = []
+    part_tokens = 0
+    for line, num_tokens in zip(lines, calculate_tokens(lines, model=model)):
+        # 合并时的换行符按1个token计
+        if part and part_tokens + 1 + num_tokens > token_budget:
+            parts.append("\n".join(part))
+            part = []
+            part_tokens = 0
+        if num_tokens > token_budget:
+            parts.extend(split_text_by_tokens(line, token_budget, model))
+            continue
+        part_tokens += num_tokens + (1 if part else 0)
+        part.append(line)
+    if part:
+        parts.append("\n".join(part))
+    return parts
+
+
+def split_oversized_sections(sections, token_counts, token_budget, model=None):
+    """
+    将token数超过预算的章节按段落拆分为若干部分，使pack_by_token_budget打包后的每个批次均不超过预算。
+    各部分保留原章节的section_number，标题后注明部分序号
+
+    :param sections: flatten_numbered_sections展开的章节列表。
+    :param token_counts: 与sections一一对应的token数列表（章节序列化为JSON后的token数）。
+    :param token_budget: 每个批次的token预算。
+    :param model: 模型名称，默认为config.chatgpt_model
+    :return: (拆分后的章节列表, 对应的token数列表)
+    """
+    split_sections = []
+    split_counts = []
+    for section, num_tokens in zip(sections, token_counts):
+        if num_tokens <= token_budget:
+            split_sections.append(section)
+            split_counts.append(num_tokens)
+            continue
+        # 章节号、标题（含部分序号）等字段及JSON格式本身占用的token
+        empty_part = {**section, "title": f"{section['title']}（第10部分，共10部分）", "texts": ""}
+        overhead = calculate_token(json.dumps(empty_part, ensure_ascii=False), model=model)
+        parts = split_text_by_tokens(section["texts"], max(1, token_budget - overhead), model=model)
+        part_sections = [{**section, "title": f"{section['title']}（第{index}部分，共{len(parts)}部分）", "texts": part}
+                         for index, part in enumerate(parts, start=1)]
+        split_sections.extend(part_sections)
+        split_counts.extend(section_token_counts(part_sections, model=model))
+    return split_sections, split_counts
+
+
+def pack_by_token_budget(items, token_counts, token_budget):
+    """
+    按顺序将条目打包为若干批次，使每个批次的token总数不超过预算。单个条目超过预算时单独成为一个批次，
+    需要严格限制批次大小时，先以split_oversized_sections拆分超过预算的条目。
 
-        # 移除'id'和'flag'字段
-        section.pop('id', None)
-        section.pop('flag', None)
+    :param items: 待打包的条目列表。
+    :param token_counts: 与items一一对应的token数列表。
+    :param token_budget: 每个批次的token预算。
+    :return: 批次列表，每个批次为保持原有顺序的条目列表。
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for item, num_tokens in zip(items, token_counts):
+        if batch and batch_tokens + num_tokens > token_budget:
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(item)
+        batch_tokens += num_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def flatten_numbered_sections(body):
+    """
+    将带章节号的论文结构（paper_document.numbered_sections的结果）按文档顺序展开为不含子章节的列表
 
-        # 如果有子章节，递归调用该函数处理子章节
-        if 'sections' in section:
-            add_section_numbers(section['sections'], number_prefix.copy())  # 使用编号的副本，以防修改影响其他章节
+    :param body: 带章节号的章节列表。
+    :return: 列表，每个元素为{"section_number", "title", "texts"}字典。
+    """
+    flat_sections = []
+    for section in body:
+        flat_sections.append({
+            "section_number": section['section_number'],
+            "title": section.get('title', ''),
+            "texts": section.get('texts', ''),
+        })
+        flat_sections.extend(flatten_numbered_sections(section.get('sections', [])))
+    return flat_sections
 
-    # 在返回之前，确保移除当前层级的编号，以避免影响同级的其他章节
-    number_prefix.pop()
 
-    return  body
+def nest_section_summaries(flat_summaries):
+    """
+    将按文档顺序排列的扁平章节总结列表，按章节号重新组织为嵌套结构，与summarize_system_prompt中section_summaries的格式一致。
+
+    :param flat_summaries: 列表，每个元素为包含"section_number"和"content_summary"键的字典。
+    :return: 嵌套的章节总结列表，子章节位于父章节的"sections"中；父章节缺失时作为顶级章节。
+    """
+    nested_summaries = []
+    summaries_by_number = {}
+    for item in flat_summaries:
+        section_number = str(item['section_number'])
+        summary = {"section_number": section_number, "content_summary": item.get('content_summary', ''), "sections": []}
+        summaries_by_number[section_number] = summary
+        parent_number = section_number.rsplit('.', 1)[0] if '.' in section_number else None
+        if parent_number in summaries_by_number:
+            summaries_by_number[parent_number]['sections'].append(summary)
+        else:
+            nested_summaries.append(summary)
+    return nested_summaries
 
 
 def get_section_summary(sections, result=None):